@@ -68,17 +68,17 @@ function parse_params() {
     done
 }
 
-function get_ssm_parameter() {
-  local parameter_name=$1
-
-  verbose_print "==> Fetching SSM parameter: $1" "$fg_magenta"
-  aws ssm get-parameter \
-    --name "$parameter_name" \
-    --with-decryption \
-    --query "Parameter.Value" \
-    --output text || \
-    script_exit "==> Failed to fetch SSM parameter: $parameter_name" 1
-  verbose_print "==> Fetched SSM parameter: $parameter_name" "$fg_green"
+# Function to export sensitive parameters resolved by the shared secret provider
+function export_secrets() {
+  local exports
+
+  verbose_print "==> Fetching secrets..." "$fg_magenta"
+  exports=$(timed_stage secrets python scripts/secret_provider.py --export) || \
+    script_exit "==> Failed to fetch secrets" 1
+  eval "$exports"
+  # Later Python steps read the exported values instead of calling SSM again.
+  export C7N_SECRET_BACKEND=env
+  verbose_print "==> Fetched secrets successfully." "$fg_green"
 }
 
 # Function to prepare configuration files for Cloud Custodian
@@ -92,7 +92,8 @@ function prepare_config_files() {
 # Function to run the policy generator script
 function run_policy_generator() {
   verbose_print "==> Running policy generator..." "$fg_magenta"
-  python scripts/policy_generator.py || \
+  timed_stage policy-generator python scripts/policy_generator.py \
+    --shard-dir policies/shards --tier-dir policies/tiers || \
     script_exit "==> Failed to run policy generator" 1
   verbose_print "==> Policy generator completed successfully." "$fg_green"
 }
@@ -112,11 +113,11 @@ function main() {
     #lock_init system
 
     verbose_print "==> Initializing script..." "$fg_cyan"
+    # Start a new stage timings file for this run.
+    mkdir -p state
+    : > "${STAGE_TIMINGS_FILE:-state/stages.tsv}"
     verbose_print "==> Exporting env variables..." "$fg_magenta"
-    QUEUE_ARN=$(get_ssm_parameter "/c7n/queue_arn")
-    export QUEUE_ARN
-    SLACK_WEBHOOK_URL=$(get_ssm_parameter "/c7n/slack_webhook_url")
-    export SLACK_WEBHOOK_URL
+    export_secrets
     verbose_print "==> Exported env variables successfully." "$fg_green"
     # AWS_REGION and ROLE_ARN are defined in the .env file as they are not sensitive information.
 
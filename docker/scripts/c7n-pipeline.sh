@@ -35,6 +35,11 @@ Usage:
      -v|--verbose               Displays verbose output
     -nc|--no-colour             Disables colour output
     -cr|--cron                  Run silently unless we encounter an error
+    -co|--changed-only          Only run policy shards changed since the last generation
+     -s|--scheduled             Run shards in parallel with the resumable run scheduler
+     -p|--prescan               Pre-scan tags and only run non-compliant types (implies --scheduled)
+     -t|--tiered                Only run the scan tiers (hourly/daily/weekly) that are due
+     -f|--full-sweep            With --tiered, run every tier regardless of the schedule
 EOF
 }
 
@@ -61,6 +66,22 @@ function parse_params() {
             -cr | --cron)
                 cron=true
                 ;;
+            -co | --changed-only)
+                changed_only=true
+                ;;
+            -s | --scheduled)
+                scheduled=true
+                ;;
+            -p | --prescan)
+                prescan=true
+                scheduled=true
+                ;;
+            -t | --tiered)
+                tiered=true
+                ;;
+            -f | --full-sweep)
+                export C7N_FULL_SWEEP=true
+                ;;
             *)
                 script_exit "Invalid parameter was provided: $param" 1
                 ;;
@@ -75,7 +96,7 @@ function run_custodian_policies() {
   local output_dir="output"
 
   verbose_print "==> Running Cloud Custodian..." "$fg_cyan"
-  c7n-org run \
+  timed_stage c7n-org c7n-org run \
     --config "$config_file" \
     --use "$policy_file" \
     --output-dir "$output_dir" || \
@@ -83,13 +104,118 @@ function run_custodian_policies() {
   verbose_print "==> Cloud Custodian analisis completed successfully." "$fg_green"
 }
 
+# Function to run only the policy shards whose hash changed on the last generation
+function run_changed_custodian_policies() {
+  local config_file="accounts.yml"
+  local changed_file="policies/shards/changed.txt"
+  local output_dir="output"
+  local shard
+
+  verbose_print "==> Running Cloud Custodian on changed shards..." "$fg_cyan"
+  if [[ ! -s "$changed_file" ]]; then
+    verbose_print "==> No policy shards changed, nothing to run." "$fg_green"
+    return 0
+  fi
+  while IFS= read -r shard; do
+    verbose_print "==> Running shard: $shard" "$fg_magenta"
+    timed_stage "c7n-org:$shard" c7n-org run \
+      --config "$config_file" \
+      --use "$shard" \
+      --output-dir "$output_dir" || \
+      script_exit "Failed to run Cloud Custodian shard: $shard" 1
+  done < "$changed_file"
+  verbose_print "==> Cloud Custodian changed shards completed successfully." "$fg_green"
+}
+
+# Function to run policy shards through the parallel, resumable run scheduler
+function run_scheduled_custodian_policies() {
+  local scheduler_args=(--config "accounts.yml" --shard-dir "policies/shards" --output-dir "output")
+
+  if [[ -n ${tiered-} ]]; then
+    scheduler_args+=(--shard-list "state/due_policies.txt")
+  elif [[ -n ${changed_only-} ]]; then
+    scheduler_args+=(--changed-only)
+  fi
+  if [[ -n ${prescan-} ]]; then
+    scheduler_args+=(--prescan "state/prescan.json")
+  fi
+
+  verbose_print "==> Running Cloud Custodian with the run scheduler..." "$fg_cyan"
+  timed_stage c7n-org-scheduled python scripts/run_scheduler.py "${scheduler_args[@]}" || \
+    script_exit "Failed to run Cloud Custodian policies" 1
+  verbose_print "==> Cloud Custodian scheduled run completed successfully." "$fg_green"
+}
+
+# Function to select the policies of the scan tiers due at this wake-up
+function select_due_tiers() {
+  local planner_args=(due)
+
+  if [[ -n ${scheduled-} ]]; then
+    planner_args+=(--shard-dir "policies/shards")
+  fi
+  python scripts/tier_planner.py "${planner_args[@]}" > "state/due_policies.txt" || \
+    script_exit "Failed to select due scan tiers" 1
+  verbose_print "==> Due scan tiers: $(tr -d '[]"\n' < state/tiers_due.json)" "$fg_magenta"
+}
+
+# Function to run the tier bundles selected by select_due_tiers
+function run_tiered_custodian_policies() {
+  local config_file="accounts.yml"
+  local output_dir="output"
+  local bundle
+
+  verbose_print "==> Running Cloud Custodian on due scan tiers..." "$fg_cyan"
+  while IFS= read -r bundle; do
+    verbose_print "==> Running tier bundle: $bundle" "$fg_magenta"
+    timed_stage "c7n-org:$bundle" c7n-org run \
+      --config "$config_file" \
+      --use "$bundle" \
+      --output-dir "$output_dir" || \
+      script_exit "Failed to run Cloud Custodian tier bundle: $bundle" 1
+  done < "state/due_policies.txt"
+  verbose_print "==> Cloud Custodian due scan tiers completed successfully." "$fg_green"
+}
+
+# Function to record the completed tiers and reassign resource types to tiers
+function update_scan_tiers() {
+  verbose_print "==> Updating scan tiers..." "$fg_cyan"
+  python scripts/tier_planner.py done && python scripts/tier_planner.py plan || \
+    script_exit "Failed to update scan tiers" 1
+  verbose_print "==> Scan tiers updated successfully." "$fg_green"
+}
+
+# Function to find the resource types with non-compliant resources via the tagging API
+function run_tag_prescan() {
+  verbose_print "==> Pre-scanning tags..." "$fg_cyan"
+  timed_stage tag-prescan python scripts/tag_prescan.py --config "accounts.yml" --output "state/prescan.json" || \
+    script_exit "Failed to pre-scan tags" 1
+  verbose_print "==> Tag pre-scan completed successfully." "$fg_green"
+}
+
+# Function to record compliance state and queue notifications for changes only
+function run_compliance_state() {
+  verbose_print "==> Computing compliance deltas..." "$fg_cyan"
+  timed_stage compliance-state python scripts/compliance_state.py --db "state/compliance.db" --output-dir "output" \
+    --since "$run_started" || \
+    script_exit "Failed to compute compliance deltas" 1
+  verbose_print "==> Compliance delta notifications queued successfully." "$fg_green"
+}
+
+# Function to deliver queued per-owner digests to Slack
+function run_digest_notifier() {
+  verbose_print "==> Delivering owner digests..." "$fg_cyan"
+  timed_stage digest-notifier python scripts/digest_notifier.py --queue-url "$DIGEST_QUEUE_URL" || \
+    script_exit "Failed to deliver owner digests" 1
+  verbose_print "==> Owner digests delivered successfully." "$fg_green"
+}
+
 # Function to run Cloud Custodian mailer
 function run_custodian_mailer() {
   local mailer_config="mailer.yml"
   local templates_dir="mailer-templates"
 
   verbose_print "==> Running Cloud Custodian mailer..." "$fg_cyan"
-  c7n-mailer \
+  timed_stage c7n-mailer c7n-mailer \
     --config "$mailer_config" \
     --templates "$templates_dir" \
     --run ||\
@@ -97,6 +223,17 @@ function run_custodian_mailer() {
   verbose_print "==> Cloud Custodian mailer completed successfully." "$fg_green"
 }
 
+# Function to export the run report and metrics (JSON, Prometheus textfile, CloudWatch EMF)
+function run_metrics_report() {
+  verbose_print "==> Exporting run metrics..." "$fg_cyan"
+  # Metrics are best effort: a failed export must not fail a completed run.
+  if python scripts/run_metrics.py --output-dir "output" --since "$run_started"; then
+    verbose_print "==> Run metrics exported successfully." "$fg_green"
+  else
+    verbose_print "==> Failed to export run metrics" "$fg_red"
+  fi
+}
+
 # DESC: Main control flow
 # ARGS: $@ (optional): Arguments provided to the script
 # OUTS: None
@@ -111,8 +248,39 @@ function main() {
     colour_init
     #lock_init system
 
-    run_custodian_policies
+    # output/ keeps the results of earlier runs; the steps reading it only take the
+    # policies executed since this time.
+    run_started=$(date +%s)
+    if [[ -n ${prescan-} ]]; then
+        run_tag_prescan
+    fi
+    if [[ -n ${tiered-} ]]; then
+        select_due_tiers
+    fi
+    if [[ -n ${scheduled-} ]]; then
+        run_scheduled_custodian_policies
+    elif [[ -n ${tiered-} ]]; then
+        run_tiered_custodian_policies
+    elif [[ -n ${changed_only-} ]]; then
+        run_changed_custodian_policies
+    else
+        run_custodian_policies
+    fi
+    # Set C7N_DELTA_NOTIFY to generate policies without notify actions and only
+    # notify compliance changes tracked in the state index.
+    # With DIGEST_QUEUE_URL also set, deltas are coalesced per owner and severity.
+    if [[ ${C7N_DELTA_NOTIFY-} =~ ^1|yes|true$ ]]; then
+        run_compliance_state
+        if [[ -n ${DIGEST_QUEUE_URL-} ]]; then
+            run_digest_notifier
+        fi
+    fi
     run_custodian_mailer
+    run_metrics_report
+    # Tier history is built from the run report, so update tiers after it is written.
+    if [[ -n ${tiered-} ]]; then
+        update_scan_tiers
+    fi
 }
 
 # shellcheck source=source.sh
@@ -0,0 +1,434 @@
+import time
+
+# Taken before any other import so the startup benchmark includes import time.
+STARTED = time.perf_counter()
+
+import os
+import re
+import sys
+import json
+import argparse
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator
+
+import yaml
+
+from secret_provider import SECRET_PARAMETERS, SecretProvider, SsmBackend, get_secret_provider
+from policy_generator import resources_tags, generate_policies, dump_policies, write_policy_shards, write_tier_bundles
+
+# envsubst only substitutes valid shell names: "$1" or "${1}" are left as they are.
+ENV_REFERENCE = re.compile(r"\$\{([A-Za-z_]\w*)\}|\$([A-Za-z_]\w*)")
+
+
+class AwsSession:
+    """
+    One boto3 session shared by every step of the driver, so credentials are resolved
+    once and clients of the same service reuse one connection pool.
+    """
+
+    def __init__(self, region: Optional[str] = None, max_pool_connections: int = 32) -> None:
+        """
+        Initialize the AwsSession. boto3 is imported on first use.
+
+        Args:
+            region (Optional[str]): Default region. Defaults to AWS_REGION.
+            max_pool_connections (int): Connection pool size of each client.
+        """
+        self.region = region or os.getenv("AWS_REGION")
+        self.max_pool_connections = max_pool_connections
+        self._session: Any = None
+        self._clients: Dict[str, Any] = {}
+
+    @property
+    def session(self) -> Any:
+        if self._session is None:
+            import boto3
+            self._session = boto3.session.Session(region_name=self.region)
+        return self._session
+
+    def client(self, service: str) -> Any:
+        """
+        Return the shared client of a service, creating it on first use.
+        """
+        if service not in self._clients:
+            from botocore.config import Config
+            self._clients[service] = self.session.client(
+                service,
+                config=Config(max_pool_connections=self.max_pool_connections, retries={"mode": "adaptive"}),
+            )
+        return self._clients[service]
+
+
+class SchemaCache:
+    """
+    Validates policy files against the c7n JSON schema, generating the schema once
+    per c7n version and keeping it on disk. Loading every c7n resource module to build
+    the schema is the slowest part of `custodian validate`.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        """
+        Initialize the SchemaCache.
+
+        Args:
+            cache_dir (str): Directory holding c7n-schema-<version>.json.
+        """
+        self.cache_dir = cache_dir
+        self._schema: Optional[Dict[str, Any]] = None
+
+    def schema(self) -> Dict[str, Any]:
+        """
+        Return the c7n policy schema, generating and caching it if needed.
+        """
+        if self._schema is None:
+            from c7n.version import version
+
+            path = os.path.join(self.cache_dir, f"c7n-schema-{version}.json")
+            if os.path.exists(path):
+                with open(path) as file:
+                    self._schema = json.load(file)
+            else:
+                from c7n.resources import load_resources
+                from c7n.schema import generate
+
+                load_resources(("aws.*",))
+                self._schema = generate()
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(f"{path}.tmp", "w") as file:
+                    json.dump(self._schema, file)
+                os.replace(f"{path}.tmp", path)
+        return self._schema
+
+    def validate(self, paths: List[str]) -> None:
+        """
+        Validate policy files, as accepted by write_policy_shards.
+
+        Raises:
+            ValueError: If a file does not validate.
+        """
+        from c7n.schema import validate
+        from c7n.structure import StructureParser
+
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        for path in paths:
+            with open(path) as file:
+                data = yaml.load(file, Loader=loader)
+            StructureParser().validate(data)
+            errors = validate(data, self.schema())
+            if errors:
+                # c7n needs its resource modules loaded to explain an error precisely.
+                from c7n.resources import load_resources
+
+                load_resources(("aws.*",))
+                errors = validate(data, self.schema()) or errors
+                raise ValueError(f"Invalid policy file {path}: {errors[0]}")
+
+
+def render_template(template_path: str, output_path: str, env: Optional[Dict[str, str]] = None) -> None:
+    """
+    Render a config template like envsubst: $VAR and ${VAR} are replaced with the
+    variable's value, or an empty string if it is unset.
+    """
+    env = os.environ if env is None else env
+    with open(template_path) as file:
+        template = file.read()
+    rendered = ENV_REFERENCE.sub(lambda match: env.get(match.group(1) or match.group(2), ""), template)
+    with open(output_path, "w") as file:
+        file.write(rendered)
+
+
+def run_org(config: str, policy_file: str, output_dir: str) -> None:
+    """
+    Run c7n-org in this process.
+
+    Raises:
+        RuntimeError: If c7n-org reports a failure.
+    """
+    from c7n_org.cli import cli
+
+    try:
+        cli.main(
+            args=["run", "--config", config, "--use", policy_file, "--output-dir", output_dir],
+            standalone_mode=False,
+        )
+    except SystemExit as error:
+        if error.code:
+            raise RuntimeError(f"c7n-org failed on {policy_file} with exit code {error.code}") from error
+
+
+def mailer_config(config_path: str, templates_dir: str = "mailer-templates") -> Dict[str, Any]:
+    """
+    Load and validate the c7n-mailer config the way c7n-mailer's command line does:
+    defaults filled in, and templates looked up in the package's msg-templates
+    folders, the working directory and templates_dir.
+    """
+    import jsonschema
+    import c7n_mailer.cli
+    from c7n_mailer.utils import setup_defaults
+
+    with open(config_path) as file:
+        config = yaml.safe_load(file)
+    jsonschema.validate(config, c7n_mailer.cli.CONFIG_SCHEMA)
+    setup_defaults(config)
+    module_dir = os.path.dirname(os.path.abspath(c7n_mailer.cli.__file__))
+    config["templates_folders"] = [
+        os.path.abspath(os.path.join(module_dir, "msg-templates")),
+        os.path.abspath(os.path.join(module_dir, "..", "msg-templates")),
+        os.path.abspath("."),
+        os.path.abspath(os.path.expanduser(os.path.expandvars(templates_dir))),
+    ]
+    return config
+
+
+def run_mailer(config_path: str, aws: AwsSession, templates_dir: str = "mailer-templates") -> None:
+    """
+    Process the mailer queue in this process, on the shared session (assuming the
+    mailer's role from it when one is configured).
+    """
+    import logging
+    from c7n_mailer.sqs_queue_processor import MailerSqsQueueProcessor
+
+    config = mailer_config(config_path, templates_dir)
+    session = aws.session
+    if config.get("role"):
+        from c7n.credentials import assumed_session
+
+        session = assumed_session(config["role"], "CloudCustodianMailer", session=session, region=config.get("region"))
+    MailerSqsQueueProcessor(config, session, logging.getLogger("c7n_mailer")).run()
+
+
+class Driver:
+    """
+    Runs the whole tagging pipeline in one process: secrets, config templating, policy
+    generation, the c7n-org run, delta notifications, the mailer and run metrics.
+    Stage timings go to the same file as timed_stage in source.sh.
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        """
+        Initialize the Driver.
+
+        Args:
+            args (argparse.Namespace): Parsed command line.
+        """
+        self.args = args
+        self.aws = AwsSession()
+        self.schema = SchemaCache(args.state_dir)
+        self.secrets: Optional[SecretProvider] = None
+        self.due: List[str] = []
+        # Output of policies that started before this is left over from earlier runs.
+        self.started = time.time()
+        self.stages_path = os.getenv("STAGE_TIMINGS_FILE", os.path.join(args.state_dir, "stages.tsv"))
+
+    def log(self, message: str) -> None:
+        if self.args.verbose:
+            print(f"==> {message}", flush=True)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a stage and append it to the stage timings file.
+        """
+        self.log(f"Running {name}...")
+        start, status = time.time(), 0
+        try:
+            yield
+        except BaseException:
+            status = 1
+            raise
+        finally:
+            with open(self.stages_path, "a") as file:
+                file.write(f"{name}\t{start:.6f}\t{time.time():.6f}\t{status}\n")
+
+    def load_secrets(self) -> None:
+        """
+        Resolve the secrets with the shared session's SSM client and export them for
+        the config template and the mailer.
+        """
+        if os.getenv("C7N_SECRET_BACKEND", "ssm") == "ssm":
+            self.secrets = SecretProvider(
+                SsmBackend(client=self.aws.client("ssm")),
+                ttl=float(os.getenv("C7N_SECRET_TTL", "900")),
+                cache_path=os.getenv("C7N_SECRET_CACHE"),
+            )
+        else:
+            self.secrets = get_secret_provider()
+        values = self.secrets.get_many(list(SECRET_PARAMETERS))
+        for parameter_name, env_name in SECRET_PARAMETERS.items():
+            os.environ[env_name] = values[parameter_name]
+
+    def generate(self) -> List[str]:
+        """
+        Write the monolithic policy file, the shards and the tier bundles.
+
+        Returns:
+            List[str]: Shards changed since the last generation.
+        """
+        args = self.args
+        with open(args.policy_file, "w") as file:
+            dump_policies(generate_policies(resources_tags, secrets=self.secrets, notify=not args.no_notify), file)
+        changed = write_policy_shards(
+            resources_tags,
+            args.shard_dir,
+            secrets=self.secrets,
+            validate=self.schema.validate if args.validate else None,
+            notify=not args.no_notify,
+        )
+        tiers = {}
+        if os.path.exists(os.path.join(args.state_dir, "tiers.json")):
+            with open(os.path.join(args.state_dir, "tiers.json")) as file:
+                tiers = json.load(file)
+        write_tier_bundles(resources_tags, tiers, args.tier_dir, secrets=self.secrets, notify=not args.no_notify)
+        return changed
+
+    def policy_files(self, changed: List[str]) -> List[str]:
+        """
+        Return the policy files this run covers.
+        """
+        args = self.args
+        if args.tiered:
+            from tier_planner import TIERS, due_tiers, read_schedule
+
+            self.due = due_tiers(read_schedule(args.state_dir), full_sweep=args.full_sweep)
+            self.log(f"Due scan tiers: {', '.join(self.due)}")
+            return [
+                path for path in (os.path.join(args.tier_dir, f"{tier}.yml") for tier in TIERS if tier in self.due)
+                if os.path.exists(path)
+            ]
+        if args.changed_only:
+            return changed
+        return [args.policy_file]
+
+    def notify_deltas(self) -> None:
+        """
+        Record the run in the compliance state index and queue notifications for the
+        deltas only, then deliver owner digests when a digest queue is configured.
+        """
+        from compliance_state import ComplianceStore, send_deltas
+
+        store = ComplianceStore(os.path.join(self.args.state_dir, "compliance.db"))
+        try:
+            store.ingest_run(self.args.output_dir, since=self.started)
+            deltas = store.pending_deltas("sweep") + store.due_for_deletion(1)
+            notified = send_deltas(self.aws.client("sqs"), deltas, os.getenv("DIGEST_QUEUE_URL"), self.secrets)
+            store.record_notified(notified)
+        finally:
+            store.close()
+        if len(notified) < len(deltas):
+            raise RuntimeError(f"{len(deltas) - len(notified)} deltas were not notified")
+
+    def deliver_digests(self) -> None:
+        from digest_notifier import SlackSender, deliver
+
+        sender = SlackSender(os.environ["SLACK_WEBHOOK_URL"])
+        try:
+            _, failed = deliver(self.aws.client("sqs"), os.environ["DIGEST_QUEUE_URL"], sender)
+        finally:
+            sender.close()
+        if failed:
+            raise RuntimeError(f"{failed} owner digests were not delivered")
+
+    def report(self) -> None:
+        """
+        Export the run metrics and, in tiered mode, update the scan tiers. Best effort:
+        a failure here does not fail a completed run.
+        """
+        from run_metrics import export_metrics
+
+        state_dir = self.args.state_dir
+        try:
+            run_report = export_metrics(
+                self.args.output_dir,
+                self.stages_path,
+                os.path.join(state_dir, "run_report.json"),
+                os.path.join(state_dir, "c7n.prom"),
+                os.path.join(state_dir, "c7n.emf"),
+                since=self.started,
+            )
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Failed to export run metrics: {error}", file=sys.stderr)
+            return
+        if self.args.tiered:
+            from tier_planner import mark_done, update_plan
+
+            mark_done(state_dir, self.due)
+            update_plan(state_dir, run_report)
+
+    def startup(self) -> float:
+        """
+        Do everything that precedes the first API call: imports, the shared session and
+        the SSM client. Returns the seconds elapsed since the driver started.
+        """
+        self.aws.client("ssm")
+        return time.perf_counter() - STARTED
+
+    def run(self) -> None:
+        args = self.args
+        os.makedirs(args.state_dir, exist_ok=True)
+        open(self.stages_path, "w").close()
+        self.log(f"Ready for the first API call after {self.startup():.3f}s")
+
+        with self.stage("secrets"):
+            self.load_secrets()
+        with self.stage("config"):
+            render_template(args.config_template, os.path.splitext(args.config_template)[0])
+        with self.stage("policy-generator"):
+            changed = self.generate()
+        for policy_file in self.policy_files(changed):
+            with self.stage(f"c7n-org:{policy_file}"):
+                run_org(args.accounts, policy_file, args.output_dir)
+        if args.no_notify:
+            with self.stage("compliance-state"):
+                self.notify_deltas()
+            if os.getenv("DIGEST_QUEUE_URL"):
+                with self.stage("digest-notifier"):
+                    self.deliver_digests()
+        with self.stage("c7n-mailer"):
+            run_mailer(args.mailer_config, self.aws, args.mailer_templates)
+        self.report()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Return the driver's command line parser. C7N_FULL_SWEEP and C7N_DELTA_NOTIFY are
+    read when it is built.
+    """
+    parser = argparse.ArgumentParser(description="Run the tagging pipeline in a single process.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print progress.")
+    parser.add_argument("--accounts", default="accounts.yml", help="c7n-org accounts file.")
+    parser.add_argument("--config-template", default="config/config.yaml.template", help="Template rendered next to itself.")
+    parser.add_argument("--mailer-config", default="mailer.yml", help="c7n-mailer config file.")
+    parser.add_argument("--mailer-templates", default="mailer-templates", help="Directory of custom c7n-mailer templates.")
+    parser.add_argument("--policy-file", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "policies.yml"))
+    parser.add_argument("--shard-dir", default="policies/shards", help="Directory of policy shards.")
+    parser.add_argument("--tier-dir", default="policies/tiers", help="Directory of tier bundles.")
+    parser.add_argument("--output-dir", default="output", help="c7n-org output directory.")
+    parser.add_argument("--state-dir", default="state", help="Directory of run state and the schema cache.")
+    parser.add_argument("--validate", action="store_true", help="Validate changed shards against the cached schema.")
+    runs = parser.add_mutually_exclusive_group()
+    runs.add_argument("--changed-only", action="store_true", help="Only run shards changed since the last generation.")
+    runs.add_argument("--tiered", action="store_true", help="Only run the scan tiers that are due.")
+    parser.add_argument(
+        "--full-sweep",
+        action="store_true",
+        default=os.getenv("C7N_FULL_SWEEP", "").lower() in ("1", "true", "yes"),
+        help="With --tiered, run every tier.",
+    )
+    parser.add_argument(
+        "--no-notify",
+        action="store_true",
+        default=os.getenv("C7N_DELTA_NOTIFY", "").lower() in ("1", "true", "yes"),
+        help="Omit notify actions and notify compliance deltas instead.",
+    )
+    parser.add_argument("--startup-only", action="store_true", help="Print the time to the first API call and exit.")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    driver = Driver(args)
+    if args.startup_only:
+        print(json.dumps({"ready_seconds": driver.startup()}))
+    else:
+        driver.run()
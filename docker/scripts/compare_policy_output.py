@@ -0,0 +1,106 @@
+import io
+import json
+import time
+import argparse
+from typing import Dict, Any, Callable
+
+import yaml
+
+from policy_generator import Policy, dump_policies, generate_policies, resources_tags
+from secret_provider import OFFLINE_SECRETS, SecretProvider, StaticBackend
+
+LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _best_of(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Return the best wall time in seconds over several runs of func.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def generate_uninterned(secrets: SecretProvider) -> Dict[str, Any]:
+    """
+    Generate policies the way the generator did before interning: one copy of every
+    filter list and notify action per resource.
+    """
+    policies_list = []
+    for resource, config in resources_tags.items():
+        policy = Policy(resource=resource, tags=config.get("tags", []),
+                        delete_action=config.get("delete_action"), secrets=secrets)
+        policies_list.extend(policy.generate())
+    return {"policies": policies_list}
+
+
+def compare(repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Compare size, dump time and load time of the previous output against the compact outputs.
+
+    Args:
+        repeat (int): Number of timing runs per measurement; the best one is kept.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Metrics keyed by output variant.
+    """
+    secrets = SecretProvider(StaticBackend(OFFLINE_SECRETS))
+    baseline = generate_uninterned(secrets)
+    interned = generate_policies(resources_tags, secrets=secrets)
+
+    variants = {
+        "baseline-yaml": (
+            lambda stream: yaml.dump(baseline, stream, sort_keys=False, default_flow_style=False),
+            lambda text: yaml.load(text, Loader=LOADER),
+        ),
+        "compact-yaml": (
+            lambda stream: dump_policies(interned, stream, "yaml"),
+            lambda text: yaml.load(text, Loader=LOADER),
+        ),
+        "compact-json": (
+            lambda stream: dump_policies(interned, stream, "json"),
+            json.loads,
+        ),
+    }
+
+    expected = yaml.load(_render(variants["baseline-yaml"][0]), Loader=LOADER)
+    results = {}
+    for name, (dump, load) in variants.items():
+        text = _render(dump)
+        if load(text) != expected:
+            raise AssertionError(f"{name} output is not equivalent to the baseline")
+        results[name] = {
+            "bytes": len(text.encode()),
+            "dump_ms": _best_of(lambda: _render(dump), repeat) * 1000,
+            "load_ms": _best_of(lambda: load(text), repeat) * 1000,
+        }
+    return results
+
+
+def _render(dump: Callable[[io.StringIO], None]) -> str:
+    """
+    Run a dump function into a string buffer and return its content.
+    """
+    stream = io.StringIO()
+    dump(stream)
+    return stream.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare policy file size and parse cost per output format.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per measurement.")
+    args = parser.parse_args()
+
+    metrics = compare(args.repeat)
+    base = metrics["baseline-yaml"]
+    print(f"libyaml available: {getattr(yaml, '__with_libyaml__', False)}")
+    print(f"{'variant':<15}{'bytes':>10}{'size %':>9}{'dump ms':>10}{'load ms':>10}{'load %':>9}")
+    for variant, values in metrics.items():
+        print(
+            f"{variant:<15}{values['bytes']:>10}{100 * values['bytes'] / base['bytes']:>8.1f}%"
+            f"{values['dump_ms']:>10.1f}{values['load_ms']:>10.1f}"
+            f"{100 * values['load_ms'] / base['load_ms']:>8.1f}%"
+        )
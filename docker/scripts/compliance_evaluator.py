@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import argparse
+from datetime import datetime, timezone
+from collections import Counter
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import yaml
+
+from policy_generator import generate_policies, resources_tags
+from secret_provider import OFFLINE_SECRETS, SecretProvider, StaticBackend
+from tag_prescan import TAGGING_RESOURCE_TYPES, arn_resource_key
+
+# Value written by c7n's mark-for-op action: "Resource does not meet policy: <op>@<yyyy/mm/dd>".
+MARK_PATTERN = re.compile(r"([\w-]+)@(\d{4}/\d{2}/\d{2})")
+
+CUSTODIAN_TAG = "custodian_cleanup"
+
+ARN_KEY_RESOURCE_TYPES = {key: resource for resource, keys in TAGGING_RESOURCE_TYPES.items() for key in keys}
+
+
+def _popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+# int.bit_count (Python 3.10+) counts without formatting the bitmap as a string; the
+# image's Python 3.9 keeps the fallback.
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count  # noqa: F811
+
+
+class ResourceInventory:
+    """
+    Flat list of resources (type, account, tags) loaded from a tagging API dump or from
+    c7n output directories.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty inventory.
+        """
+        self.rows: List[Tuple[str, str, Dict[str, str]]] = []
+
+    def add(self, resource_type: str, account: str, tags: Dict[str, str]) -> None:
+        """
+        Add one resource.
+
+        Args:
+            resource_type (str): c7n resource type.
+            account (str): Account name or id.
+            tags (Dict[str, str]): The resource's tags.
+        """
+        self.rows.append((resource_type, account, tags))
+
+    @classmethod
+    def from_tagging_dump(cls, path: str) -> "ResourceInventory":
+        """
+        Load a tagging API dump: a JSON list of GetResources pages or of
+        ResourceTagMappingList entries. ARNs of unmapped resource types are skipped.
+        """
+        with open(path) as file:
+            data = json.load(file)
+        inventory = cls()
+        for item in data:
+            for mapping in item.get("ResourceTagMappingList", [item]):
+                arn = mapping["ResourceARN"]
+                resource_type = ARN_KEY_RESOURCE_TYPES.get(arn_resource_key(arn))
+                if resource_type:
+                    tags = {tag["Key"]: tag["Value"] for tag in mapping.get("Tags", [])}
+                    inventory.add(resource_type, arn.split(":")[4], tags)
+        return inventory
+
+    @classmethod
+    def from_c7n_output(cls, output_dir: str) -> "ResourceInventory":
+        """
+        Load c7n-org output laid out as <account>/<region>/<policy>/resources.json, taking
+        the resource type from each policy's metadata.json. Only unfiltered (inventory)
+        policies give a complete picture; resources seen by several policies of the same
+        account, region and type are counted once.
+        """
+        inventory = cls()
+        seen = set()
+        for root, _, files in os.walk(output_dir):
+            if "resources.json" not in files or "metadata.json" not in files:
+                continue
+            with open(os.path.join(root, "metadata.json")) as file:
+                resource_type = json.load(file)["policy"]["resource"]
+            with open(os.path.join(root, "resources.json")) as file:
+                resources = json.load(file)
+            account_region = os.path.relpath(os.path.dirname(root), output_dir)
+            account = account_region.split(os.sep)[0]
+            for resource in resources:
+                tags = resource.get("Tags") or []
+                if isinstance(tags, list):
+                    tags = {tag["Key"]: tag["Value"] for tag in tags}
+                identity = json.dumps({k: v for k, v in resource.items() if not k.startswith("c7n:")}, sort_keys=True, default=str)
+                key = (account_region, resource_type, identity)
+                if key not in seen:
+                    seen.add(key)
+                    inventory.add(resource_type, account, tags)
+        return inventory
+
+
+class TagMatrix:
+    """
+    Columnar resource-by-tag presence bitmaps for one resource type. Bit i of each
+    bitmap describes resource i, so filters evaluate as whole-column integer bit
+    operations instead of per-resource loops.
+    """
+
+    def __init__(self, rows: List[Tuple[str, Dict[str, str]]], as_of: datetime) -> None:
+        """
+        Build the bitmaps.
+
+        Args:
+            rows (List[Tuple[str, Dict[str, str]]]): (account, tags) per resource.
+            as_of (datetime): Date used to decide whether a mark-for-op is due.
+        """
+        self.size = len(rows)
+        self.all = (1 << self.size) - 1
+        width = (self.size + 7) // 8
+        present: Dict[str, bytearray] = {}
+        non_empty: Dict[str, bytearray] = {}
+        accounts: Dict[str, bytearray] = {}
+        due: Dict[str, bytearray] = {}
+        today = as_of.strftime("%Y/%m/%d")
+
+        # Set bits in bytearrays first; OR-ing shifted ints one by one is quadratic.
+        for index, (account, tags) in enumerate(rows):
+            byte, bit = index >> 3, 1 << (index & 7)
+            accounts.setdefault(account, bytearray(width))[byte] |= bit
+            for key, value in tags.items():
+                present.setdefault(key, bytearray(width))[byte] |= bit
+                if value:
+                    non_empty.setdefault(key, bytearray(width))[byte] |= bit
+            match = MARK_PATTERN.search(tags.get(CUSTODIAN_TAG, ""))
+            if match and match.group(2) <= today:
+                due.setdefault(match.group(1), bytearray(width))[byte] |= bit
+
+        def to_bits(columns: Dict[str, bytearray]) -> Dict[str, int]:
+            return {key: int.from_bytes(column, "little") for key, column in columns.items()}
+
+        self.present = to_bits(present)
+        self.non_empty = to_bits(non_empty)
+        self.accounts = to_bits(accounts)
+        self.due = to_bits(due)
+
+
+def compile_filter(spec: Any) -> Callable[[TagMatrix], int]:
+    """
+    Compile one c7n filter, as emitted by Policy.generate, into a bitmap function.
+
+    Supported: {"tag:X": "absent"}, {"tag:X": "not-null"}, {"or": [...]},
+    {"and": [...]}, {"not": [...]} and {"type": "marked-for-op", "op": ...}.
+
+    Args:
+        spec (Any): The filter definition.
+
+    Returns:
+        Callable[[TagMatrix], int]: Returns the bitmap of matching resources.
+
+    Raises:
+        ValueError: If the filter is not supported.
+    """
+    if isinstance(spec, dict) and spec.get("type") == "marked-for-op":
+        op = spec["op"]
+        return lambda matrix: matrix.due.get(op, 0)
+    if isinstance(spec, dict) and len(spec) == 1:
+        (key, value), = spec.items()
+        if key in ("or", "and", "not"):
+            children = [compile_filter(child) for child in value]
+            if key == "or":
+                return lambda matrix: _reduce(children, matrix, 0, int.__or__)
+            if key == "and":
+                return lambda matrix: _reduce(children, matrix, matrix.all, int.__and__)
+            return lambda matrix: matrix.all & ~_reduce(children, matrix, matrix.all, int.__and__)
+        if key.startswith("tag:") and value == "absent":
+            tag = key[len("tag:"):]
+            return lambda matrix: matrix.all & ~matrix.present.get(tag, 0)
+        if key.startswith("tag:") and value == "not-null":
+            tag = key[len("tag:"):]
+            return lambda matrix: matrix.non_empty.get(tag, 0)
+    raise ValueError(f"Unsupported filter: {spec!r}")
+
+
+def _reduce(children: List[Callable[[TagMatrix], int]], matrix: TagMatrix, initial: int, op: Callable[[int, int], int]) -> int:
+    result = initial
+    for child in children:
+        result = op(result, child(matrix))
+    return result
+
+
+def policy_kind(policy: Dict[str, Any]) -> str:
+    """
+    Classify a generated policy as "mark", "unmark", "delete" or "notify".
+    """
+    action_types = {action["type"] for action in policy.get("actions", [])}
+    if "mark-for-op" in action_types:
+        return "mark"
+    if "remove-tag" in action_types:
+        return "unmark"
+    if policy["name"].endswith("-delete"):
+        return "delete"
+    return "notify"
+
+
+def build_matrices(inventory: ResourceInventory, as_of: Optional[datetime] = None) -> Dict[str, TagMatrix]:
+    """
+    Build one TagMatrix per resource type of an inventory.
+
+    Args:
+        inventory (ResourceInventory): Resources to index.
+        as_of (Optional[datetime]): Evaluation date. Defaults to now (UTC).
+
+    Returns:
+        Dict[str, TagMatrix]: Matrices keyed by resource type.
+    """
+    as_of = as_of or datetime.now(timezone.utc)
+    by_type: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+    for resource_type, account, tags in inventory.rows:
+        by_type.setdefault(resource_type, []).append((account, tags))
+    return {resource_type: TagMatrix(rows, as_of) for resource_type, rows in by_type.items()}
+
+
+def evaluate(policies: List[Dict[str, Any]], matrices: Dict[str, TagMatrix]) -> Counter:
+    """
+    Count the resources each kind of policy would act on.
+
+    Args:
+        policies (List[Dict[str, Any]]): Generated policies.
+        matrices (Dict[str, TagMatrix]): Output of build_matrices.
+
+    Returns:
+        Counter: Counts keyed by (resource type, account, kind).
+    """
+    counts: Counter = Counter()
+    for policy in policies:
+        matrix = matrices.get(policy["resource"])
+        if matrix is None:
+            continue
+        # Top-level filters are implicitly and-ed.
+        matched = compile_filter({"and": policy.get("filters", [])})(matrix)
+        for account, account_bits in matrix.accounts.items():
+            count = _popcount(matched & account_bits)
+            if count:
+                counts[(policy["resource"], account, policy_kind(policy))] += count
+    return counts
+
+
+def what_if(
+    current: Dict[str, Dict[str, List[str]]],
+    proposed: Dict[str, Dict[str, List[str]]],
+    inventory: ResourceInventory,
+    as_of: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Compare the current and a proposed resource configuration over an inventory.
+
+    Returns:
+        Dict[str, Any]: "by_type" and "by_account" entries with current, proposed and
+        delta counts per kind.
+    """
+    secrets = SecretProvider(StaticBackend(OFFLINE_SECRETS))
+    matrices = build_matrices(inventory, as_of)
+    before = evaluate(generate_policies(current, secrets=secrets)["policies"], matrices)
+    after = evaluate(generate_policies(proposed, secrets=secrets)["policies"], matrices)
+
+    report: Dict[str, Any] = {"by_type": {}, "by_account": {}}
+    for (resource_type, account, kind) in set(before) | set(after):
+        for section, name in (("by_type", resource_type), ("by_account", account)):
+            entry = report[section].setdefault(name, {}).setdefault(kind, {"current": 0, "proposed": 0, "delta": 0})
+            entry["current"] += before[(resource_type, account, kind)]
+            entry["proposed"] += after[(resource_type, account, kind)]
+            entry["delta"] = entry["proposed"] - entry["current"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="What-if analysis of tag policy changes over a resource inventory.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tagging-dump", help="JSON dump of tagging:GetResources output.")
+    source.add_argument("--c7n-output", help="c7n-org output directory with resources.json files.")
+    parser.add_argument("--proposed", help="YAML/JSON resource configuration to compare with the current one.")
+    parser.add_argument("--json", dest="json_output", help="Write the full report to this file.")
+    args = parser.parse_args()
+
+    if args.tagging_dump:
+        resource_inventory = ResourceInventory.from_tagging_dump(args.tagging_dump)
+    else:
+        resource_inventory = ResourceInventory.from_c7n_output(args.c7n_output)
+    proposed_config = resources_tags
+    if args.proposed:
+        with open(args.proposed) as file:
+            proposed_config = yaml.safe_load(file)
+
+    result = what_if(resources_tags, proposed_config, resource_inventory)
+    if args.json_output:
+        with open(args.json_output, "w") as file:
+            json.dump(result, file, indent=2, sort_keys=True)
+    print(f"{'resource type':<30}{'kind':<8}{'current':>10}{'proposed':>10}{'delta':>8}")
+    for resource_name, kinds in sorted(result["by_type"].items()):
+        for kind_name, entry in sorted(kinds.items()):
+            print(f"{resource_name:<30}{kind_name:<8}{entry['current']:>10}{entry['proposed']:>10}{entry['delta']:>+8}")
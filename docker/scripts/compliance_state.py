@@ -0,0 +1,640 @@
+import os
+import re
+import json
+import zlib
+import base64
+import sqlite3
+import hashlib
+import argparse
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from compliance_evaluator import MARK_PATTERN, policy_kind
+from policy_generator import generate_policies, resources_tags
+from run_metrics import policy_outputs
+from secret_provider import SecretProvider
+
+# Fields c7n resources commonly use as identifiers, checked in order when a resource has no ARN.
+ID_FIELDS = (
+    "InstanceId", "VolumeId", "SnapshotId", "ImageId", "GroupId", "VpcId", "SubnetId",
+    "DBInstanceIdentifier", "DBClusterIdentifier", "FunctionName", "TableName", "Name", "Id",
+)
+ARN_FIELDS = ("Arn", "ARN", "arn", "c7n:arn")
+
+# Identifier of each resource type whose records also carry another type's identifier
+# (a subnet has a VpcId) or are better keyed by name than by hash. Checked first.
+TYPE_ID_FIELDS = {
+    "ec2": "InstanceId",
+    "ebs": "VolumeId",
+    "ebs-snapshot": "SnapshotId",
+    "ami": "ImageId",
+    "security-group": "GroupId",
+    "vpc": "VpcId",
+    "subnet": "SubnetId",
+    "route-table": "RouteTableId",
+    "internet-gateway": "InternetGatewayId",
+    "nat-gateway": "NatGatewayId",
+    "elastic-ip": "AllocationId",
+    "network-acl": "NetworkAclId",
+    "peering-connection": "VpcPeeringConnectionId",
+    "vpn-gateway": "VpnGatewayId",
+    "prefix-list": "PrefixListId",
+    "lambda": "FunctionName",
+    "dynamodb-table": "TableName",
+    "rds": "DBInstanceIdentifier",
+    "rds-cluster": "DBClusterIdentifier",
+}
+
+# ARN of resource types whose records carry no ARN field, built from their name.
+ARN_TEMPLATES = {
+    "s3": ("Name", "arn:aws:s3:::{}"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    arn TEXT PRIMARY KEY,
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    action_date TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    last_event TEXT,
+    last_notified TEXT,
+    owner TEXT,
+    org TEXT
+);
+CREATE INDEX IF NOT EXISTS resources_scope ON resources (account, resource_type, status);
+CREATE INDEX IF NOT EXISTS resources_status ON resources (status, action_date);
+CREATE TABLE IF NOT EXISTS pending_deltas (
+    arn TEXT NOT NULL,
+    event TEXT NOT NULL,
+    source TEXT NOT NULL,
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    resource TEXT,
+    owner TEXT,
+    org TEXT,
+    created TEXT NOT NULL,
+    PRIMARY KEY (arn, event)
+);
+"""
+
+# Status recorded for the resources matched by each kind of policy.
+KIND_STATUS = {"mark": "marked", "notify": "noncompliant", "unmark": "compliant", "delete": "deleted"}
+KIND_PRECEDENCE = {"notify": 0, "mark": 1, "unmark": 2, "delete": 3}
+VIOLATION_STATUSES = ("marked", "noncompliant")
+
+# Resources per c7n-mailer message, as c7n's notify action batches them, and the SQS
+# message size limit their encoded body must stay under.
+MAILER_BATCH_SIZE = 250
+MAX_MESSAGE_BYTES = 256 * 1024
+
+# Slack message overrides applied on top of each resource type's mark notification.
+EVENT_MESSAGES = {
+    "new-violation": {},
+    "resolved": {
+        "slack_msg_color": "good",
+        "violation_desc": "Your resource is now compliant.",
+        "action_desc": "You can breathe easy now.",
+    },
+    "deletion-imminent": {
+        "slack_msg_color": "danger",
+        "violation_desc": "Tags still missing in the following resources, which are due for deletion.",
+        "action_desc": "Tag resources accordingly before they are deleted. Ask DevOps team for help.",
+    },
+    "deleted": {
+        "slack_msg_color": "danger",
+        "violation_desc": "Tags missing in the resources for 4 days.",
+        "action_desc": "The resources have been deleted.",
+    },
+}
+
+
+def resource_key(resource_type: str, account: str, region: str, resource: Dict[str, Any]) -> str:
+    """
+    Return a stable key for a c7n resource. Every resource of a type resolves through
+    the same rule: a pseudo-ARN of its TYPE_ID_FIELDS identifier, otherwise its ARN
+    (an ARN field, a service-specific one such as TopicArn, or built from its name
+    with ARN_TEMPLATES), otherwise a pseudo-ARN of a generic identifier, with a
+    content hash as a last resort.
+    """
+    identifier = resource.get(TYPE_ID_FIELDS.get(resource_type, ""))
+    if identifier is None:
+        for name in ARN_FIELDS:
+            if resource.get(name):
+                return resource[name]
+        arn = next((value for name, value in resource.items() if name.endswith(("Arn", "ARN")) and value), None)
+        if isinstance(arn, str) and arn.startswith("arn:"):
+            return arn
+        if resource_type in ARN_TEMPLATES and resource.get(ARN_TEMPLATES[resource_type][0]):
+            name_field, template = ARN_TEMPLATES[resource_type]
+            return template.format(resource[name_field])
+        identifier = next((resource[name] for name in ID_FIELDS if resource.get(name)), None)
+    if identifier is None:
+        content = json.dumps({k: v for k, v in resource.items() if not k.startswith("c7n:")}, sort_keys=True, default=str)
+        identifier = hashlib.sha256(content.encode()).hexdigest()[:16]
+    return f"c7n:{resource_type}:{region}:{account}:{identifier}"
+
+
+def resource_record(resource_type: str, identifier: str) -> Dict[str, Any]:
+    """
+    Return the identifying fields the sweep's c7n records carry for a resource known
+    only by its ARN (or its EC2 id), so that resource_key gives the event worker and
+    the sweep the same key: its TYPE_ID_FIELDS identifier, its name for ARN_TEMPLATES
+    types, otherwise the ARN itself.
+    """
+    if resource_type in TYPE_ID_FIELDS:
+        if identifier.startswith("arn:"):
+            # arn:aws:lambda:<region>:<account>:function:<name>[:<qualifier>], ...:instance/i-...
+            resource = re.split("[:/]", identifier.split(":", 5)[5], maxsplit=1)[-1]
+            identifier = re.split("[:/]", resource)[0]
+        return {TYPE_ID_FIELDS[resource_type]: identifier}
+    if resource_type in ARN_TEMPLATES:
+        name_field, template = ARN_TEMPLATES[resource_type]
+        prefix = template.split("{}")[0]
+        if identifier.startswith(prefix):
+            return {name_field: identifier[len(prefix):]}
+    return {"Arn": identifier}
+
+
+def _timestamp(moment: datetime) -> str:
+    """
+    Format a time for the last_seen and first_seen columns, comparable as text.
+    """
+    return moment.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+@dataclass
+class Delta:
+    """
+    A compliance change worth notifying about.
+    """
+
+    arn: str
+    account: str
+    region: str
+    resource_type: str
+    event: str
+    resource: Dict[str, Any] = field(default_factory=dict)
+    owner: Optional[str] = None
+    org: Optional[str] = None
+
+
+class ComplianceStore:
+    """
+    SQLite-backed index of the compliance status of every resource seen by the
+    tagging policies, keyed by resource ARN.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open (and create if needed) the store.
+
+        Args:
+            path (str): SQLite database file, or ":memory:".
+        """
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def ingest_run(self, output_dir: str, now: Optional[datetime] = None, since: Optional[float] = None) -> List[Delta]:
+        """
+        Record a c7n-org run and return the compliance deltas it produced.
+
+        Resources matched by the run take the status of their policy kind. In every
+        (account, region, resource type) the run covered, previously non-compliant
+        resources of notify-only types that were last seen before the run started
+        and are no longer matched are resolved, so hourly runs resolve within the hour.
+        Marked resources are left alone until the unmark or delete policy sees them,
+        since the mark policy skips already marked resources.
+
+        Args:
+            output_dir (str): c7n-org output directory.
+            now (Optional[datetime]): Ingestion time. Defaults to now (UTC).
+            since (Optional[float]): Start of the run (epoch seconds). Output left in
+                output_dir by policies that did not run since then is ignored, so it
+                cannot bring back violations resolved in the meantime.
+
+        The deltas are also queued as pending in the same transaction, until
+        record_notified confirms their delivery (see pending_deltas).
+
+        Returns:
+            List[Delta]: New violations, resolutions and deletions.
+        """
+        now = now or datetime.now(timezone.utc)
+        observed, scopes = self._read_output(output_dir, now, since)
+        stamp = _timestamp(now)
+
+        with self.db:
+            deltas = self._upsert(observed, stamp)
+            for (account, region, resource_type), started in scopes.items():
+                resolved = self.db.execute(
+                    """
+                    SELECT arn, owner, org FROM resources
+                    WHERE account = ? AND resource_type = ? AND region = ? AND status = 'noncompliant'
+                      AND last_seen < ?
+                    """,
+                    (account, resource_type, region, started),
+                ).fetchall()
+                for row in resolved:
+                    deltas.append(Delta(row["arn"], account, region, resource_type, "resolved", owner=row["owner"], org=row["org"]))
+                self.db.executemany(
+                    "UPDATE resources SET status = 'compliant', last_seen = ? WHERE arn = ?",
+                    [(stamp, row["arn"]) for row in resolved],
+                )
+            self._queue(deltas, "sweep", stamp)
+        return deltas
+
+    def record_evaluations(self, observed: Dict[str, Tuple], now: Optional[datetime] = None) -> List[Delta]:
+        """
+        Record statuses evaluated outside a c7n-org run (see event_worker.py) and return
+        the deltas. Unlike ingest_run, nothing is resolved by absence.
+
+        Args:
+            observed (Dict[str, Tuple]): Per resource key, (account, region, resource type,
+                status, action date, resource, owner, org).
+            now (Optional[datetime]): Evaluation time. Defaults to now (UTC).
+
+        Returns:
+            List[Delta]: New violations and resolutions, also queued as pending.
+        """
+        stamp = _timestamp(now or datetime.now(timezone.utc))
+        with self.db:
+            deltas = self._upsert(observed, stamp)
+            self._queue(deltas, "events", stamp)
+        return deltas
+
+    def pending_deltas(self, source: Optional[str] = None) -> List[Delta]:
+        """
+        Return the deltas recorded but not yet confirmed as notified, oldest first,
+        including those whose delivery failed in an earlier run.
+
+        Args:
+            source (Optional[str]): Only those recorded by "sweep" (ingest_run) or
+                "events" (record_evaluations).
+        """
+        query = "SELECT * FROM pending_deltas"
+        params: Tuple[str, ...] = ()
+        if source:
+            query += " WHERE source = ?"
+            params = (source,)
+        return [
+            Delta(
+                row["arn"], row["account"], row["region"], row["resource_type"], row["event"],
+                json.loads(row["resource"]) if row["resource"] else {}, row["owner"], row["org"],
+            )
+            for row in self.db.execute(query + " ORDER BY created", params)
+        ]
+
+    def due_for_deletion(self, within_days: int = 1, today: Optional[date] = None) -> List[Delta]:
+        """
+        Return marked resources whose deletion is due within the given number of days
+        and that were not yet warned about.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        limit = (today + timedelta(days=within_days)).isoformat()
+        rows = self.db.execute(
+            """
+            SELECT arn, account, region, resource_type, owner, org FROM resources
+            WHERE status = 'marked' AND action_date <= ?
+              AND COALESCE(last_event, '') != 'deletion-imminent'
+            """,
+            (limit,),
+        ).fetchall()
+        return [
+            Delta(
+                row["arn"], row["account"], row["region"], row["resource_type"], "deletion-imminent",
+                owner=row["owner"], org=row["org"],
+            )
+            for row in rows
+        ]
+
+    def record_notified(self, deltas: Iterable[Delta], when: Optional[datetime] = None) -> None:
+        """
+        Record that the given deltas were notified, removing them from the pending ones.
+        """
+        stamp = (when or datetime.now(timezone.utc)).isoformat()
+        deltas = list(deltas)
+        with self.db:
+            self.db.executemany(
+                "UPDATE resources SET last_event = ?, last_notified = ? WHERE arn = ?",
+                [(delta.event, stamp, delta.arn) for delta in deltas],
+            )
+            self.db.executemany(
+                "DELETE FROM pending_deltas WHERE arn = ? AND event = ?",
+                [(delta.arn, delta.event) for delta in deltas],
+            )
+
+    def summary(self, account: Optional[str] = None) -> List[Tuple[str, str, str, int]]:
+        """
+        Count resources per account, resource type and status, using the scope index.
+        """
+        query = "SELECT account, resource_type, status, COUNT(*) FROM resources"
+        params: Tuple[str, ...] = ()
+        if account:
+            query += " WHERE account = ?"
+            params = (account,)
+        query += " GROUP BY account, resource_type, status ORDER BY account, resource_type, status"
+        return [tuple(row) for row in self.db.execute(query, params)]
+
+    def _upsert(self, observed: Dict[str, Tuple], now: str) -> List[Delta]:
+        deltas = []
+        previous = self._fetch_statuses(observed)
+        rows = []
+        for key, (account, region, resource_type, status, action_date, resource, owner, org) in observed.items():
+            event = self._transition(previous.get(key), status)
+            if event:
+                deltas.append(Delta(key, account, region, resource_type, event, resource, owner, org))
+            rows.append((key, account, region, resource_type, status, action_date, now, now, owner, org))
+        self.db.executemany(
+            """
+            INSERT INTO resources (
+                arn, account, region, resource_type, status, action_date, first_seen, last_seen, owner, org
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (arn) DO UPDATE SET
+                status = excluded.status,
+                last_event = CASE WHEN resources.status = excluded.status THEN resources.last_event END,
+                action_date = COALESCE(excluded.action_date, resources.action_date),
+                last_seen = excluded.last_seen,
+                owner = excluded.owner,
+                org = excluded.org
+            """,
+            rows,
+        )
+        return deltas
+
+    def _queue(self, deltas: List[Delta], source: str, stamp: str) -> None:
+        self.db.executemany(
+            """
+            INSERT OR REPLACE INTO pending_deltas (
+                arn, event, source, account, region, resource_type, resource, owner, org, created
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    delta.arn, delta.event, source, delta.account, delta.region, delta.resource_type,
+                    json.dumps(delta.resource, default=str), delta.owner, delta.org, stamp,
+                )
+                for delta in deltas
+            ],
+        )
+
+    def _fetch_statuses(self, observed: Dict[str, Any]) -> Dict[str, str]:
+        statuses = {}
+        keys = list(observed)
+        # Stay below SQLite's default limit of bound parameters per statement.
+        for start in range(0, len(keys), 900):
+            chunk = keys[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self.db.execute(f"SELECT arn, status FROM resources WHERE arn IN ({placeholders})", chunk):
+                statuses[row["arn"]] = row["status"]
+        return statuses
+
+    @staticmethod
+    def _transition(before: Optional[str], after: str) -> Optional[str]:
+        if after in VIOLATION_STATUSES and before not in VIOLATION_STATUSES:
+            return "new-violation"
+        if after == "compliant" and before in VIOLATION_STATUSES:
+            return "resolved"
+        if after == "deleted" and before != "deleted":
+            return "deleted"
+        return None
+
+    @staticmethod
+    def _read_output(
+        output_dir: str, now: datetime, since: Optional[float] = None,
+    ) -> Tuple[Dict[str, Tuple], Dict[Tuple[str, str, str], str]]:
+        """
+        Collect the resources matched per policy from c7n-org output (only the policies
+        executed since the given run start, see run_metrics.policy_outputs), keeping for
+        each resource the status of its highest-precedence policy kind, and the time
+        each (account, region, resource type) scope started to be scanned.
+        """
+        today = now.date()
+        observed: Dict[str, Tuple] = {}
+        precedence: Dict[str, int] = {}
+        scopes: Dict[Tuple[str, str, str], str] = {}
+        for root, account, region, metadata in policy_outputs(output_dir, since):
+            if not os.path.exists(os.path.join(root, "resources.json")):
+                continue
+            policy, execution = metadata["policy"], metadata.get("execution", {})
+            with open(os.path.join(root, "resources.json")) as file:
+                resources = json.load(file)
+            resource_type = policy["resource"]
+            kind = policy_kind(policy)
+            started = _timestamp(datetime.fromtimestamp(execution["start"], timezone.utc) if "start" in execution else now)
+            scope = (account, region, resource_type)
+            scopes[scope] = min(scopes.get(scope, started), started)
+            mark_days = next((a.get("days", 4) for a in policy.get("actions", []) if a["type"] == "mark-for-op"), 4)
+            for resource in resources:
+                key = resource_key(resource_type, account, region, resource)
+                if precedence.get(key, -1) >= KIND_PRECEDENCE[kind]:
+                    continue
+                precedence[key] = KIND_PRECEDENCE[kind]
+                action_date = None
+                if kind == "mark":
+                    action_date = (today + timedelta(days=mark_days)).isoformat()
+                tags = resource.get("Tags") or []
+                if isinstance(tags, list):
+                    tags = {tag["Key"]: tag["Value"] for tag in tags}
+                match = MARK_PATTERN.search(tags.get("custodian_cleanup", ""))
+                if match:
+                    action_date = match.group(2).replace("/", "-")
+                observed[key] = (
+                    account, region, resource_type, KIND_STATUS[kind], action_date, resource,
+                    tags.get("AdminEmail"), tags.get("OwningOrg"),
+                )
+        return observed, scopes
+
+
+def encode_mailer_message(message: Dict[str, Any]) -> str:
+    """
+    Encode a message the way c7n's SQS notify transport does, for c7n-mailer.
+    """
+    return base64.b64encode(zlib.compress(json.dumps(message).encode("utf8"))).decode("ascii")
+
+
+def build_messages(deltas: List[Delta], policies: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], List[Delta]]]:
+    """
+    Group deltas into c7n-mailer messages per resource type, account, region and
+    event, in batches of MAILER_BATCH_SIZE resources like c7n's notify action, using
+    each resource type's mark notification as the template. Deltas of types without
+    a mark notification are left out.
+
+    Args:
+        deltas (List[Delta]): Deltas to notify.
+        policies (List[Dict[str, Any]]): Generated policies with their notify actions.
+
+    Returns:
+        List[Tuple[Dict[str, Any], List[Delta]]]: Messages in the c7n SQS transport
+        format, with the deltas each one notifies.
+    """
+    templates = {}
+    for policy in policies:
+        if policy["name"].endswith("-mark"):
+            templates[policy["resource"]] = (policy, next(a for a in policy["actions"] if a["type"] == "notify"))
+
+    groups: Dict[Tuple[str, str, str, str], List[Delta]] = {}
+    for delta in deltas:
+        groups.setdefault((delta.resource_type, delta.account, delta.region, delta.event), []).append(delta)
+
+    messages = []
+    for (resource_type, account, region, event), group in groups.items():
+        if resource_type not in templates:
+            continue
+        policy, action = templates[resource_type]
+        for start in range(0, len(group), MAILER_BATCH_SIZE):
+            batch = group[start:start + MAILER_BATCH_SIZE]
+            messages.append(({
+                "event": None,
+                "account_id": account,
+                "account": account,
+                "region": region,
+                "execution_start": datetime.now(timezone.utc).timestamp(),
+                "policy": policy,
+                "action": {**action, **EVENT_MESSAGES[event]},
+                "resources": [delta.resource or {"Arn": delta.arn} for delta in batch],
+            }, batch))
+    return messages
+
+
+def _fit_message(message: Dict[str, Any], deltas: List[Delta]) -> List[Tuple[str, List[Delta]]]:
+    """
+    Encode a message, splitting its resources in halves until every body fits in an
+    SQS message. A single resource too large on its own is sent as its ARN only.
+    """
+    body = encode_mailer_message(message)
+    if len(body) <= MAX_MESSAGE_BYTES:
+        return [(body, deltas)]
+    if len(deltas) == 1:
+        if message["resources"] == [{"Arn": deltas[0].arn}]:
+            raise ValueError(f"Notification of {deltas[0].arn} exceeds the SQS message size limit")
+        return _fit_message(dict(message, resources=[{"Arn": deltas[0].arn}]), deltas)
+    half = len(deltas) // 2
+    return (
+        _fit_message(dict(message, resources=message["resources"][:half]), deltas[:half])
+        + _fit_message(dict(message, resources=message["resources"][half:]), deltas[half:])
+    )
+
+
+def queue_url_from_arn(queue_arn: str) -> str:
+    """
+    Convert an SQS queue ARN into its queue URL.
+    """
+    _, partition, _, region, account, name = queue_arn.split(":", 5)
+    domain = "amazonaws.com.cn" if partition == "aws-cn" else "amazonaws.com"
+    return f"https://sqs.{region}.{domain}/{account}/{name}"
+
+
+def send_messages(sqs_client: Any, queue_url: str, messages: List[Tuple[Dict[str, Any], List[Delta]]]) -> List[Delta]:
+    """
+    Send c7n-mailer messages to the mailer queue. A message that cannot be sent does
+    not stop the others.
+
+    Args:
+        sqs_client (Any): A boto3 SQS client or a stand-in with send_message.
+        queue_url (str): Mailer queue URL.
+        messages (List[Tuple[Dict[str, Any], List[Delta]]]): Output of build_messages.
+
+    Returns:
+        List[Delta]: The deltas whose messages were sent.
+    """
+    sent: List[Delta] = []
+    for message, deltas in messages:
+        try:
+            bodies = _fit_message(message, deltas)
+        except ValueError as error:
+            print(error)
+            continue
+        for body, body_deltas in bodies:
+            try:
+                sqs_client.send_message(
+                    QueueUrl=queue_url,
+                    MessageBody=body,
+                    MessageAttributes={
+                        "mtype": {"DataType": "String", "StringValue": "http://www.cloudcustodian.io/sqs/message/v1"},
+                    },
+                )
+            except Exception as error:  # noqa: BLE001 - the deltas stay pending for the next run
+                print(f"Failed to send a notification of {len(body_deltas)} deltas: {error}")
+                continue
+            sent.extend(body_deltas)
+    return sent
+
+
+def send_deltas(
+    sqs_client: Any,
+    deltas: List[Delta],
+    digest_queue_url: Optional[str] = None,
+    secrets: Optional[SecretProvider] = None,
+) -> List[Delta]:
+    """
+    Notify deltas: as per-owner digests on the digest queue when one is given,
+    otherwise as c7n-mailer messages on the mailer queue (QUEUE_URL or QUEUE_ARN),
+    built from the notify actions of policies generated with secrets.
+
+    Only the returned deltas may be recorded as notified; the others stay pending.
+    Digests are enqueued all or nothing (enqueue_digests raises on failure).
+
+    Returns:
+        List[Delta]: The deltas notified, including those of resource types without
+        a notification, which have nothing to send.
+    """
+    if digest_queue_url:
+        from digest_notifier import build_digests, enqueue_digests
+
+        enqueue_digests(sqs_client, digest_queue_url, build_digests(deltas))
+        return list(deltas)
+    messages = build_messages(deltas, generate_policies(resources_tags, secrets=secrets)["policies"])
+    covered = {delta.resource_type for _, batch in messages for delta in batch}
+    sent = send_messages(sqs_client, os.getenv("QUEUE_URL") or queue_url_from_arn(os.environ["QUEUE_ARN"]), messages)
+    return [delta for delta in deltas if delta.resource_type not in covered] + sent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the compliance state index and send delta notifications.")
+    parser.add_argument("--db", default="state/compliance.db", help="SQLite state database.")
+    parser.add_argument("--output-dir", default="output", help="c7n-org output directory to ingest.")
+    parser.add_argument("--since", type=float, help="Run start (epoch seconds); older policy output is ignored.")
+    parser.add_argument("--imminent-days", type=int, default=1, help="Warn this many days before deletion.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the deltas without sending them.")
+    parser.add_argument("--report", action="store_true", help="Print resource counts per account, type and status.")
+    parser.add_argument(
+        "--digest-queue-url",
+        default=os.getenv("DIGEST_QUEUE_URL"),
+        help="Enqueue per-owner digests here instead of one c7n-mailer message per resource type.",
+    )
+    args = parser.parse_args()
+
+    store = ComplianceStore(args.db)
+    if args.report:
+        for summary_row in store.summary():
+            print("\t".join(str(value) for value in summary_row))
+    else:
+        store.ingest_run(args.output_dir, since=args.since)
+        # Pending deltas include those of earlier runs whose delivery failed.
+        run_deltas = store.pending_deltas("sweep") + store.due_for_deletion(args.imminent_days)
+        if args.dry_run:
+            for run_delta in run_deltas:
+                print(f"{run_delta.event}\t{run_delta.account}\t{run_delta.region}\t{run_delta.arn}")
+        else:
+            import boto3
+            sqs = boto3.client("sqs", region_name=os.getenv("AWS_REGION"))
+            notified = send_deltas(sqs, run_deltas, args.digest_queue_url)
+            store.record_notified(notified)
+            print(f"{len(notified)} of {len(run_deltas)} deltas notified.")
+            if len(notified) < len(run_deltas):
+                store.close()
+                raise SystemExit(1)
+    store.close()
@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import queue
+import random
+import asyncio
+import argparse
+import http.client
+from urllib.parse import urlsplit
+from typing import List, Dict, Any, Optional, Tuple
+
+from compliance_state import Delta
+from secret_provider import get_secret_provider
+
+# Slack colors used by Policy.generate for each kind of compliance event.
+SEVERITY_BY_EVENT = {
+    "new-violation": "warning",
+    "deletion-imminent": "danger",
+    "deleted": "danger",
+    "resolved": "good",
+}
+SEVERITY_TITLES = {
+    "danger": "Resources deleted or about to be deleted",
+    "warning": "Resources missing required tags",
+    "good": "Resources now compliant",
+}
+
+# SendMessageBatch limits: 10 entries and 256 KiB per request.
+MAX_BATCH_ENTRIES = 10
+MAX_BATCH_BYTES = 256 * 1024
+# A digest is split into parts that each fit in one message, with room to spare for
+# the envelope, and that stay readable in Slack.
+MAX_DIGEST_ITEMS = 500
+MAX_DIGEST_BYTES = MAX_BATCH_BYTES - 4 * 1024
+# Slack truncates long attachment texts, so the rest is summarized as "+N more".
+MAX_SLACK_LINES = 50
+MAX_SLACK_CHARS = 7000
+
+
+def _serialize(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+def build_digests(deltas: List[Delta]) -> List[Dict[str, Any]]:
+    """
+    Coalesce deltas into one digest per owner and severity, across resource types,
+    accounts and regions. Large digests are split into parts of at most
+    MAX_DIGEST_ITEMS items and MAX_DIGEST_BYTES serialized bytes, numbered by
+    "part" and "parts".
+
+    Args:
+        deltas (List[Delta]): Deltas from ComplianceStore.
+
+    Returns:
+        List[Dict[str, Any]]: Digests with "owner", "org", "severity", "part", "parts" and "items".
+    """
+    grouped: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+    for delta in deltas:
+        owner, org = delta.owner or "unowned", delta.org or "unowned"
+        grouped.setdefault((owner, org, SEVERITY_BY_EVENT[delta.event]), []).append({
+            "event": delta.event,
+            "resource_type": delta.resource_type,
+            "account": delta.account,
+            "region": delta.region,
+            "arn": delta.arn,
+        })
+
+    digests: List[Dict[str, Any]] = []
+    for (owner, org, severity), items in grouped.items():
+        header = {"owner": owner, "org": org, "severity": severity, "part": 0, "parts": 0, "items": []}
+        base = len(_serialize(header).encode())
+        chunks: List[List[Dict[str, Any]]] = []
+        size = base
+        for item in items:
+            item_size = len(_serialize(item).encode()) + 1
+            if not chunks or len(chunks[-1]) == MAX_DIGEST_ITEMS or size + item_size > MAX_DIGEST_BYTES:
+                chunks.append([])
+                size = base
+            chunks[-1].append(item)
+            size += item_size
+        for part, chunk in enumerate(chunks, start=1):
+            digests.append(dict(header, part=part, parts=len(chunks), items=chunk))
+    return digests
+
+
+def enqueue_digests(sqs_client: Any, queue_url: str, digests: List[Dict[str, Any]]) -> int:
+    """
+    Enqueue digests with SendMessageBatch, packing as many as the batch limits allow.
+
+    Args:
+        sqs_client (Any): A boto3 SQS client or a stand-in with send_message_batch.
+        queue_url (str): Digest queue URL.
+        digests (List[Dict[str, Any]]): Digests from build_digests.
+
+    Returns:
+        int: Number of SendMessageBatch calls made.
+
+    Raises:
+        RuntimeError: If some entries are still rejected after a retry.
+    """
+    bodies = [_serialize(digest) for digest in digests]
+    batches: List[List[str]] = []
+    size = 0
+    for body in bodies:
+        body_size = len(body.encode())
+        if body_size > MAX_BATCH_BYTES:
+            raise ValueError(f"Digest message of {body_size} bytes exceeds the SQS limit")
+        if not batches or len(batches[-1]) == MAX_BATCH_ENTRIES or size + body_size > MAX_BATCH_BYTES:
+            batches.append([])
+            size = 0
+        batches[-1].append(body)
+        size += body_size
+
+    calls = 0
+    for batch in batches:
+        entries = [{"Id": str(index), "MessageBody": body} for index, body in enumerate(batch)]
+        for _ in range(2):
+            response = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            calls += 1
+            failed = {failure["Id"] for failure in response.get("Failed", [])}
+            entries = [entry for entry in entries if entry["Id"] in failed]
+            if not entries:
+                break
+        if entries:
+            raise RuntimeError(f"{len(entries)} digest messages were rejected by SQS")
+    return calls
+
+
+def format_digest(digest: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render a digest as a Slack incoming-webhook payload. Items beyond MAX_SLACK_LINES
+    lines or MAX_SLACK_CHARS characters are summarized as "+N more".
+    """
+    items = digest["items"]
+    text = f"Owner: {digest['owner']} ({digest['org']})"
+    shown = 0
+    for item in items[:MAX_SLACK_LINES]:
+        line = f"`{item['resource_type']}` {item['account']}/{item['region']} {item['arn']} ({item['event']})"
+        if len(text) + len(line) + 1 > MAX_SLACK_CHARS:
+            break
+        text += "\n" + line
+        shown += 1
+    if shown < len(items):
+        text += f"\n+{len(items) - shown} more"
+    title = f"{SEVERITY_TITLES[digest['severity']]} ({len(items)})"
+    if digest.get("parts", 1) > 1:
+        title += f", part {digest['part']} of {digest['parts']}"
+    return {
+        "attachments": [{
+            "color": digest["severity"],
+            "title": title,
+            "text": text,
+        }],
+    }
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket limiting the rate of outgoing requests.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """
+        Initialize the bucket full.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (int): Maximum burst size.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available and take it.
+        """
+        # Created lazily so the lock binds to the running event loop.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SlackSender:
+    """
+    Posts payloads to a Slack webhook over a pool of persistent HTTP connections,
+    rate limited by a token bucket, retrying throttled or failed requests with
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        webhook_url: str,
+        pool_size: int = 4,
+        rate: float = 1.0,
+        burst: int = 1,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+    ) -> None:
+        """
+        Initialize the SlackSender.
+
+        Args:
+            webhook_url (str): Incoming webhook URL (http URLs are accepted for local testing).
+            pool_size (int): Number of pooled connections, and of concurrent requests.
+            rate (float): Requests per second. Slack allows about one per webhook.
+            burst (int): Requests allowed in a burst.
+            max_retries (int): Retries per payload before giving up.
+            backoff (float): Base delay in seconds, doubled on each retry.
+        """
+        parts = urlsplit(webhook_url)
+        self.scheme = parts.scheme
+        self.host = parts.netloc
+        self.path = parts.path + (f"?{parts.query}" if parts.query else "")
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool: "queue.Queue[http.client.HTTPConnection]" = queue.Queue()
+        for _ in range(pool_size):
+            self.pool.put(self._connect())
+        self.pool_size = pool_size
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, timeout=30)
+        return http.client.HTTPConnection(self.host, timeout=30)
+
+    def _post(self, body: bytes) -> Tuple[int, Optional[str]]:
+        """
+        POST on a pooled connection, reopening it if the server closed it.
+        """
+        connection = self.pool.get()
+        try:
+            connection.request("POST", self.path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            return response.status, response.getheader("Retry-After")
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = self._connect()
+            raise
+        finally:
+            self.pool.put(connection)
+
+    async def send(self, payload: Dict[str, Any]) -> bool:
+        """
+        Send one payload.
+
+        Returns:
+            bool: Whether Slack accepted it.
+        """
+        body = json.dumps(payload).encode()
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            retry_after = None
+            try:
+                status, retry_after = await asyncio.get_running_loop().run_in_executor(None, self._post, body)
+            except (OSError, http.client.HTTPException):
+                status = None
+            if status is not None and 200 <= status < 300:
+                return True
+            if status is not None and status != 429 and status < 500:
+                return False
+            delay = float(retry_after) if retry_after else self.backoff * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, self.backoff / 2))
+        return False
+
+    async def send_all(self, payloads: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Send payloads concurrently, at most pool_size at a time.
+        """
+        semaphore = asyncio.Semaphore(self.pool_size)
+
+        async def bounded(payload: Dict[str, Any]) -> bool:
+            async with semaphore:
+                return await self.send(payload)
+
+        return await asyncio.gather(*(bounded(payload) for payload in payloads))
+
+    def close(self) -> None:
+        while not self.pool.empty():
+            self.pool.get().close()
+
+
+def deliver(sqs_client: Any, queue_url: str, sender: SlackSender) -> Tuple[int, int]:
+    """
+    Drain the digest queue and deliver every digest to Slack, deleting the messages
+    that were delivered. Undelivered messages return to the queue for the next run.
+
+    Returns:
+        Tuple[int, int]: Delivered and failed digest counts.
+    """
+    return asyncio.run(_deliver(sqs_client, queue_url, sender))
+
+
+async def _deliver(sqs_client: Any, queue_url: str, sender: SlackSender) -> Tuple[int, int]:
+    delivered = failed = 0
+    while True:
+        messages = sqs_client.receive_message(
+            QueueUrl=queue_url, MaxNumberOfMessages=MAX_BATCH_ENTRIES, WaitTimeSeconds=1,
+        ).get("Messages", [])
+        if not messages:
+            return delivered, failed
+        results = await sender.send_all([format_digest(json.loads(message["Body"])) for message in messages])
+        done = [message for message, ok in zip(messages, results) if ok]
+        if done:
+            response = sqs_client.delete_message_batch(
+                QueueUrl=queue_url,
+                Entries=[{"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]} for index, message in enumerate(done)],
+            )
+            if response.get("Failed"):
+                print(f"{len(response['Failed'])} delivered digests could not be deleted and will be delivered again.")
+        delivered += len(done)
+        failed += len(messages) - len(done)
+        if len(done) < len(messages):
+            # Leave failed digests invisible until their visibility timeout expires.
+            return delivered, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deliver queued owner digests to Slack.")
+    parser.add_argument("--queue-url", default=os.getenv("DIGEST_QUEUE_URL"), help="Digest queue URL.")
+    parser.add_argument("--webhook-url", help="Slack webhook URL. Defaults to /c7n/slack_webhook_url.")
+    parser.add_argument("--pool-size", type=int, default=4, help="Pooled Slack connections.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Slack requests per second.")
+    parser.add_argument("--sqs-endpoint", help="SQS endpoint URL, e.g. a local stand-in.")
+    args = parser.parse_args()
+
+    if not args.queue_url:
+        parser.error("--queue-url or DIGEST_QUEUE_URL is required")
+    import boto3
+
+    sqs = boto3.client("sqs", region_name=os.getenv("AWS_REGION"), endpoint_url=args.sqs_endpoint)
+    slack = SlackSender(
+        args.webhook_url or get_secret_provider().get("/c7n/slack_webhook_url"),
+        pool_size=args.pool_size,
+        rate=args.rate,
+    )
+    delivered_count, failed_count = deliver(sqs, args.queue_url, slack)
+    slack.close()
+    print(f"{delivered_count} digests delivered, {failed_count} failed.")
+    if failed_count:
+        raise SystemExit(1)
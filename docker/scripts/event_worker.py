@@ -0,0 +1,525 @@
+import os
+import re
+import json
+import time
+import signal
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple
+
+import yaml
+
+from compliance_evaluator import ARN_KEY_RESOURCE_TYPES, MARK_PATTERN, TagMatrix, compile_filter, policy_kind
+from compliance_state import KIND_PRECEDENCE, ComplianceStore, Delta, resource_key, resource_record, send_deltas
+from policy_generator import generate_policies, resources_tags
+from secret_provider import OFFLINE_SECRETS, SecretProvider, StaticBackend
+from tag_prescan import CUSTODIAN_TAG, account_session, arn_resource_key
+
+# EC2 identifier prefixes, with the resource type and the noun of its create event.
+EC2_ID_TYPES = {
+    "i": ("ec2", "Instances"),
+    "vol": ("ebs", "Volume"),
+    "snap": ("ebs-snapshot", "Snapshot"),
+    "ami": ("ami", "Image"),
+    "sg": ("security-group", "SecurityGroup"),
+    "vpc": ("vpc", "Vpc"),
+    "subnet": ("subnet", "Subnet"),
+    "rtb": ("route-table", "RouteTable"),
+    "igw": ("internet-gateway", "InternetGateway"),
+    "nat": ("nat-gateway", "NatGateway"),
+    "eipalloc": ("elastic-ip", "Address"),
+    "acl": ("network-acl", "NetworkAcl"),
+    "pcx": ("peering-connection", "VpcPeeringConnection"),
+    "vgw": ("vpn-gateway", "VpnGateway"),
+    "pl": ("prefix-list", "PrefixList"),
+}
+EC2_ID_PATTERN = re.compile(r"^([a-z]+)-[0-9a-f]{8,17}$")
+EC2_CREATE_VERBS = ("Run", "Create", "Allocate", "Copy", "Register")
+EC2_TAG_EVENTS = ("CreateTags", "DeleteTags")
+
+# Event fields naming a resource without its ARN, with the ARN they stand for.
+NAME_FIELDS: Dict[str, Callable[[str, str, str], str]] = {
+    "queueUrl": lambda value, region, account: f"arn:aws:sqs:{region}:{account}:{value.rstrip('/').rsplit('/', 1)[-1]}",
+    "bucketName": lambda value, region, account: f"arn:aws:s3:::{value}",
+    "streamName": lambda value, region, account: f"arn:aws:kinesis:{region}:{account}:stream/{value}",
+    "deliveryStreamName": lambda value, region, account: f"arn:aws:firehose:{region}:{account}:deliverystream/{value}",
+}
+
+# Resource status recorded for each policy kind matched by an event evaluation. The
+# worker takes no action, so a resource matching the mark policy is not marked yet.
+EVENT_KIND_STATUS = {"notify": "noncompliant", "mark": "noncompliant", "delete": "marked", "unmark": "compliant"}
+
+
+@dataclass(frozen=True)
+class Target:
+    """
+    A resource affected by an event: an ARN, or an EC2 identifier.
+    """
+
+    account: str
+    region: str
+    resource_type: str
+    identifier: str
+
+
+def _walk(value: Any, key: str = "") -> Iterable[Tuple[str, Any]]:
+    """
+    Yield every (key, scalar) pair of a nested event document.
+    """
+    if isinstance(value, dict):
+        for child_key, child in value.items():
+            yield from _walk(child, child_key)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _walk(child, key)
+    else:
+        yield key, value
+
+
+def extract_targets(event: Dict[str, Any], resource_types: Optional[Iterable[str]] = None) -> List[Target]:
+    """
+    Return the resources a CloudTrail event (as delivered by EventBridge, or a bare
+    CloudTrail record) created or re-tagged.
+
+    EC2 resources are taken from the tagged resource ids of CreateTags/DeleteTags and
+    from the ids returned by create events; other services from every ARN, queue URL
+    or resource name in the request and response. Failed calls yield nothing.
+
+    Args:
+        event (Dict[str, Any]): The event.
+        resource_types (Optional[Iterable[str]]): Resource types to keep. Defaults to
+            the types of resources_tags.
+
+    Returns:
+        List[Target]: The affected resources, without duplicates.
+    """
+    detail = event.get("detail", event)
+    if detail.get("errorCode"):
+        return []
+    account = detail.get("recipientAccountId") or event.get("account", "")
+    region = detail.get("awsRegion") or event.get("region", "")
+    name = detail.get("eventName", "")
+    request = detail.get("requestParameters") or {}
+    response = detail.get("responseElements") or {}
+    wanted = set(resources_tags if resource_types is None else resource_types)
+
+    targets = []
+    if detail.get("eventSource") == "ec2.amazonaws.com" or event.get("source") == "aws.ec2":
+        if name in EC2_TAG_EVENTS:
+            candidates = [value for key, value in _walk(request) if key == "resourceId"]
+        elif name.startswith(EC2_CREATE_VERBS):
+            candidates = [value for key, value in _walk(response) if key.endswith("Id")]
+        else:
+            candidates = []
+        for value in candidates:
+            match = EC2_ID_PATTERN.match(str(value))
+            if not match or match.group(1) not in EC2_ID_TYPES:
+                continue
+            resource_type, noun = EC2_ID_TYPES[match.group(1)]
+            # A create event also returns the ids of related resources (an instance's
+            # subnet and security groups); keep only the created type.
+            if name in EC2_TAG_EVENTS or name.endswith(noun):
+                targets.append(Target(account, region, resource_type, value))
+    else:
+        for key, value in list(_walk(request)) + list(_walk(response)):
+            if not isinstance(value, str):
+                continue
+            if key in NAME_FIELDS and not value.startswith("arn:"):
+                value = NAME_FIELDS[key](value, region, account)
+            if not value.startswith("arn:"):
+                continue
+            resource_type = ARN_KEY_RESOURCE_TYPES.get(arn_resource_key(value))
+            if resource_type:
+                targets.append(Target(account, region, resource_type, value))
+
+    return list(dict.fromkeys(target for target in targets if target.resource_type in wanted))
+
+
+class PendingTargets:
+    """
+    Debounces targets per resource: a target is released once no event touched it for
+    `window` seconds (a launch is often followed by tagging calls), or `max_delay`
+    seconds after its first event at the latest.
+    """
+
+    def __init__(self, window: float = 60.0, max_delay: float = 300.0) -> None:
+        """
+        Initialize the PendingTargets.
+
+        Args:
+            window (float): Quiet period before a target is evaluated.
+            max_delay (float): Longest a target waits for a quiet period.
+        """
+        self.window = window
+        self.max_delay = max_delay
+        self._pending: Dict[Target, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, target: Target, now: float) -> None:
+        first, _ = self._pending.get(target, (now, now))
+        self._pending[target] = (first, now)
+
+    def pop_ready(self, now: float, force: bool = False) -> List[Target]:
+        """
+        Remove and return the targets due for evaluation.
+        """
+        ready = [
+            target for target, (first, last) in self._pending.items()
+            if force or now - last >= self.window or now - first >= self.max_delay
+        ]
+        for target in ready:
+            del self._pending[target]
+        return ready
+
+    def next_due(self) -> Optional[float]:
+        """
+        Return the time the next target becomes due, if any is pending.
+        """
+        if not self._pending:
+            return None
+        return min(min(last + self.window, first + self.max_delay) for first, last in self._pending.values())
+
+
+class TagSource(ABC):
+    """
+    Base class for tag lookups of event targets.
+    """
+
+    @abstractmethod
+    def fetch(self, account: str, region: str, targets: List[Target]) -> Dict[str, Dict[str, str]]:
+        """
+        Return the current tags of targets of one account and region, by identifier.
+        Targets without tags (or no longer existing) may be omitted.
+        """
+
+
+class StaticTagSource(TagSource):
+    """
+    Tags from an in-memory mapping of identifier to tags, for replays and tests.
+    """
+
+    def __init__(self, tags: Dict[str, Dict[str, str]]) -> None:
+        self.tags = tags
+
+    def fetch(self, account: str, region: str, targets: List[Target]) -> Dict[str, Dict[str, str]]:
+        return {target.identifier: self.tags[target.identifier] for target in targets if target.identifier in self.tags}
+
+
+class AwsTagSource(TagSource):
+    """
+    Tags from EC2 DescribeTags for EC2 identifiers and from the tagging API's
+    GetResources for ARNs, in the target account through its c7n-org role.
+    """
+
+    def __init__(self, accounts: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Initialize the AwsTagSource.
+
+        Args:
+            accounts (Dict[str, Dict[str, Any]]): c7n-org account entries by account id.
+        """
+        self.accounts = accounts
+        self._sessions: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, account: str, region: str) -> Any:
+        # boto3 session and client creation is not thread-safe.
+        with self._lock:
+            if (account, region) not in self._sessions:
+                session = account_session(self.accounts.get(account, {}), region)
+                self._sessions[(account, region)] = (
+                    session.client("ec2"), session.client("resourcegroupstaggingapi"),
+                )
+            return self._sessions[(account, region)]
+
+    def fetch(self, account: str, region: str, targets: List[Target]) -> Dict[str, Dict[str, str]]:
+        ec2, tagging = self._session(account, region)
+        tags: Dict[str, Dict[str, str]] = {}
+        ids = [target.identifier for target in targets if not target.identifier.startswith("arn:")]
+        arns = [target.identifier for target in targets if target.identifier.startswith("arn:")]
+        for start in range(0, len(ids), 200):
+            paginator = ec2.get_paginator("describe_tags")
+            for page in paginator.paginate(Filters=[{"Name": "resource-id", "Values": ids[start:start + 200]}]):
+                for tag in page.get("Tags", []):
+                    tags.setdefault(tag["ResourceId"], {})[tag["Key"]] = tag["Value"]
+        for start in range(0, len(arns), 100):
+            paginator = tagging.get_paginator("get_resources")
+            for page in paginator.paginate(ResourceARNList=arns[start:start + 100]):
+                for mapping in page.get("ResourceTagMappingList", []):
+                    tags[mapping["ResourceARN"]] = {tag["Key"]: tag["Value"] for tag in mapping.get("Tags", [])}
+        return tags
+
+
+class PolicyEvaluator:
+    """
+    Evaluates the filters of the generated policies against individual resources,
+    compiled once with compliance_evaluator.compile_filter.
+    """
+
+    def __init__(self, resources_tags_dict: Dict[str, Dict[str, List[str]]]) -> None:
+        """
+        Compile the filters of every generated policy.
+
+        Args:
+            resources_tags_dict (Dict[str, Dict[str, List[str]]]): Resource configuration.
+        """
+        # Filters do not depend on the notify parameters.
+        secrets = SecretProvider(StaticBackend(OFFLINE_SECRETS))
+        self.filters: Dict[str, List[Tuple[str, Callable[[TagMatrix], int]]]] = {}
+        for policy in generate_policies(resources_tags_dict, secrets=secrets, notify=False)["policies"]:
+            compiled = compile_filter({"and": policy.get("filters", [])})
+            self.filters.setdefault(policy["resource"], []).append((policy_kind(policy), compiled))
+
+    def statuses(self, resource_type: str, rows: List[Tuple[str, Dict[str, str]]]) -> List[Optional[str]]:
+        """
+        Return the status of each (account, tags) row of one resource type: the status
+        of the highest-precedence policy kind it matches, "compliant" if it matches
+        none, or None for a marked resource matching none (left to the sweep).
+        """
+        matrix = TagMatrix(rows, datetime.now(timezone.utc))
+        matched: List[Optional[str]] = [None] * len(rows)
+        for kind, compiled in self.filters.get(resource_type, []):
+            bits = compiled(matrix)
+            for index in range(len(rows)):
+                if bits >> index & 1 and (matched[index] is None or KIND_PRECEDENCE[kind] > KIND_PRECEDENCE[matched[index]]):
+                    matched[index] = kind
+        return [
+            EVENT_KIND_STATUS[kind] if kind else (None if CUSTODIAN_TAG in tags else "compliant")
+            for kind, (_, tags) in zip(matched, rows)
+        ]
+
+
+class EventWorker:
+    """
+    Long-lived consumer of resource create/tag events: reads them from SQS in batches,
+    debounces them per resource, evaluates the policy filters on the affected
+    resources only on a bounded thread pool, and records and notifies the deltas.
+    The scheduled sweep remains the reconciliation pass.
+    """
+
+    def __init__(
+        self,
+        sqs_client: Any,
+        queue_url: str,
+        tag_source: TagSource,
+        store: ComplianceStore,
+        notify: Callable[[List[Delta]], List[Delta]],
+        accounts: Optional[Dict[str, Dict[str, Any]]] = None,
+        window: float = 60.0,
+        max_delay: float = 300.0,
+        max_workers: int = 8,
+        batch_size: int = 10,
+    ) -> None:
+        """
+        Initialize the EventWorker.
+
+        Args:
+            sqs_client (Any): A boto3 SQS client, or a stand-in such as local_aws.LocalQueue.
+            queue_url (str): Event queue URL.
+            tag_source (TagSource): Tag lookups of affected resources.
+            store (ComplianceStore): Compliance state shared with the sweep.
+            notify (Callable[[List[Delta]], List[Delta]]): Sends the deltas and returns
+                those delivered.
+            accounts (Optional[Dict[str, Dict[str, Any]]]): c7n-org account entries by id,
+                used to record resources under their c7n-org account name.
+            window (float): Per-resource debounce window in seconds.
+            max_delay (float): Longest a resource waits for a quiet window.
+            max_workers (int): Concurrent tag lookups and evaluations.
+            batch_size (int): Messages received per poll (at most 10).
+        """
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+        self.tag_source = tag_source
+        self.store = store
+        self.notify = notify
+        self.accounts = accounts or {}
+        self.pending = PendingTargets(window, max_delay)
+        self.evaluator = PolicyEvaluator(resources_tags)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.batch_size = min(batch_size, 10)
+
+    def poll(self, wait_seconds: int = 20, now: Optional[float] = None) -> int:
+        """
+        Receive one batch of events and queue their targets. Messages are deleted once
+        read: a lost target is caught by the next sweep.
+
+        Returns:
+            int: Number of messages received.
+        """
+        messages = self.sqs.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=self.batch_size, WaitTimeSeconds=wait_seconds,
+        ).get("Messages", [])
+        now = now or time.time()
+        for message in messages:
+            try:
+                event = json.loads(message["Body"])
+            except ValueError:
+                print(f"Skipping malformed event message {message.get('MessageId')}")
+                continue
+            for target in extract_targets(event):
+                self.pending.add(target, now)
+        if messages:
+            self.sqs.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]} for index, message in enumerate(messages)],
+            )
+        return len(messages)
+
+    def _evaluate(self, account: str, region: str, targets: List[Target]) -> Dict[str, Tuple]:
+        """
+        Fetch the tags of one account and region's targets and evaluate them.
+        """
+        tags = self.tag_source.fetch(account, region, targets)
+        account_name = self.accounts.get(account, {}).get("name", account)
+        by_type: Dict[str, List[Target]] = {}
+        for target in targets:
+            by_type.setdefault(target.resource_type, []).append(target)
+
+        observed = {}
+        for resource_type, group in by_type.items():
+            rows = [(account_name, tags.get(target.identifier, {})) for target in group]
+            for target, (_, resource_tags), status in zip(group, rows, self.evaluator.statuses(resource_type, rows)):
+                if status is None:
+                    continue
+                resource = resource_record(resource_type, target.identifier)
+                resource["Tags"] = [{"Key": key, "Value": value} for key, value in resource_tags.items()]
+                match = MARK_PATTERN.search(resource_tags.get(CUSTODIAN_TAG, ""))
+                observed[resource_key(resource_type, account_name, region, resource)] = (
+                    account_name, region, resource_type, status,
+                    match.group(2).replace("/", "-") if match else None,
+                    resource, resource_tags.get("AdminEmail"), resource_tags.get("OwningOrg"),
+                )
+        return observed
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> List[Delta]:
+        """
+        Evaluate the targets due now, record them and notify their deltas.
+
+        Args:
+            now (Optional[float]): Current time.
+            force (bool): Evaluate every pending target.
+
+        Returns:
+            List[Delta]: The notified deltas.
+        """
+        ready = self.pending.pop_ready(now or time.time(), force)
+        groups: Dict[Tuple[str, str], List[Target]] = {}
+        for target in ready:
+            groups.setdefault((target.account, target.region), []).append(target)
+        futures = [self.pool.submit(self._evaluate, account, region, targets) for (account, region), targets in groups.items()]
+
+        observed: Dict[str, Tuple] = {}
+        for future in futures:
+            try:
+                observed.update(future.result())
+            except Exception as error:  # noqa: BLE001 - one account's failure must not stop the worker
+                print(f"Event evaluation failed: {error}")
+        # SQLite connections stay on this thread.
+        self.store.record_evaluations(observed)
+        # Includes the deltas of earlier flushes whose delivery failed.
+        deltas = self.store.pending_deltas("events")
+        if deltas:
+            try:
+                deltas = self.notify(deltas)
+            except Exception as error:  # noqa: BLE001 - the deltas stay pending for the next flush
+                print(f"Notification of {len(deltas)} deltas failed: {error}")
+                return []
+            self.store.record_notified(deltas)
+        return deltas
+
+    def run(self, stop: threading.Event, wait_seconds: int = 20) -> None:
+        """
+        Poll and evaluate until stop is set, then evaluate what is still pending.
+        """
+        while not stop.is_set():
+            next_due = self.pending.next_due()
+            wait = wait_seconds if next_due is None else max(0, min(wait_seconds, int(next_due - time.time())))
+            self.poll(wait)
+            self.flush()
+        self.flush(force=True)
+        self.pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate tag policies on resources as their create/tag events arrive.")
+    parser.add_argument("--queue-url", default=os.getenv("EVENT_QUEUE_URL"), help="SQS queue receiving the CloudTrail events.")
+    parser.add_argument("--sqs-endpoint", help="SQS endpoint URL, e.g. a local stand-in.")
+    parser.add_argument("--config", default="accounts.yml", help="c7n-org accounts file (roles and account names).")
+    parser.add_argument("--db", default="state/compliance.db", help="SQLite state database shared with the sweep.")
+    parser.add_argument("--window", type=float, default=60.0, help="Seconds without events before a resource is evaluated.")
+    parser.add_argument("--max-delay", type=float, default=300.0, help="Longest a resource waits for a quiet window.")
+    parser.add_argument("--max-workers", type=int, default=8, help="Concurrent tag lookups and evaluations.")
+    parser.add_argument("--batch-size", type=int, default=10, help="Messages received per poll (at most 10).")
+    parser.add_argument("--digest-queue-url", default=os.getenv("DIGEST_QUEUE_URL"), help="Notify per-owner digests.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the deltas instead of notifying them.")
+    parser.add_argument("--replay", nargs="+", help="Recorded event files to replay through an in-memory queue.")
+    parser.add_argument("--tags", help="JSON file of identifier to tags, used instead of AWS lookups.")
+    args = parser.parse_args()
+
+    accounts_by_id = {}
+    if os.path.exists(args.config):
+        with open(args.config) as file:
+            accounts_by_id = {
+                str(entry["account_id"]): entry
+                for entry in (yaml.safe_load(file) or {}).get("accounts", []) if "account_id" in entry
+            }
+    if args.tags:
+        with open(args.tags) as file:
+            source: TagSource = StaticTagSource(json.load(file))
+    else:
+        source = AwsTagSource(accounts_by_id)
+
+    if args.replay:
+        from local_aws import LocalQueue
+
+        sqs = LocalQueue()
+        for path in args.replay:
+            with open(path) as file:
+                sqs.send_message(QueueUrl="local", MessageBody=file.read())
+        queue_url = "local"
+    else:
+        if not args.queue_url:
+            parser.error("--queue-url or EVENT_QUEUE_URL is required")
+        import boto3
+
+        sqs = boto3.client("sqs", region_name=os.getenv("AWS_REGION"), endpoint_url=args.sqs_endpoint)
+        queue_url = args.queue_url
+
+    if args.dry_run:
+        notify_client = None
+    elif args.replay:
+        import boto3
+
+        notify_client = boto3.client("sqs", region_name=os.getenv("AWS_REGION"))
+    else:
+        notify_client = sqs
+
+    def notify_deltas(deltas: List[Delta]) -> List[Delta]:
+        for delta in deltas:
+            print(f"{delta.event}\t{delta.account}\t{delta.region}\t{delta.resource_type}\t{delta.arn}")
+        if notify_client is None:
+            return deltas
+        return send_deltas(notify_client, deltas, args.digest_queue_url)
+
+    compliance_store = ComplianceStore(args.db)
+    worker = EventWorker(
+        sqs, queue_url, source, compliance_store, notify_deltas, accounts_by_id,
+        window=args.window, max_delay=args.max_delay, max_workers=args.max_workers, batch_size=args.batch_size,
+    )
+    if args.replay:
+        while worker.poll(wait_seconds=0):
+            pass
+        worker.flush(force=True)
+        worker.pool.shutdown()
+    else:
+        stop_event = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+        signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+        worker.run(stop_event)
+    compliance_store.close()
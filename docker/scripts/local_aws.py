@@ -0,0 +1,94 @@
+import uuid
+import threading
+from collections import deque
+from typing import List, Dict, Any, Deque, Iterator, Optional
+
+
+class LocalQueue:
+    """
+    In-memory stand-in for the SQS client calls used by these scripts, for replays,
+    benchmarks and local tests. Received messages stay in flight until deleted or released.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty queue.
+        """
+        self.messages: Deque[Dict[str, Any]] = deque()
+        self.in_flight: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **kwargs: Any) -> Dict[str, Any]:
+        message = {"MessageId": str(uuid.uuid4()), "Body": MessageBody, **kwargs}
+        with self._lock:
+            self.messages.append(message)
+        return {"MessageId": message["MessageId"]}
+
+    def send_message_batch(self, QueueUrl: str, Entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        successful = []
+        for entry in Entries:
+            entry = dict(entry)
+            entry_id = entry.pop("Id")
+            successful.append({"Id": entry_id, **self.send_message(QueueUrl, **entry)})
+        return {"Successful": successful, "Failed": []}
+
+    def receive_message(self, QueueUrl: str, MaxNumberOfMessages: int = 1, **kwargs: Any) -> Dict[str, Any]:
+        received = []
+        with self._lock:
+            while self.messages and len(received) < MaxNumberOfMessages:
+                message = dict(self.messages.popleft(), ReceiptHandle=str(uuid.uuid4()))
+                self.in_flight[message["ReceiptHandle"]] = message
+                received.append(message)
+        return {"Messages": received} if received else {}
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str) -> None:
+        with self._lock:
+            self.in_flight.pop(ReceiptHandle, None)
+
+    def delete_message_batch(self, QueueUrl: str, Entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        for entry in Entries:
+            self.delete_message(QueueUrl, entry["ReceiptHandle"])
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def release(self) -> None:
+        """
+        Return every in-flight message to the queue, as if its visibility timeout expired.
+        """
+        with self._lock:
+            self.messages.extend(self.in_flight.values())
+            self.in_flight.clear()
+
+
+class LocalTagging:
+    """
+    In-memory stand-in for the resourcegroupstaggingapi client of one account and
+    region, serving GetResources pages through get_paginator like boto3.
+    """
+
+    def __init__(self, resources: Optional[Dict[str, Dict[str, str]]] = None) -> None:
+        """
+        Initialize the stand-in.
+
+        Args:
+            resources (Optional[Dict[str, Dict[str, str]]]): ARN to tags. Tag dicts are
+                kept by reference, so resources may share them.
+        """
+        self.resources: Dict[str, Dict[str, str]] = resources if resources is not None else {}
+        self.calls = 0
+
+    def get_paginator(self, operation: str) -> "LocalTagging":
+        if operation != "get_resources":
+            raise NotImplementedError(operation)
+        return self
+
+    def paginate(self, ResourcesPerPage: int = 100, ResourceARNList: Optional[List[str]] = None, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        arns = list(self.resources) if ResourceARNList is None else [arn for arn in ResourceARNList if arn in self.resources]
+        for start in range(0, len(arns), ResourcesPerPage):
+            self.calls += 1
+            yield {
+                "ResourceTagMappingList": [
+                    {"ResourceARN": arn, "Tags": [{"Key": key, "Value": value} for key, value in self.resources[arn].items()]}
+                    for arn in arns[start:start + ResourcesPerPage]
+                ],
+                "PaginationToken": "" if start + ResourcesPerPage >= len(arns) else str(start + ResourcesPerPage),
+            }
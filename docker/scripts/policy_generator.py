@@ -1,7 +1,42 @@
 import os
+import json
+import hashlib
+import argparse
+import subprocess
 import yaml
-import boto3
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Hashable, TextIO
+
+from secret_provider import SecretProvider, get_secret_provider
+from tier_planner import TIERS, tier_of
+
+
+class ProfileInterner:
+    """
+    Shares identical filter lists and action dictionaries between policies, so that
+    resources using the same tag profile reference one object instead of a copy.
+    Shared objects are emitted once as YAML anchors and referenced through aliases.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty interner.
+        """
+        self._objects: Dict[Hashable, Any] = {}
+
+    def intern(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Return the object stored under key, building it with factory on first use.
+
+        Args:
+            key (Hashable): Value identifying the object's content.
+            factory (Callable[[], Any]): Builds the object when it is not interned yet.
+
+        Returns:
+            Any: The shared object. Callers must not mutate it.
+        """
+        if key not in self._objects:
+            self._objects[key] = factory()
+        return self._objects[key]
 
 
 class Policy:
@@ -10,7 +45,15 @@ class Policy:
     sends notifications, and optionally marks resources for deletion.
     """
 
-    def __init__(self, resource: str, tags: List[str], delete_action: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        resource: str,
+        tags: List[str],
+        delete_action: Optional[str] = None,
+        secrets: Optional[SecretProvider] = None,
+        interner: Optional[ProfileInterner] = None,
+        notify: bool = True,
+    ) -> None:
         """
         Initialize the Policy.
 
@@ -18,34 +61,31 @@ class Policy:
            resource (str): The name of the AWS resource.
            tags (List[str]): List of required tag keys.
            delete_action (Optional[str]): Action to perform for deletion, if applicable.
+           secrets (Optional[SecretProvider]): Provider for sensitive parameters.
+               Defaults to the shared process-wide provider.
+           interner (Optional[ProfileInterner]): Interner shared with other policies so that
+               identical filters and actions are generated once.
+           notify (bool): Whether policies carry their notify actions. Disabled when
+               notifications are sent as deltas by compliance_state instead.
          """
         self.resource = resource
         self.tags = tags
         self.delete_action = delete_action
         self.custodian_tag = "tag:custodian_cleanup"
-        self._load_sensitive_params()
-
-    def _load_sensitive_params(self) -> None:
-        """
-        Load sensitive parameters such as the SQS queue ARN and Slack webhook URL from AWS SSM.
-        """
-        ssm = boto3.client("ssm", region_name=os.getenv("AWS_REGION"))
-        self.queue_arn = self._get_ssm_parameter(ssm, "/c7n/queue_arn")
-        self.slack_webhook_url = self._get_ssm_parameter(ssm, "/c7n/slack_webhook_url")
+        self.interner = interner or ProfileInterner()
+        self.notify = notify
+        self._load_sensitive_params(secrets or get_secret_provider())
 
-    @staticmethod
-    def _get_ssm_parameter(ssm_client: Any, name: str) -> str:
+    def _load_sensitive_params(self, secrets: SecretProvider) -> None:
         """
-        Retrieve a parameter value from AWS SSM Parameter Store.
+        Load sensitive parameters such as the SQS queue ARN and Slack webhook URL.
 
         Args:
-            ssm_client (Any): A boto3 SSM client.
-            name (str): The name of the parameter.
-
-        Returns:
-            str: The decrypted parameter value.
+            secrets (SecretProvider): Provider that resolves and caches the parameters.
         """
-        return ssm_client.get_parameter(Name=name, WithDecryption=True)["Parameter"]["Value"]
+        params = secrets.get_many(["/c7n/queue_arn", "/c7n/slack_webhook_url"])
+        self.queue_arn = params["/c7n/queue_arn"]
+        self.slack_webhook_url = params["/c7n/slack_webhook_url"]
 
     def _build_notify_action(self, template: str, color: str, violation_desc: str, action_desc: str) -> Dict[str, Any]:
         """
@@ -60,7 +100,8 @@ class Policy:
         Returns:
             Dict[str, Any]: A dictionary representing the notification action.
         """
-        return {
+        key = ("notify", template, color, violation_desc, action_desc, self.slack_webhook_url, self.queue_arn)
+        return self.interner.intern(key, lambda: {
             "type": "notify",
             "slack_template": template,
             "slack_msg_color": color,
@@ -68,7 +109,7 @@ class Policy:
             "violation_desc": violation_desc,
             "action_desc": action_desc,
             "transport": {"type": "sqs", "queue": self.queue_arn},
-        }
+        })
 
     def _generate_tag_filters(self) -> List[Dict[str, str]]:
         """
@@ -77,7 +118,10 @@ class Policy:
         Returns:
             List[Dict[str, str]]: List of tag filter dictionaries.
         """
-        return [{"tag:" + tag: "absent"} for tag in self.tags]
+        return self.interner.intern(
+            ("tag_filters", tuple(self.tags)),
+            lambda: [{"tag:" + tag: "absent"} for tag in self.tags],
+        )
 
     def generate(self) -> List[Dict[str, Any]]:
         """
@@ -87,10 +131,10 @@ class Policy:
             List[Dict[str, Any]]: List of policies.
         """
         tag_filters = self._generate_tag_filters()
-        common_filters = [
-            {self.custodian_tag: "absent"},
-            {"or": tag_filters},
-        ]
+        common_filters = self.interner.intern(
+            ("common_filters", tuple(self.tags)),
+            lambda: [{self.custodian_tag: "absent"}, {"or": tag_filters}],
+        )
         _policies = []
 
         if self.delete_action:
@@ -104,7 +148,10 @@ class Policy:
                 ),
                 "filters": common_filters,
                 "actions": [
-                    {"type": "mark-for-op", "tag": self.custodian_tag, "op": self.delete_action, "days": 4},
+                    self.interner.intern(
+                        ("mark-for-op", self.delete_action),
+                        lambda: {"type": "mark-for-op", "tag": self.custodian_tag, "op": self.delete_action, "days": 4},
+                    ),
                     self._build_notify_action(
                         template="slack",
                         color="warning",
@@ -115,9 +162,12 @@ class Policy:
             })
 
             # Policy for unmarking resources that have become compliant.
-            unmark_filters = (
-                [{"tag:custodian_cleanup": "not-null"}] +
-                [{"tag:" + tag: "not-null"} for tag in self.tags]
+            unmark_filters = self.interner.intern(
+                ("unmark_filters", tuple(self.tags)),
+                lambda: (
+                    [{"tag:custodian_cleanup": "not-null"}] +
+                    [{"tag:" + tag: "not-null"} for tag in self.tags]
+                ),
             )
             _policies.append({
                 "name": f"{self.resource}-unmark",
@@ -128,7 +178,10 @@ class Policy:
                 ),
                 "filters": unmark_filters,
                 "actions": [
-                    {"type": "remove-tag", "tags": ["custodian_cleanup"]},
+                    self.interner.intern(
+                        ("remove-tag",),
+                        lambda: {"type": "remove-tag", "tags": ["custodian_cleanup"]},
+                    ),
                     self._build_notify_action(
                         template="slack",
                         color="good",
@@ -146,10 +199,13 @@ class Policy:
                     "Delete all resources previously marked for deletion by today's date. "
                     "Also verify that they continue to not meet tagging policies."
                 ),
-                "filters": [
-                    {"type": "marked-for-op", "tag": "custodian_cleanup", "op": self.delete_action},
-                    {"or": tag_filters},
-                ],
+                "filters": self.interner.intern(
+                    ("delete_filters", self.delete_action, tuple(self.tags)),
+                    lambda: [
+                        {"type": "marked-for-op", "tag": "custodian_cleanup", "op": self.delete_action},
+                        {"or": tag_filters},
+                    ],
+                ),
                 "actions": [
                     {"type": self.delete_action},
                     self._build_notify_action(
@@ -183,148 +239,400 @@ class Policy:
                 ],
             })
 
+        if not self.notify:
+            for policy in _policies:
+                policy["actions"] = [action for action in policy["actions"] if action["type"] != "notify"]
         return _policies
 
 
-def generate_policies(resources_tags_dict: Dict[str, Dict[str, List[str]]]) -> Dict[str, Any]:
+def generate_policies(
+    resources_tags_dict: Dict[str, Dict[str, List[str]]],
+    secrets: Optional[SecretProvider] = None,
+    notify: bool = True,
+) -> Dict[str, Any]:
     """
     Generate policies for each AWS resource based on provided tag configuration.
 
     Args:
         resources_tags_dict (Dict[str, Dict[str, List[str]]]): Dictionary mapping resource names
             to their configuration, including required tags and optional delete actions.
+        secrets (Optional[SecretProvider]): Provider for sensitive parameters, shared by every
+            policy. Defaults to the process-wide provider.
+        notify (bool): Whether policies carry their notify actions.
 
     Returns:
         Dict[str, Any]: A dictionary with a single key "policies" containing a list of policy definitions.
     """
+    secrets = secrets or get_secret_provider()
+    interner = ProfileInterner()
     policies_list = []
     for resource, config in resources_tags_dict.items():
         tags = config.get("tags", [])
         delete_action = config.get("delete_action")
-        policy = Policy(resource=resource, tags=tags, delete_action=delete_action)
+        policy = Policy(
+            resource=resource,
+            tags=tags,
+            delete_action=delete_action,
+            secrets=secrets,
+            interner=interner,
+            notify=notify,
+        )
         policies_list.extend(policy.generate())
     return {"policies": policies_list}
 
 
+class CompactDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):
+    """
+    YAML dumper that uses the libyaml emitter when available and also anchors long
+    repeated strings (comments, webhook URL, queue ARN), not only shared containers.
+    """
+
+    MIN_ALIASED_STRING_LENGTH = 40
+
+    def ignore_aliases(self, data: Any) -> bool:
+        if isinstance(data, str):
+            return len(data) < self.MIN_ALIASED_STRING_LENGTH
+        return super().ignore_aliases(data)
+
+
+def dump_policies(policies: Dict[str, Any], stream: TextIO, output_format: str = "yaml") -> None:
+    """
+    Serialize generated policies, keeping shared objects as anchors in YAML output.
+
+    Args:
+        policies (Dict[str, Any]): The output of generate_policies.
+        stream (TextIO): Destination stream.
+        output_format (str): "yaml" for anchored YAML, or "json" for compact JSON.
+    """
+    if output_format == "json":
+        json.dump(policies, stream, separators=(",", ":"))
+    elif output_format == "yaml":
+        yaml.dump(policies, stream, Dumper=CompactDumper, sort_keys=False, default_flow_style=False)
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+
+def policy_hash(policies: List[Dict[str, Any]]) -> str:
+    """
+    Compute a content hash of a resource's generated policies. The policies embed the
+    required tags, the delete action and the notify parameters, so any change to
+    them (or to the generator's templates) yields a new hash.
+
+    Args:
+        policies (List[Dict[str, Any]]): Policies generated for one resource.
+
+    Returns:
+        str: Hex-encoded SHA-256 digest.
+    """
+    canonical = json.dumps(policies, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def validate_with_custodian(paths: List[str]) -> None:
+    """
+    Validate policy files with the custodian CLI.
+
+    Args:
+        paths (List[str]): Policy files to validate.
+
+    Raises:
+        subprocess.CalledProcessError: If validation fails.
+    """
+    subprocess.run(["custodian", "validate", *paths], check=True)
+
+
+# File extensions of policy shards, in either output format.
+SHARD_EXTENSIONS = (".yml", ".yaml", ".json")
+
+
+def write_policy_shards(
+    resources_tags_dict: Dict[str, Dict[str, List[str]]],
+    shard_dir: str,
+    secrets: Optional[SecretProvider] = None,
+    output_format: str = "yaml",
+    validate: Optional[Callable[[List[str]], None]] = None,
+    notify: bool = True,
+) -> List[str]:
+    """
+    Write one policy file per resource type, rewriting only shards whose content hash
+    differs from the one recorded in the shard manifest.
+
+    The manifest (manifest.json) maps each resource to its shard hash and is only
+    updated once the changed shards are written and validated. The paths of the
+    changed shards are also written to changed.txt so a run can target only them;
+    it is left empty when validation fails. Shards not in the new manifest, in
+    either format, are removed.
+
+    Args:
+        resources_tags_dict (Dict[str, Dict[str, List[str]]]): Resource configuration,
+            as accepted by generate_policies.
+        shard_dir (str): Directory holding the shards and the manifest.
+        secrets (Optional[SecretProvider]): Provider for sensitive parameters.
+        output_format (str): "yaml" or "json".
+        validate (Optional[Callable[[List[str]], None]]): Called with the changed shard
+            paths before the manifest is updated.
+        notify (bool): Whether policies carry their notify actions.
+
+    Returns:
+        List[str]: Paths of the shards that were (re)written.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    manifest_path = os.path.join(shard_dir, "manifest.json")
+    manifest: Dict[str, str] = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    secrets = secrets or get_secret_provider()
+    interner = ProfileInterner()
+    extension = "json" if output_format == "json" else "yml"
+    new_manifest = {}
+    changed = []
+    for resource, config in resources_tags_dict.items():
+        policy = Policy(
+            resource=resource,
+            tags=config.get("tags", []),
+            delete_action=config.get("delete_action"),
+            secrets=secrets,
+            interner=interner,
+            notify=notify,
+        )
+        policies = policy.generate()
+        digest = policy_hash(policies)
+        new_manifest[resource] = digest
+        shard_path = os.path.join(shard_dir, f"{resource}.{extension}")
+        if manifest.get(resource) == digest and os.path.exists(shard_path):
+            continue
+        with open(shard_path, "w") as file:
+            dump_policies({"policies": policies}, file, output_format)
+        changed.append(shard_path)
+
+    # Remove shards of dropped resource types, and those left in the other format
+    # after an output format switch.
+    current = {f"{resource}.{extension}" for resource in new_manifest}
+    for name in os.listdir(shard_dir):
+        if name.endswith(SHARD_EXTENSIONS) and name != "manifest.json" and name not in current:
+            os.remove(os.path.join(shard_dir, name))
+
+    # Clear the previous change list first: if validation fails, a later
+    # --changed-only run must not act on it.
+    changed_path = os.path.join(shard_dir, "changed.txt")
+    open(changed_path, "w").close()
+    if validate and changed:
+        validate(changed)
+
+    with open(changed_path, "w") as file:
+        file.writelines(path + "\n" for path in changed)
+    with open(manifest_path, "w") as file:
+        json.dump(new_manifest, file, indent=2, sort_keys=True)
+    return changed
+
+
+def write_tier_bundles(
+    resources_tags_dict: Dict[str, Dict[str, List[str]]],
+    tiers: Dict[str, str],
+    tier_dir: str,
+    secrets: Optional[SecretProvider] = None,
+    output_format: str = "yaml",
+    notify: bool = True,
+) -> Dict[str, int]:
+    """
+    Write one policy bundle per scan tier (hourly.yml, daily.yml, weekly.yml), holding
+    the policies of the resource types assigned to that tier by tier_planner.py.
+    Resource types without an assignment go to the most frequent tier, and bundles of
+    empty tiers are removed.
+
+    Args:
+        resources_tags_dict (Dict[str, Dict[str, List[str]]]): Resource configuration,
+            as accepted by generate_policies.
+        tiers (Dict[str, str]): Tier of each resource type.
+        tier_dir (str): Directory holding the bundles.
+        secrets (Optional[SecretProvider]): Provider for sensitive parameters.
+        output_format (str): "yaml" or "json".
+        notify (bool): Whether policies carry their notify actions.
+
+    Returns:
+        Dict[str, int]: Number of resource types per tier.
+    """
+    os.makedirs(tier_dir, exist_ok=True)
+    by_tier: Dict[str, Dict[str, Dict[str, List[str]]]] = {tier: {} for tier in TIERS}
+    for resource, config in resources_tags_dict.items():
+        by_tier[tier_of(resource, tiers)][resource] = config
+
+    extension = "json" if output_format == "json" else "yml"
+    for tier, members in by_tier.items():
+        bundle_path = os.path.join(tier_dir, f"{tier}.{extension}")
+        if not members:
+            if os.path.exists(bundle_path):
+                os.remove(bundle_path)
+            continue
+        with open(bundle_path, "w") as file:
+            dump_policies(generate_policies(members, secrets=secrets, notify=notify), file, output_format)
+    return {tier: len(members) for tier, members in by_tier.items()}
+
+
+# Define resource configurations including required tags and optional delete actions.
+resources_tags = {
+    # Compute
+    "ec2": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "EndpointType"], "delete_action": "terminate"},
+    "ec2-spot-fleet-request": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "EndpointType"]},
+    "ec2-capacity-reservation": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
+    "ami": {"tags": ["DeploymentType", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "deregister"},
+    "lambda": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "elasticbeanstalk-environment": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "terminate"},
+    "batch-compute": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]  , "delete_action": "delete"},
+    "workspaces": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "terminate"},
+
+    # Containers & Kubernetes
+    "ecs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
+    "ecs-task-definition": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "ecs-task": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "stop"},
+    "ecs-service": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "ecs-container-instance": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
+    "eks": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "eks-nodegroup": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
+    "ecr": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
+    "ecr-image": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
+
+    # Storage
+    "ebs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "ebs-snapshot": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "s3": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "efs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "glacier": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "backup-plan": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
+    "backup-vault": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
+
+    # Networking & Content Delivery
+    "vpc": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "subnet": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory"]},
+    "security-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory"], "delete_action": "delete"},
+    "route-table": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory"]},
+    "internet-gateway": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "nat-gateway": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "elastic-ip": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "disassociate"},
+    "elb": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "app-elb": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "app-elb-target-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "globalaccelerator": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "distribution": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "disable"},
+    "rest-api": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "apigwv2": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "firewall": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "waf": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "waf-regional": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "wafv2": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "shield-protection": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "network-acl": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "peering-connection": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "vpn-gateway": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "r53domain": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "hostedzone": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "prefix-list": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "directconnect": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+
+    # Database
+    "rds": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "rds-cluster": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "rds-cluster-snapshot": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "rds-snapshot": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "dynamodb-table": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "redshift": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "cache-cluster": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+
+    # Security, Identity, & Compliance
+    "iam-role": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "iam-policy": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "iam-user": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "acm-certificate": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "config-rule": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "cloudtrail": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "iam-saml-provider": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "iam-certificate": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "iam-oidc-provider": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "kms-key": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "guardduty-finding": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "ses-email-identity": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "identity-pool": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "user-pool": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+
+    # Management & Governance
+    "cfn": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+    "ssm-document": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "log-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "alarm": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "catalog-product": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
+
+    # Machine Learning
+    "sagemaker-notebook": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "sagemaker-model": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+
+    # Developer Tools
+    "codebuild": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "codepipeline": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "codedeploy-app": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "codecommit": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
+
+    # Analytics
+    "athena-work-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
+    "glue-crawler": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "glue-database": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
+    "glue-job": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "kinesis": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+
+    # Integration & Messaging
+    "sns": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "sqs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "firehose": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
+    "step-machine": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"]},
+}
+
+
 if __name__ == "__main__":
-    # Define resource configurations including required tags and optional delete actions.
-    resources_tags = {
-        # Compute
-        "ec2": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "EndpointType"], "delete_action": "terminate"},
-        "ec2-spot-fleet-request": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "EndpointType"]},
-        "ec2-capacity-reservation": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
-        "ami": {"tags": ["DeploymentType", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "deregister"},
-        "lambda": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "elasticbeanstalk-environment": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "terminate"},
-        "batch-compute": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]  , "delete_action": "delete"},
-        "workspaces": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "terminate"},
-
-        # Containers & Kubernetes
-        "ecs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
-        "ecs-task-definition": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "ecs-task": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "stop"},
-        "ecs-service": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "ecs-container-instance": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
-        "eks": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "eks-nodegroup": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
-        "ecr": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
-        "ecr-image": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg"]},
-
-        # Storage
-        "ebs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "ebs-snapshot": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "s3": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "efs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "glacier": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "backup-plan": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
-        "backup-vault": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
-
-        # Networking & Content Delivery
-        "vpc": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "subnet": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory"]},
-        "security-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory"], "delete_action": "delete"},
-        "route-table": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory"]},
-        "internet-gateway": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "nat-gateway": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "elastic-ip": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "disassociate"},
-        "elb": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "app-elb": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "app-elb-target-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "globalaccelerator": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "distribution": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "disable"},
-        "rest-api": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "apigwv2": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "firewall": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "waf": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "waf-regional": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "wafv2": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "shield-protection": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "network-acl": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "peering-connection": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "vpn-gateway": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "r53domain": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "hostedzone": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "prefix-list": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "directconnect": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-
-        # Database
-        "rds": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "rds-cluster": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "rds-cluster-snapshot": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "rds-snapshot": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "dynamodb-table": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "redshift": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "cache-cluster": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-
-        # Security, Identity, & Compliance
-        "iam-role": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "iam-policy": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "iam-user": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "acm-certificate": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "config-rule": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "cloudtrail": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "iam-saml-provider": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "iam-certificate": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "iam-oidc-provider": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "kms-key": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "guardduty-finding": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "ses-email-identity": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "identity-pool": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "user-pool": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-
-        # Management & Governance
-        "cfn": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-        "ssm-document": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "log-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "alarm": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "catalog-product": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"]},
-
-        # Machine Learning
-        "sagemaker-notebook": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "sagemaker-model": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-
-        # Developer Tools
-        "codebuild": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "codepipeline": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "codedeploy-app": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-        "codecommit": {"tags": ["DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg"], "delete_action": "delete"},
-
-        # Analytics
-        "athena-work-group": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
-        "glue-crawler": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "glue-database": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"]},
-        "glue-job": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "kinesis": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "Exposure", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-
-        # Integration & Messaging
-        "sns": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "sqs": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "firehose": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"], "delete_action": "delete"},
-        "step-machine": {"tags": ["Environment", "DeploymentType", "Brand", "AppCategory", "AdminEmail", "OwningOrg", "DataClassification"]},
-    }
-
-    # Generate policies and write them to a YAML file.
-    policies = generate_policies(resources_tags)
-    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "policies.yml")
+    parser = argparse.ArgumentParser(description="Generate Cloud Custodian tagging policies.")
+    parser.add_argument("--format", choices=["yaml", "json"], default="yaml", help="Output format.")
+    parser.add_argument("--output", help="Output file. Defaults to policies.yml (or .json) next to this script.")
+    parser.add_argument("--shard-dir", help="Also write one shard per resource type into this directory.")
+    parser.add_argument("--validate", action="store_true", help="Validate changed shards with custodian.")
+    parser.add_argument("--tier-dir", help="Also write one bundle per scan tier into this directory.")
+    parser.add_argument("--tiers", default="state/tiers.json", help="Resource type tiers from tier_planner.py.")
+    parser.add_argument(
+        "--no-notify",
+        action="store_true",
+        default=os.getenv("C7N_DELTA_NOTIFY", "").lower() in ("1", "true", "yes"),
+        help="Omit notify actions; compliance_state.py sends delta notifications instead.",
+    )
+    args = parser.parse_args()
+
+    # Generate policies and write them to the output file.
+    policies = generate_policies(resources_tags, notify=not args.no_notify)
+    output_path = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "policies.json" if args.format == "json" else "policies.yml"
+    )
     with open(output_path, "w") as file:
-        yaml.dump(policies, file, sort_keys=False, default_flow_style=False)
+        dump_policies(policies, file, args.format)
+
+    if args.shard_dir:
+        # Rewrite only the shards whose content hash changed since the last run.
+        changed_shards = write_policy_shards(
+            resources_tags,
+            args.shard_dir,
+            output_format=args.format,
+            validate=validate_with_custodian if args.validate else None,
+            notify=not args.no_notify,
+        )
+        print(f"{len(changed_shards)} of {len(resources_tags)} policy shards changed.")
+
+    if args.tier_dir:
+        tier_assignments = {}
+        if os.path.exists(args.tiers):
+            with open(args.tiers) as file:
+                tier_assignments = json.load(file)
+        tier_sizes = write_tier_bundles(
+            resources_tags,
+            tier_assignments,
+            args.tier_dir,
+            output_format=args.format,
+            notify=not args.no_notify,
+        )
+        print("Tier bundles: " + ", ".join(f"{tier} {size}" for tier, size in tier_sizes.items()))
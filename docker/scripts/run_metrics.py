@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import argparse
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+NAMESPACE = "CloudCustodian/TaggingControl"
+
+# c7n policy metrics (metadata.json "metrics") copied into the report, by report field.
+C7N_METRICS = {
+    "ResourceCount": "resource_count",
+    "ResourceTime": "resource_time",
+    "ActionTime": "action_time",
+}
+
+
+def read_stages(path: str) -> List[Dict[str, Any]]:
+    """
+    Read the stage timings written by timed_stage in source.sh.
+
+    Args:
+        path (str): Tab-separated file of stage, start, end and exit code.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per stage with its wall time in seconds.
+    """
+    if not os.path.exists(path):
+        return []
+    stages = []
+    with open(path) as file:
+        for line in file:
+            name, start, end, status = line.rstrip("\n").split("\t")
+            stages.append({
+                "stage": name,
+                "start": float(start),
+                "duration": float(end) - float(start),
+                "exit_code": int(status),
+            })
+    return stages
+
+
+def policy_outputs(output_dir: str, since: Optional[float] = None) -> Iterator[Tuple[str, str, str, Dict[str, Any]]]:
+    """
+    Walk c7n-org output laid out as <account>/<region>/<policy>/{metadata.json,resources.json}.
+
+    The output directory is reused across runs, so it also holds the output of
+    policies that did not run this time (other tiers, unchanged shards). With since,
+    only policies whose execution started at or after it are returned.
+
+    Args:
+        output_dir (str): c7n-org output directory.
+        since (Optional[float]): Start of the current run, in epoch seconds.
+
+    Returns:
+        Iterator[Tuple[str, str, str, Dict[str, Any]]]: Policy directory, account,
+        region and metadata of each policy.
+    """
+    for root, _, files in os.walk(output_dir):
+        if "metadata.json" not in files:
+            continue
+        with open(os.path.join(root, "metadata.json")) as file:
+            metadata = json.load(file)
+        if since is not None and metadata.get("execution", {}).get("start", 0) < since:
+            continue
+        account, region = os.path.relpath(os.path.dirname(root), output_dir).split(os.sep)[:2]
+        yield root, account, region, metadata
+
+
+def read_policy_runs(output_dir: str, since: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Collect per-policy execution metrics from c7n-org output.
+
+    Args:
+        output_dir (str): c7n-org output directory.
+        since (Optional[float]): Start of the current run; older output is skipped
+            (see policy_outputs).
+
+    Returns:
+        List[Dict[str, Any]]: One entry per policy, account and region.
+    """
+    runs = []
+    for root, account, region, metadata in policy_outputs(output_dir, since):
+        api_stats = metadata.get("api-stats", {})
+        execution = metadata.get("execution", {})
+        run = {
+            "policy": metadata["policy"]["name"],
+            "resource": metadata["policy"]["resource"],
+            "account": account,
+            "region": region,
+            "start": execution.get("start"),
+            "duration": execution.get("duration", 0.0),
+            "api_calls": sum(api_stats.values()),
+            "api_stats": api_stats,
+            "resource_count": None,
+            "resource_time": 0.0,
+            "action_time": 0.0,
+        }
+        for metric in metadata.get("metrics", []):
+            if metric.get("MetricName") in C7N_METRICS:
+                run[C7N_METRICS[metric["MetricName"]]] = metric["Value"]
+        if run["resource_count"] is None:
+            run["resource_count"] = 0
+            if os.path.exists(os.path.join(root, "resources.json")):
+                with open(os.path.join(root, "resources.json")) as file:
+                    run["resource_count"] = len(json.load(file))
+        runs.append(run)
+    return runs
+
+
+def build_report(
+    stages: List[Dict[str, Any]],
+    runs: List[Dict[str, Any]],
+    top: int = 10,
+    started: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Assemble the run report, with per-policy totals across accounts and regions.
+
+    Args:
+        stages (List[Dict[str, Any]]): Output of read_stages.
+        runs (List[Dict[str, Any]]): Output of read_policy_runs.
+        top (int): Number of slowest policies and accounts to list.
+        started (Optional[float]): Start of the run the policy runs were limited to.
+
+    Returns:
+        Dict[str, Any]: The report.
+    """
+    per_policy: Dict[str, Dict[str, Any]] = {}
+    per_account: Dict[str, float] = {}
+    for run in runs:
+        total = per_policy.setdefault(run["policy"], {
+            "resource": run["resource"], "duration": 0.0, "api_calls": 0,
+            "resource_count": 0, "resource_time": 0.0, "action_time": 0.0,
+        })
+        for field in ("duration", "api_calls", "resource_count", "resource_time", "action_time"):
+            total[field] += run[field]
+        per_account[run["account"]] = per_account.get(run["account"], 0.0) + run["duration"]
+
+    return {
+        "generated": time.time(),
+        "started": started,
+        "stages": stages,
+        "policies": per_policy,
+        "slowest_policies": sorted(per_policy, key=lambda name: per_policy[name]["duration"], reverse=True)[:top],
+        "slowest_accounts": sorted(per_account, key=per_account.get, reverse=True)[:top],
+        "runs": runs,
+    }
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(report: Dict[str, Any]) -> str:
+    """
+    Render the report in the Prometheus text exposition format, for the node
+    exporter textfile collector.
+    """
+    series = {
+        "c7n_stage_duration_seconds": ("Wall time of a pipeline stage.", []),
+        "c7n_policy_duration_seconds": ("Execution time of a policy.", []),
+        "c7n_policy_resource_time_seconds": ("Time spent describing resources.", []),
+        "c7n_policy_action_time_seconds": ("Time spent running actions.", []),
+        "c7n_policy_api_calls": ("API calls made by a policy.", []),
+        "c7n_policy_resources": ("Resources matched by a policy.", []),
+    }
+    for stage in report["stages"]:
+        series["c7n_stage_duration_seconds"][1].append((f'stage="{_label(stage["stage"])}"', stage["duration"]))
+    for run in report["runs"]:
+        labels = f'policy="{_label(run["policy"])}",account="{_label(run["account"])}",region="{_label(run["region"])}"'
+        series["c7n_policy_duration_seconds"][1].append((labels, run["duration"]))
+        series["c7n_policy_resource_time_seconds"][1].append((labels, run["resource_time"]))
+        series["c7n_policy_action_time_seconds"][1].append((labels, run["action_time"]))
+        series["c7n_policy_api_calls"][1].append((labels, run["api_calls"]))
+        series["c7n_policy_resources"][1].append((labels, run["resource_count"]))
+
+    lines = []
+    for name, (description, samples) in series.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f"{name}{{{labels}}} {value}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def emf_lines(report: Dict[str, Any]) -> List[str]:
+    """
+    Render the report as CloudWatch Embedded Metric Format lines.
+    """
+    timestamp = int(report["generated"] * 1000)
+    lines = []
+    for stage in report["stages"]:
+        lines.append(json.dumps({
+            "_aws": {"Timestamp": timestamp, "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [["Stage"]],
+                "Metrics": [{"Name": "StageDuration", "Unit": "Seconds"}],
+            }]},
+            "Stage": stage["stage"],
+            "StageDuration": stage["duration"],
+        }))
+    for run in report["runs"]:
+        lines.append(json.dumps({
+            "_aws": {"Timestamp": timestamp, "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [["Policy"], ["Policy", "Account", "Region"]],
+                "Metrics": [
+                    {"Name": "PolicyDuration", "Unit": "Seconds"},
+                    {"Name": "ResourceTime", "Unit": "Seconds"},
+                    {"Name": "ActionTime", "Unit": "Seconds"},
+                    {"Name": "ApiCalls", "Unit": "Count"},
+                    {"Name": "ResourceCount", "Unit": "Count"},
+                ],
+            }]},
+            "Policy": run["policy"],
+            "Account": run["account"],
+            "Region": run["region"],
+            "PolicyDuration": run["duration"],
+            "ResourceTime": run["resource_time"],
+            "ActionTime": run["action_time"],
+            "ApiCalls": run["api_calls"],
+            "ResourceCount": run["resource_count"],
+        }))
+    return lines
+
+
+def _write(path: Optional[str], content: str) -> None:
+    # Write atomically so collectors never read a partial file.
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w") as file:
+        file.write(content)
+    os.replace(f"{path}.tmp", path)
+
+
+def export_metrics(
+    output_dir: str,
+    stages_path: str,
+    report_path: Optional[str],
+    prometheus_path: Optional[str],
+    emf_path: Optional[str],
+    since: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Build the run report and write it with its Prometheus and EMF renderings.
+    Outputs whose path is None are skipped; an EMF path of "-" prints to stdout.
+    With since, only the policies executed by the current run are reported.
+
+    Returns:
+        Dict[str, Any]: The report.
+    """
+    run_report = build_report(read_stages(stages_path), read_policy_runs(output_dir, since), started=since)
+    _write(report_path, json.dumps(run_report, indent=2))
+    _write(prometheus_path, prometheus_text(run_report))
+    emf = "\n".join(emf_lines(run_report)) + "\n"
+    if emf_path == "-":
+        print(emf, end="")
+    else:
+        _write(emf_path, emf)
+    return run_report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export run timings and c7n policy metrics.")
+    parser.add_argument("--output-dir", default="output", help="c7n-org output directory.")
+    parser.add_argument("--stages", default=os.getenv("STAGE_TIMINGS_FILE", "state/stages.tsv"), help="Stage timings file.")
+    parser.add_argument("--report", default="state/run_report.json", help="JSON run report.")
+    parser.add_argument("--prometheus", default="state/c7n.prom", help="Prometheus textfile.")
+    parser.add_argument("--emf", default="state/c7n.emf", help="CloudWatch EMF log file ('-' for stdout).")
+    parser.add_argument("--since", type=float, help="Run start (epoch seconds); older policy output is ignored.")
+    args = parser.parse_args()
+
+    exported = export_metrics(args.output_dir, args.stages, args.report, args.prometheus, args.emf, args.since)
+    print(f"Slowest policies: {', '.join(exported['slowest_policies'][:5])}")
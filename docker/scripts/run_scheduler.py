@@ -0,0 +1,380 @@
+import os
+import json
+import time
+import shlex
+import argparse
+import subprocess
+from dataclasses import dataclass
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional
+
+import yaml
+
+DEFAULT_RUNNER = (
+    "c7n-org run --config {config} --use {shard} --accounts {account} "
+    "--region {region} --output-dir {output_dir}"
+)
+
+# Resource types whose API calls are throttled by another service than their name prefix.
+SERVICE_OVERRIDES = {
+    "ami": "ec2",
+    "ebs": "ec2",
+    "ebs-snapshot": "ec2",
+    "vpc": "ec2",
+    "subnet": "ec2",
+    "security-group": "ec2",
+    "route-table": "ec2",
+    "internet-gateway": "ec2",
+    "nat-gateway": "ec2",
+    "elastic-ip": "ec2",
+    "network-acl": "ec2",
+    "peering-connection": "ec2",
+    "vpn-gateway": "ec2",
+    "prefix-list": "ec2",
+    "app-elb": "elbv2",
+    "app-elb-target-group": "elbv2",
+    "distribution": "cloudfront",
+    "rest-api": "apigateway",
+    "apigwv2": "apigateway",
+    "hostedzone": "route53",
+    "r53domain": "route53",
+    "log-group": "logs",
+    "alarm": "cloudwatch",
+    "cfn": "cloudformation",
+    "step-machine": "stepfunctions",
+    "identity-pool": "cognito",
+    "user-pool": "cognito",
+    "cache-cluster": "elasticache",
+    "dynamodb-table": "dynamodb",
+    "catalog-product": "servicecatalog",
+}
+
+
+def resource_service(resource: str) -> str:
+    """
+    Return the AWS service whose rate limits apply to a resource type.
+
+    Args:
+        resource (str): c7n resource type, e.g. "ebs-snapshot".
+
+    Returns:
+        str: Service name used for per-service concurrency limits.
+    """
+    return SERVICE_OVERRIDES.get(resource, resource.split("-")[0])
+
+
+@dataclass(frozen=True)
+class WorkUnit:
+    """
+    One c7n-org invocation: a single policy shard in one account and region.
+    """
+
+    account: str
+    region: str
+    shard: str
+
+    @property
+    def resource(self) -> str:
+        return os.path.splitext(os.path.basename(self.shard))[0]
+
+    @property
+    def service(self) -> str:
+        return resource_service(self.resource)
+
+    @property
+    def key(self) -> str:
+        return f"{self.account}/{self.region}/{self.resource}"
+
+
+def load_work_units(
+    config_path: str,
+    shard_paths: List[str],
+    default_region: str = "us-east-1",
+    prescan: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[WorkUnit]:
+    """
+    Expand a c7n-org accounts file and policy shards into work units.
+
+    Args:
+        config_path (str): c7n-org accounts file.
+        shard_paths (List[str]): Policy shard files, one resource type each.
+        default_region (str): Region used for accounts that do not list any.
+        prescan (Optional[Dict[str, Dict[str, Any]]]): Result of tag_prescan. When set,
+            units are only created for the resource types it selected; accounts and
+            regions missing from it keep every shard.
+
+    Returns:
+        List[WorkUnit]: One unit per selected (account, region, shard).
+    """
+    with open(config_path) as file:
+        accounts = (yaml.safe_load(file) or {}).get("accounts", [])
+    units = [
+        WorkUnit(account=account["name"], region=region, shard=shard)
+        for account in accounts
+        for region in account.get("regions") or [default_region]
+        for shard in shard_paths
+    ]
+    if prescan is None:
+        return units
+    return [
+        unit for unit in units
+        if f"{unit.account}/{unit.region}" not in prescan
+        or unit.resource in prescan[f"{unit.account}/{unit.region}"]["run"]
+    ]
+
+
+class Checkpoint:
+    """
+    Persists completed work units and observed durations so an interrupted run can
+    resume, and so later runs can schedule the longest units first.
+
+    The checkpoint belongs to one run: it is only resumed by a run with the same
+    run id, and only within max_age seconds of its creation. Any other run starts
+    fresh, so a unit that keeps failing never stops the others from running.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        history_path: Optional[str] = None,
+        run_id: Optional[str] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        """
+        Initialize the Checkpoint, loading the state left by an interrupted run if it
+        may be resumed.
+
+        Args:
+            path (str): Checkpoint file holding the units completed in the current run.
+            history_path (Optional[str]): File holding durations from earlier runs.
+            run_id (Optional[str]): Identity of the run. None starts a fresh run.
+            max_age (Optional[float]): Seconds after which a checkpoint is not resumed.
+        """
+        self.path = path
+        self.history_path = history_path
+        self.run_id = run_id or f"run-{int(time.time())}-{os.getpid()}"
+        self.started = time.time()
+        self.completed: Dict[str, float] = {}
+        state = self._read(path) if run_id else {}
+        if (
+            run_id
+            and state.get("run_id") == run_id
+            and (max_age is None or self.started - state.get("started", 0) <= max_age)
+        ):
+            self.started = state["started"]
+            self.completed = state.get("completed", {})
+        self.history: Dict[str, float] = self._read(history_path) if history_path else {}
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        if not os.path.exists(path):
+            return {}
+        with open(path) as file:
+            return json.load(file)
+
+    @staticmethod
+    def _write(path: str, data: Dict[str, Any]) -> None:
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint.
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def is_done(self, unit: WorkUnit) -> bool:
+        return unit.key in self.completed
+
+    def expected_duration(self, unit: WorkUnit) -> float:
+        """
+        Return the last observed duration of a unit, or of its resource type across
+        accounts when the unit itself was never run.
+        """
+        if unit.key in self.history:
+            return self.history[unit.key]
+        same_resource = [value for key, value in self.history.items() if key.endswith(f"/{unit.resource}")]
+        return max(same_resource, default=0.0)
+
+    def mark_done(self, unit: WorkUnit, duration: float) -> None:
+        self.completed[unit.key] = duration
+        self._write(self.path, {"run_id": self.run_id, "started": self.started, "completed": self.completed})
+
+    def finish(self) -> None:
+        """
+        Fold the durations of the finished run into the history and drop the checkpoint.
+        """
+        if self.history_path:
+            self.history.update(self.completed)
+            self._write(self.history_path, self.history)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RunScheduler:
+    """
+    Runs work units on a bounded worker pool, longest expected units first, while
+    keeping per-account and per-service concurrency under the configured limits.
+    """
+
+    def __init__(
+        self,
+        checkpoint: Checkpoint,
+        runner: str = DEFAULT_RUNNER,
+        max_workers: int = 8,
+        per_account: int = 4,
+        per_service: int = 2,
+        runner_args: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Initialize the RunScheduler.
+
+        Args:
+            checkpoint (Checkpoint): Completed units and duration history.
+            runner (str): Command template run per unit. Placeholders: {account},
+                {region}, {shard}, {resource} and any key of runner_args.
+            max_workers (int): Maximum number of units running at once.
+            per_account (int): Maximum concurrent units per account.
+            per_service (int): Maximum concurrent units per account and service.
+            runner_args (Optional[Dict[str, str]]): Extra template values such as
+                config and output_dir.
+        """
+        self.checkpoint = checkpoint
+        self.runner = runner
+        self.max_workers = max_workers
+        self.per_account = per_account
+        self.per_service = per_service
+        self.runner_args = runner_args or {}
+        self.ran: List[WorkUnit] = []
+        self.skipped: List[WorkUnit] = []
+
+    def _run_unit(self, unit: WorkUnit) -> float:
+        command = self.runner.format(
+            account=shlex.quote(unit.account),
+            region=shlex.quote(unit.region),
+            shard=shlex.quote(unit.shard),
+            resource=shlex.quote(unit.resource),
+            **{name: shlex.quote(value) for name, value in self.runner_args.items()},
+        )
+        start = time.monotonic()
+        subprocess.run(shlex.split(command), check=True, stdout=subprocess.DEVNULL)
+        return time.monotonic() - start
+
+    def _fits(self, unit: WorkUnit, accounts: Counter, services: Counter) -> bool:
+        return (
+            accounts[unit.account] < self.per_account
+            and services[(unit.account, unit.service)] < self.per_service
+        )
+
+    def run(self, units: List[WorkUnit]) -> List[WorkUnit]:
+        """
+        Run every unit that is not already checkpointed. The units run and those
+        skipped as completed by the resumed run are kept in `ran` and `skipped`.
+
+        Args:
+            units (List[WorkUnit]): All units of the run.
+
+        Returns:
+            List[WorkUnit]: Units that failed. An empty list means the run completed
+            and the checkpoint was folded into the duration history.
+        """
+        self.skipped = [unit for unit in units if self.checkpoint.is_done(unit)]
+        pending = sorted(
+            (unit for unit in units if not self.checkpoint.is_done(unit)),
+            key=self.checkpoint.expected_duration,
+            reverse=True,
+        )
+        self.ran = list(pending)
+        running: Dict[Future, WorkUnit] = {}
+        accounts: Counter = Counter()
+        services: Counter = Counter()
+        failed = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                # Start the longest pending units that fit under the concurrency limits.
+                for unit in list(pending):
+                    if len(running) >= self.max_workers:
+                        break
+                    if self._fits(unit, accounts, services):
+                        pending.remove(unit)
+                        accounts[unit.account] += 1
+                        services[(unit.account, unit.service)] += 1
+                        running[pool.submit(self._run_unit, unit)] = unit
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    unit = running.pop(future)
+                    accounts[unit.account] -= 1
+                    services[(unit.account, unit.service)] -= 1
+                    try:
+                        self.checkpoint.mark_done(unit, future.result())
+                    except (subprocess.CalledProcessError, OSError) as error:
+                        print(f"Unit {unit.key} failed: {error}")
+                        failed.append(unit)
+
+        if not failed:
+            self.checkpoint.finish()
+        return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run c7n-org over (account, region, shard) work units.")
+    parser.add_argument("--config", default="accounts.yml", help="c7n-org accounts file.")
+    parser.add_argument("--shard-dir", default="policies/shards", help="Directory of policy shards.")
+    parser.add_argument("--changed-only", action="store_true", help="Only run shards listed in changed.txt.")
+    parser.add_argument("--shard-list", help="Only run the shards listed in this file, e.g. those of the due tiers.")
+    parser.add_argument("--output-dir", default="output", help="c7n-org output directory.")
+    parser.add_argument("--state-dir", default="state", help="Directory for the checkpoint and duration history.")
+    parser.add_argument("--runner", default=DEFAULT_RUNNER, help="Command template run per work unit.")
+    parser.add_argument("--max-workers", type=int, default=8, help="Maximum concurrent work units.")
+    parser.add_argument("--per-account", type=int, default=4, help="Maximum concurrent units per account.")
+    parser.add_argument("--per-service", type=int, default=2, help="Maximum concurrent units per account and service.")
+    parser.add_argument("--run-id", default=os.getenv("C7N_RUN_ID"),
+                        help="Run identity; resumes the checkpoint of an interrupted run with the same id.")
+    parser.add_argument("--resume", action="store_true", help="Resume the interrupted run, whatever its id.")
+    parser.add_argument("--max-age", type=float, default=24.0, help="Hours after which a checkpoint is not resumed.")
+    parser.add_argument("--reset", action="store_true", help="Discard the checkpoint of an interrupted run.")
+    parser.add_argument("--prescan", help="tag_prescan result; skip resource types it found compliant.")
+    args = parser.parse_args()
+
+    prescan_result = None
+    if args.prescan:
+        with open(args.prescan) as file:
+            prescan_result = json.load(file)
+
+    if args.changed_only or args.shard_list:
+        with open(args.shard_list or os.path.join(args.shard_dir, "changed.txt")) as file:
+            shards = [line.strip() for line in file if line.strip()]
+    else:
+        shards = sorted(
+            os.path.join(args.shard_dir, name)
+            for name in os.listdir(args.shard_dir)
+            if name.endswith((".yml", ".json")) and name != "manifest.json"
+        )
+
+    checkpoint_path = os.path.join(args.state_dir, "checkpoint.json")
+    if args.reset and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    resume_id = args.run_id
+    if args.resume and not resume_id and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as file:
+            resume_id = json.load(file).get("run_id")
+    scheduler = RunScheduler(
+        Checkpoint(checkpoint_path, os.path.join(args.state_dir, "durations.json"), resume_id, args.max_age * 3600),
+        runner=args.runner,
+        max_workers=args.max_workers,
+        per_account=args.per_account,
+        per_service=args.per_service,
+        runner_args={"config": args.config, "output_dir": args.output_dir},
+    )
+    work_units = load_work_units(args.config, shards, os.getenv("AWS_REGION", "us-east-1"), prescan_result)
+    failed_units = scheduler.run(work_units)
+    print(
+        f"{len(scheduler.ran) - len(failed_units)} of {len(scheduler.ran)} work units run completed"
+        f" ({len(failed_units)} failed); {len(scheduler.skipped)} skipped as completed by run"
+        f" {scheduler.checkpoint.run_id}."
+    )
+    if failed_units:
+        raise SystemExit(1)
@@ -0,0 +1,416 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import multiprocessing
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import yaml
+
+from compliance_evaluator import ARN_KEY_RESOURCE_TYPES, ResourceInventory, build_matrices, evaluate
+from compliance_state import Delta
+from digest_notifier import build_digests
+from local_aws import LocalTagging
+from policy_generator import dump_policies, generate_policies, resources_tags
+from secret_provider import OFFLINE_SECRETS, SecretProvider, StaticBackend
+from tag_prescan import CUSTODIAN_TAG, TAGGING_RESOURCE_TYPES, arn_resource_key, scan_tags
+
+LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+REGIONS = ("us-east-1", "us-east-2", "us-west-2", "eu-west-1", "eu-central-1", "ap-southeast-2")
+
+# Scale points: accounts x regions x resource types x resources per type in each
+# account and region. "large" is about 750k resources.
+SCENARIOS = {
+    "small": {"accounts": 3, "regions": 2, "types": None, "per_type": 10, "compliance": 0.7},
+    "medium": {"accounts": 25, "regions": 3, "types": None, "per_type": 10, "compliance": 0.7},
+    "large": {"accounts": 250, "regions": 4, "types": None, "per_type": 10, "compliance": 0.7},
+}
+
+# Share of non-compliant resources already carrying a due custodian mark, and of
+# compliant ones still marked from before they were fixed.
+MARKED_RATIO = 0.3
+REMEDIATED_RATIO = 0.05
+OWNERS = 50
+
+
+def peak_rss_mb() -> float:
+    """
+    Return the peak resident set size of this process so far, in MiB.
+    """
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def synthetic_arn(key: str, account: str, region: str, name: str) -> str:
+    """
+    Build an ARN that tag_prescan.arn_resource_key maps back to key.
+    """
+    service, _, resource_type = key.partition(":")
+    if service == "s3":
+        return f"arn:aws:s3:::{name}"
+    if not resource_type:
+        return f"arn:aws:{service}:{region}:{account}:{name}"
+    return f"arn:aws:{service}:{region}:{account}:{resource_type}/{name}"
+
+
+def synthetic_inventory(
+    accounts: int,
+    regions: int,
+    resource_types: List[str],
+    per_type: int,
+    compliance: float,
+    seed: int = 0,
+) -> Dict[Tuple[str, str], LocalTagging]:
+    """
+    Generate a synthetic tagged inventory served by one LocalTagging stand-in per
+    account and region.
+
+    A `compliance` share of the resources carries every required tag, and
+    REMEDIATED_RATIO of them still carry a custodian mark. The others miss one
+    required tag, and MARKED_RATIO of them also carry a due custodian mark.
+    Resources share a small pool of tag dictionaries, so millions of resources
+    fit in memory.
+
+    Args:
+        accounts (int): Number of accounts.
+        regions (int): Regions per account (at most len(REGIONS)).
+        resource_types (List[str]): Resource types, all mapped in TAGGING_RESOURCE_TYPES.
+        per_type (int): Resources per type in each account and region.
+        compliance (float): Share of compliant resources, between 0 and 1.
+        seed (int): Random seed; the same arguments always give the same inventory.
+
+    Returns:
+        Dict[Tuple[str, str], LocalTagging]: Stand-ins keyed by (account id, region).
+    """
+    rng = random.Random(seed)
+    mark_date = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y/%m/%d")
+    profiles: Dict[Tuple[str, int], List[Dict[str, str]]] = {}
+    for resource_type in resource_types:
+        config = resources_tags[resource_type]
+        required = config.get("tags", [])
+        op = config.get("delete_action") or "notify"
+        for owner in range(OWNERS):
+            compliant = {tag: f"{tag.lower()}-{owner % 7}" for tag in required}
+            compliant.update({"AdminEmail": f"owner{owner}@example.com", "OwningOrg": f"org{owner % 10}"})
+            mark = {CUSTODIAN_TAG: f"Resource does not meet tag policy: {op}@{mark_date}"}
+            variants = [compliant, dict(compliant, **mark)]
+            for missing in required:
+                unmarked = {key: value for key, value in compliant.items() if key != missing}
+                variants.extend((unmarked, dict(unmarked, **mark)))
+            profiles[(resource_type, owner)] = variants
+
+    inventory = {}
+    for account_index in range(accounts):
+        account = f"{100000000000 + account_index:012d}"
+        for region in REGIONS[:regions]:
+            resources = {}
+            for resource_type in resource_types:
+                key = TAGGING_RESOURCE_TYPES[resource_type][0]
+                for index in range(per_type):
+                    variants = profiles[(resource_type, rng.randrange(OWNERS))]
+                    if rng.random() < compliance or len(variants) == 2:
+                        tags = variants[rng.random() < REMEDIATED_RATIO]
+                    else:
+                        missing = rng.randrange(len(variants) // 2 - 1)
+                        tags = variants[2 + 2 * missing + (rng.random() < MARKED_RATIO)]
+                    name = f"bench-{resource_type}-{account_index}-{region}-{index}"
+                    resources[synthetic_arn(key, account, region, name)] = tags
+            inventory[(account, region)] = LocalTagging(resources)
+    return inventory
+
+
+def _timed(func: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """
+    Return the best wall time in seconds over several runs of func, and its last result.
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _stage(seconds: float, items: int, **extra: Any) -> Dict[str, Any]:
+    return {
+        "seconds": seconds,
+        "items": items,
+        "per_second": items / seconds if seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def _validate(text: str, state_dir: str) -> Optional[Callable[[], None]]:
+    """
+    Return a function validating a policy file against the cached c7n schema, or None
+    when c7n is not installed.
+    """
+    try:
+        import c7n  # noqa: F401
+    except ImportError:
+        return None
+    import tempfile
+    from c7n_driver import SchemaCache
+
+    schema_cache = SchemaCache(state_dir)
+    schema_cache.schema()
+    path = os.path.join(tempfile.mkdtemp(), "policies.yml")
+    with open(path, "w") as file:
+        file.write(text)
+    return lambda: schema_cache.validate([path])
+
+
+def _deltas(index: Dict[str, Dict[str, str]], account: str, region: str) -> List[Delta]:
+    """
+    Build the deltas a first sweep of an account and region would notify.
+    """
+    deltas = []
+    for arn, tags in index.items():
+        resource_type = ARN_KEY_RESOURCE_TYPES[arn_resource_key(arn)]
+        if any(tag not in tags for tag in resources_tags[resource_type].get("tags", [])):
+            event = "deletion-imminent" if CUSTODIAN_TAG in tags else "new-violation"
+        elif CUSTODIAN_TAG in tags:
+            event = "resolved"
+        else:
+            continue
+        deltas.append(Delta(arn, account, region, resource_type, event, owner=tags.get("AdminEmail"), org=tags.get("OwningOrg")))
+    return deltas
+
+
+def run_scenario(params: Dict[str, Any], repeat: int = 3, seed: int = 0, state_dir: str = "state") -> Dict[str, Any]:
+    """
+    Run every stage of one scale point and measure it.
+
+    Stages: synthetic inventory, policy generation, YAML and JSON dumps, YAML load,
+    c7n validation (when c7n is installed), tagging API scan against the local
+    stand-in, filter evaluation and owner digests. Each stage reports its best wall
+    time over `repeat` runs, items processed per second, and the process peak RSS
+    once it completed. Run each scenario in a fresh process so the peaks are its own.
+
+    Args:
+        params (Dict[str, Any]): Scenario, as in SCENARIOS.
+        repeat (int): Runs per stage; the inventory is generated once.
+        seed (int): Inventory random seed.
+        state_dir (str): Directory holding the cached c7n schema.
+
+    Returns:
+        Dict[str, Any]: The scenario parameters, resource count and per-stage metrics.
+    """
+    configured = [resource for resource in resources_tags if resource in TAGGING_RESOURCE_TYPES]
+    resource_types = configured[:params["types"]] if params.get("types") else configured
+    config = {resource: resources_tags[resource] for resource in resource_types}
+    secrets = SecretProvider(StaticBackend(OFFLINE_SECRETS))
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    seconds, inventory = _timed(lambda: synthetic_inventory(
+        params["accounts"], params["regions"], resource_types, params["per_type"], params["compliance"], seed,
+    ), 1)
+    resource_count = sum(len(client.resources) for client in inventory.values())
+    stages["inventory"] = _stage(seconds, resource_count)
+
+    seconds, policies = _timed(lambda: generate_policies(config, secrets=secrets), repeat)
+    policy_count = len(policies["policies"])
+    stages["generate"] = _stage(seconds, policy_count)
+
+    texts = {}
+    for output_format in ("yaml", "json"):
+        def dump(output_format: str = output_format) -> str:
+            stream = io.StringIO()
+            dump_policies(policies, stream, output_format)
+            return stream.getvalue()
+
+        seconds, texts[output_format] = _timed(dump, repeat)
+        stages[f"dump-{output_format}"] = _stage(seconds, policy_count, bytes=len(texts[output_format].encode()))
+
+    seconds, _ = _timed(lambda: yaml.load(texts["yaml"], Loader=LOADER), repeat)
+    stages["load"] = _stage(seconds, policy_count)
+
+    validate = _validate(texts["yaml"], state_dir)
+    if validate is not None:
+        seconds, _ = _timed(validate, repeat)
+        stages["validate"] = _stage(seconds, policy_count)
+
+    def scan() -> Dict[Tuple[str, str], Dict[str, Dict[str, str]]]:
+        return {key: scan_tags(client) for key, client in inventory.items()}
+
+    seconds, indexes = _timed(scan, repeat)
+    stages["scan"] = _stage(seconds, resource_count, api_calls=sum(client.calls for client in inventory.values()) // repeat)
+
+    def run_evaluation() -> Counter:
+        rows = ResourceInventory()
+        for (account, _), index in indexes.items():
+            for arn, tags in index.items():
+                rows.add(ARN_KEY_RESOURCE_TYPES[arn_resource_key(arn)], account, tags)
+        return evaluate(policies["policies"], build_matrices(rows))
+
+    seconds, counts = _timed(run_evaluation, repeat)
+    matches: Counter = Counter()
+    for (_, _, kind), count in counts.items():
+        matches[kind] += count
+    stages["evaluate"] = _stage(seconds, resource_count, matches=dict(sorted(matches.items())))
+
+    def notify() -> List[Dict[str, Any]]:
+        deltas = [delta for (account, region), index in indexes.items() for delta in _deltas(index, account, region)]
+        return build_digests(deltas)
+
+    seconds, digests = _timed(notify, repeat)
+    stages["digest"] = _stage(
+        seconds, sum(len(digest["items"]) for digest in digests),
+        digests=len(digests), bytes=len(json.dumps(digests).encode()),
+    )
+
+    return {
+        "params": params,
+        "resources": resource_count,
+        "policies": policy_count,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """
+    Describe the machine, so results are only compared against baselines from a similar one.
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "libyaml": bool(getattr(yaml, "__with_libyaml__", False)),
+    }
+
+
+def find_regressions(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    time_threshold: float = 0.25,
+    memory_threshold: float = 0.10,
+    min_seconds: float = 0.05,
+) -> List[str]:
+    """
+    Compare results against a baseline of the same format.
+
+    Flags a stage slower than the baseline by more than time_threshold (ignoring
+    differences below min_seconds, which are noise), peak RSS or output size grown
+    by more than memory_threshold, and changed filter match counts (the inventory
+    is seeded, so matches only change with the policies or the evaluator).
+
+    Returns:
+        List[str]: One message per regression.
+    """
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None:
+            continue
+        if reference["params"] != scenario["params"]:
+            regressions.append(f"{name}: parameters differ from the baseline, rerun with --save-baseline")
+            continue
+        if scenario["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + memory_threshold):
+            regressions.append(f"{name}: peak RSS {reference['peak_rss_mb']:.0f} -> {scenario['peak_rss_mb']:.0f} MiB")
+        for stage, metrics in scenario["stages"].items():
+            before = reference["stages"].get(stage)
+            if before is None:
+                continue
+            if (
+                metrics["seconds"] > before["seconds"] * (1 + time_threshold)
+                and metrics["seconds"] - before["seconds"] > min_seconds
+            ):
+                regressions.append(f"{name}/{stage}: {before['seconds']:.3f}s -> {metrics['seconds']:.3f}s")
+            if "bytes" in before and metrics["bytes"] > before["bytes"] * (1 + memory_threshold):
+                regressions.append(f"{name}/{stage}: output {before['bytes']} -> {metrics['bytes']} bytes")
+            if "matches" in before and metrics["matches"] != before["matches"]:
+                regressions.append(f"{name}/{stage}: matches {before['matches']} -> {metrics['matches']}")
+    return regressions
+
+
+def benchmark(scenarios: Dict[str, Dict[str, Any]], repeat: int = 3, seed: int = 0, state_dir: str = "state") -> Dict[str, Any]:
+    """
+    Run each scenario in a fresh process.
+
+    Returns:
+        Dict[str, Any]: "environment" and per-scenario results, the baseline format.
+    """
+    context = multiprocessing.get_context("spawn")
+    results: Dict[str, Any] = {"environment": environment(), "generated": time.time(), "scenarios": {}}
+    for name, params in scenarios.items():
+        with context.Pool(1) as pool:
+            results["scenarios"][name] = pool.apply(run_scenario, (params, repeat, seed, state_dir))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark policy generation and evaluation on synthetic inventories.")
+    parser.add_argument("--scenario", nargs="+", default=["small", "medium"], choices=sorted(SCENARIOS) + ["custom"],
+                        help="Scale points to run; 'custom' uses the options below.")
+    parser.add_argument("--accounts", type=int, default=10, help="Accounts of the custom scenario.")
+    parser.add_argument("--regions", type=int, default=2, help="Regions per account of the custom scenario.")
+    parser.add_argument("--types", type=int, help="Resource types of the custom scenario (default: all mapped).")
+    parser.add_argument("--per-type", type=int, default=10, help="Resources per type, account and region (custom).")
+    parser.add_argument("--compliance", type=float, default=0.7, help="Share of compliant resources (custom).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the best one is kept.")
+    parser.add_argument("--seed", type=int, default=0, help="Inventory random seed.")
+    parser.add_argument("--state-dir", default="state", help="Directory holding the cached c7n schema.")
+    parser.add_argument("--json", dest="json_output", help="Write the results to this file.")
+    parser.add_argument("--baseline", default="state/benchmark_baseline.json", help="Baseline to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Tolerated slowdown per stage.")
+    parser.add_argument("--memory-threshold", type=float, default=0.10, help="Tolerated peak RSS and output size growth.")
+    args = parser.parse_args()
+
+    selected = {}
+    for scenario_name in args.scenario:
+        if scenario_name == "custom":
+            selected["custom"] = {
+                "accounts": args.accounts, "regions": min(args.regions, len(REGIONS)), "types": args.types,
+                "per_type": args.per_type, "compliance": args.compliance,
+            }
+        else:
+            selected[scenario_name] = SCENARIOS[scenario_name]
+
+    report = benchmark(selected, args.repeat, args.seed, args.state_dir)
+    if args.json_output:
+        with open(args.json_output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    for scenario_name, scenario_result in report["scenarios"].items():
+        print(f"{scenario_name}: {scenario_result['resources']} resources, {scenario_result['policies']} policies, "
+              f"peak RSS {scenario_result['peak_rss_mb']:.0f} MiB")
+        print(f"  {'stage':<12}{'seconds':>10}{'items/s':>14}{'RSS MiB':>10}{'bytes':>12}")
+        for stage_name, stage_metrics in scenario_result["stages"].items():
+            rate = stage_metrics["per_second"]
+            print(f"  {stage_name:<12}{stage_metrics['seconds']:>10.3f}{'-' if rate is None else f'{rate:.0f}':>14}"
+                  f"{stage_metrics['peak_rss_mb']:>10.0f}{stage_metrics.get('bytes', ''):>12}")
+
+    exit_code = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            stored = json.load(file)
+        if stored.get("environment") != report["environment"]:
+            print(f"Warning: {args.baseline} was recorded on a different environment: {stored.get('environment')}")
+        found = find_regressions(report, stored, args.threshold, args.memory_threshold)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        exit_code = 1 if found else 0
+    if args.save_baseline:
+        stored_scenarios = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                stored_scenarios = json.load(file).get("scenarios", {})
+        report["scenarios"] = dict(stored_scenarios, **report["scenarios"])
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    sys.exit(exit_code)
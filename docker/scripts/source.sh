@@ -296,6 +296,26 @@ function verbose_print() {
     fi
 }
 
+# DESC: Run a command and append its wall time to the stage timings file
+# ARGS: $1 (required): Stage name
+#       $@ (required): Command to run, after the stage name
+# OUTS: Appends "stage<TAB>start<TAB>end<TAB>exit code" to $STAGE_TIMINGS_FILE
+#       (defaults to state/stages.tsv)
+# RETS: The exit code of the command
+function timed_stage() {
+    local stage="$1"
+    local timings_file="${STAGE_TIMINGS_FILE:-state/stages.tsv}"
+    local start end status=0
+    shift
+
+    start=$(date +%s.%N)
+    "$@" || status=$?
+    end=$(date +%s.%N)
+    mkdir -p "$(dirname "$timings_file")"
+    printf '%s\t%s\t%s\t%s\n' "$stage" "$start" "$end" "$status" >> "$timings_file"
+    return "$status"
+}
+
 # DESC: Combines two path variables and removes any duplicates
 # ARGS: $1 (required): Path(s) to join with the second argument
 #       $2 (optional): Path(s) to join with the first argument
@@ -0,0 +1,251 @@
+import os
+import json
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+import yaml
+
+from policy_generator import resources_tags
+
+# Tagging API resource keys ("service:type", see arn_resource_key) covered by each c7n
+# resource type. Types missing here are not reported by the tagging API, or cannot be
+# told apart by ARN, and are always run.
+TAGGING_RESOURCE_TYPES = {
+    "ec2": ("ec2:instance",),
+    "ec2-spot-fleet-request": ("ec2:spot-fleet-request",),
+    "ec2-capacity-reservation": ("ec2:capacity-reservation",),
+    "ami": ("ec2:image",),
+    "lambda": ("lambda:function",),
+    "elasticbeanstalk-environment": ("elasticbeanstalk:environment",),
+    "batch-compute": ("batch:compute-environment",),
+    "workspaces": ("workspaces:workspace",),
+    "ecs": ("ecs:cluster",),
+    "ecs-task-definition": ("ecs:task-definition",),
+    "ecs-task": ("ecs:task",),
+    "ecs-service": ("ecs:service",),
+    "ecs-container-instance": ("ecs:container-instance",),
+    "eks": ("eks:cluster",),
+    "eks-nodegroup": ("eks:nodegroup",),
+    "ecr": ("ecr:repository",),
+    "ebs": ("ec2:volume",),
+    "ebs-snapshot": ("ec2:snapshot",),
+    "s3": ("s3",),
+    "efs": ("elasticfilesystem:file-system",),
+    "glacier": ("glacier:vaults",),
+    "backup-plan": ("backup:backup-plan",),
+    "backup-vault": ("backup:backup-vault",),
+    "vpc": ("ec2:vpc",),
+    "subnet": ("ec2:subnet",),
+    "security-group": ("ec2:security-group",),
+    "route-table": ("ec2:route-table",),
+    "internet-gateway": ("ec2:internet-gateway",),
+    "nat-gateway": ("ec2:natgateway",),
+    "elastic-ip": ("ec2:elastic-ip",),
+    "elb": ("elasticloadbalancing:loadbalancer",),
+    "app-elb": ("elasticloadbalancing:loadbalancer/app", "elasticloadbalancing:loadbalancer/net"),
+    "app-elb-target-group": ("elasticloadbalancing:targetgroup",),
+    "globalaccelerator": ("globalaccelerator:accelerator",),
+    "distribution": ("cloudfront:distribution",),
+    "rest-api": ("apigateway:restapis",),
+    "apigwv2": ("apigateway:apis",),
+    "firewall": ("network-firewall:firewall",),
+    "shield-protection": ("shield:protection",),
+    "network-acl": ("ec2:network-acl",),
+    "peering-connection": ("ec2:vpc-peering-connection",),
+    "vpn-gateway": ("ec2:vpn-gateway",),
+    "hostedzone": ("route53:hostedzone",),
+    "prefix-list": ("ec2:prefix-list",),
+    "directconnect": ("directconnect:dxcon",),
+    "rds": ("rds:db",),
+    "rds-cluster": ("rds:cluster",),
+    "rds-cluster-snapshot": ("rds:cluster-snapshot",),
+    "rds-snapshot": ("rds:snapshot",),
+    "dynamodb-table": ("dynamodb:table",),
+    "redshift": ("redshift:cluster",),
+    "cache-cluster": ("elasticache:cluster",),
+    "acm-certificate": ("acm:certificate",),
+    "config-rule": ("config:config-rule",),
+    "cloudtrail": ("cloudtrail:trail",),
+    "kms-key": ("kms:key",),
+    "ses-email-identity": ("ses:identity",),
+    "identity-pool": ("cognito-identity:identitypool",),
+    "user-pool": ("cognito-idp:userpool",),
+    "cfn": ("cloudformation:stack",),
+    "ssm-document": ("ssm:document",),
+    "log-group": ("logs:log-group",),
+    "alarm": ("cloudwatch:alarm",),
+    "catalog-product": ("catalog:product",),
+    "sagemaker-notebook": ("sagemaker:notebook-instance",),
+    "sagemaker-model": ("sagemaker:model",),
+    "codebuild": ("codebuild:project",),
+    "codedeploy-app": ("codedeploy:application",),
+    "athena-work-group": ("athena:workgroup",),
+    "glue-crawler": ("glue:crawler",),
+    "glue-database": ("glue:database",),
+    "glue-job": ("glue:job",),
+    "kinesis": ("kinesis:stream",),
+    "sns": ("sns",),
+    "sqs": ("sqs",),
+    "firehose": ("firehose:deliverystream",),
+    "step-machine": ("states:stateMachine",),
+}
+
+# Services whose ARNs carry no resource type segment.
+UNTYPED_ARN_SERVICES = {"s3", "sns", "sqs"}
+
+CUSTODIAN_TAG = "custodian_cleanup"
+
+
+def arn_resource_key(arn: str) -> str:
+    """
+    Reduce an ARN to the "service:type" key used by TAGGING_RESOURCE_TYPES.
+
+    Args:
+        arn (str): Resource ARN.
+
+    Returns:
+        str: e.g. "ec2:instance", "elasticloadbalancing:loadbalancer/app" or "s3".
+    """
+    parts = arn.split(":", 5)
+    service, resource = parts[2], parts[5] if len(parts) > 5 else ""
+    if service in UNTYPED_ARN_SERVICES:
+        return service
+    segments = resource.lstrip("/").replace(":", "/").split("/")
+    if service == "elasticloadbalancing" and segments[0] == "loadbalancer" and segments[1:2] in (["app"], ["net"]):
+        return f"{service}:loadbalancer/{segments[1]}"
+    return f"{service}:{segments[0]}"
+
+
+def scan_tags(client: Any) -> Dict[str, Dict[str, str]]:
+    """
+    Build an ARN to tags index with a single paginated GetResources sweep.
+
+    Only resources that have, or once had, tags are returned by the tagging API.
+
+    Args:
+        client (Any): A boto3 resourcegroupstaggingapi client, or a stand-in exposing
+            the same get_paginator("get_resources") interface.
+
+    Returns:
+        Dict[str, Dict[str, str]]: Mapping of ARN to its tags.
+    """
+    index = {}
+    for page in client.get_paginator("get_resources").paginate(ResourcesPerPage=100):
+        for mapping in page.get("ResourceTagMappingList", []):
+            index[mapping["ResourceARN"]] = {tag["Key"]: tag["Value"] for tag in mapping.get("Tags", [])}
+    return index
+
+
+def evaluate_index(
+    index: Dict[str, Dict[str, str]],
+    resources_tags_dict: Dict[str, Dict[str, List[str]]],
+) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Work out which resource types need their policies run for one account and region.
+
+    A resource needs attention when it misses a required tag (mark/delete policies) or
+    carries the custodian cleanup tag (unmark/delete policies).
+
+    Args:
+        index (Dict[str, Dict[str, str]]): ARN to tags index from scan_tags.
+        resources_tags_dict (Dict[str, Dict[str, List[str]]]): Resource configuration,
+            as accepted by generate_policies.
+
+    Returns:
+        Tuple[Dict[str, List[str]], List[str]]: ARNs needing attention per resource
+        type, and the resource types the tagging API cannot vouch for.
+    """
+    by_key: Dict[str, List[str]] = {}
+    for arn in index:
+        by_key.setdefault(arn_resource_key(arn), []).append(arn)
+
+    flagged = {}
+    unmapped = []
+    for resource, config in resources_tags_dict.items():
+        if resource not in TAGGING_RESOURCE_TYPES:
+            unmapped.append(resource)
+            continue
+        required = config.get("tags", [])
+        arns = [
+            arn
+            for key in TAGGING_RESOURCE_TYPES[resource]
+            for arn in by_key.get(key, [])
+            if CUSTODIAN_TAG in index[arn] or any(tag not in index[arn] for tag in required)
+        ]
+        if arns:
+            flagged[resource] = sorted(arns)
+    return flagged, unmapped
+
+
+def account_session(account: Dict[str, Any], region: str) -> Any:
+    """
+    Create a boto3 session for a c7n-org account entry, assuming its role if set.
+    """
+    import boto3
+
+    session = boto3.Session(region_name=region)
+    role = account.get("role")
+    if not role:
+        return session
+    credentials = session.client("sts").assume_role(RoleArn=role, RoleSessionName="c7n-prescan")["Credentials"]
+    return boto3.Session(
+        aws_access_key_id=credentials["AccessKeyId"],
+        aws_secret_access_key=credentials["SecretAccessKey"],
+        aws_session_token=credentials["SessionToken"],
+        region_name=region,
+    )
+
+
+def prescan(
+    accounts: List[Dict[str, Any]],
+    resources_tags_dict: Dict[str, Dict[str, List[str]]],
+    default_region: str = "us-east-1",
+    client_factory: Optional[Any] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Pre-scan every account and region of a c7n-org accounts list.
+
+    Args:
+        accounts (List[Dict[str, Any]]): The "accounts" entries of a c7n-org config.
+        resources_tags_dict (Dict[str, Dict[str, List[str]]]): Resource configuration.
+        default_region (str): Region used for accounts that do not list any.
+        client_factory (Optional[Any]): Callable (account, region) returning a tagging
+            client. Defaults to a boto3 client for the account's role.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Per "account/region", the resource types to "run"
+        and the "noncompliant" ARNs per resource type.
+    """
+    if client_factory is None:
+        def client_factory(account: Dict[str, Any], region: str) -> Any:
+            return account_session(account, region).client("resourcegroupstaggingapi")
+
+    results = {}
+    for account in accounts:
+        for region in account.get("regions") or [default_region]:
+            index = scan_tags(client_factory(account, region))
+            flagged, unmapped = evaluate_index(index, resources_tags_dict)
+            results[f"{account['name']}/{region}"] = {
+                "run": sorted(set(flagged) | set(unmapped)),
+                "noncompliant": flagged,
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-scan accounts with the tagging API to skip compliant resource types.")
+    parser.add_argument("--config", default="accounts.yml", help="c7n-org accounts file.")
+    parser.add_argument("--output", default="state/prescan.json", help="Pre-scan result file.")
+    args = parser.parse_args()
+
+    with open(args.config) as file:
+        accounts_list = (yaml.safe_load(file) or {}).get("accounts", [])
+    result = prescan(accounts_list, resources_tags, os.getenv("AWS_REGION", "us-east-1"))
+    output_directory = os.path.dirname(args.output)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(result, file, indent=2, sort_keys=True)
+    total = len(resources_tags) * len(result)
+    selected = sum(len(entry["run"]) for entry in result.values())
+    print(f"{selected} of {total} (account/region, resource type) pairs need a run.")
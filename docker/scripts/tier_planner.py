@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import argparse
+from typing import List, Dict, Any, Optional
+
+# Scan tiers, most frequent first, with the interval between two scans in seconds.
+TIERS = {
+    "hourly": 3600,
+    "daily": 86400,
+    "weekly": 604800,
+}
+DEFAULT_TIER = "hourly"
+
+# A tier is due slightly before its interval elapses, so wake-up jitter does not
+# push it to the next wake-up.
+DUE_TOLERANCE = 0.1
+
+# Observations kept per resource type.
+MAX_OBSERVATIONS = 200
+
+
+def _read_json(path: str, default: Any) -> Any:
+    if not os.path.exists(path):
+        return default
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write_json(path: str, data: Any) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def record_observations(
+    history: Dict[str, List[Dict[str, Any]]],
+    run_report: Dict[str, Any],
+    now: Optional[float] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Append one observation per resource type covered by a run to the history.
+
+    An observation counts the compliance changes ("findings") the run saw for the type,
+    and the scan cost of its policies summed over accounts and regions. For types with
+    a delete action, the mark policy skips marked resources, so every resource matched
+    by the mark, unmark and delete policies is a change. Notify-only types match their
+    standing violations on every run, so their findings are the change in that count.
+
+    Only policies executed by the run are observed: output left over from earlier runs
+    (other tiers, unchanged shards) would count old matches again, or record scans that
+    never happened. Reports limited to a run start (run_metrics.py --since) carry it
+    as "started", and runs that started before it are skipped.
+
+    Args:
+        history (Dict[str, List[Dict[str, Any]]]): Observations per resource type.
+        run_report (Dict[str, Any]): Report written by run_metrics.py.
+        now (Optional[float]): Observation time. Defaults to the report's generation time.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: The updated history.
+    """
+    now = now or run_report.get("generated") or time.time()
+    started = run_report.get("started")
+    observed: Dict[str, Dict[str, Any]] = {}
+    for run in run_report.get("runs", []):
+        if started is not None and (run.get("start") or 0) < started:
+            continue
+        entry = observed.setdefault(run["resource"], {
+            "time": now, "findings": 0, "violations": 0, "cost": 0.0, "api_calls": 0, "notify_only": True,
+        })
+        if run["policy"].endswith("-mark"):
+            entry["violations"] += run["resource_count"]
+        else:
+            entry["notify_only"] = False
+        entry["findings"] += run["resource_count"]
+        entry["cost"] += run["duration"]
+        entry["api_calls"] += run["api_calls"]
+    for resource, entry in observed.items():
+        previous = history.get(resource, [])
+        if previous and previous[-1]["time"] >= now:
+            # The report was already recorded, e.g. when the metrics export failed.
+            continue
+        if entry.pop("notify_only"):
+            entry["findings"] = abs(entry["violations"] - previous[-1]["violations"]) if previous else 0
+        history[resource] = (previous + [entry])[-MAX_OBSERVATIONS:]
+    return history
+
+
+def classify(
+    observations: List[Dict[str, Any]],
+    hourly_rate: float = 2.0,
+    reference_cost: float = 60.0,
+    min_span: float = TIERS["weekly"],
+) -> Dict[str, Any]:
+    """
+    Pick the scan tier of a resource type from its observations.
+
+    The findings rate (per day) measures how often the type changes in ways the
+    policies act on. A type earns the hourly tier when the rate reaches hourly_rate,
+    scaled up by its scan cost relative to reference_cost so that expensive scans need
+    proportionally more churn. A type with no finding over at least min_span seconds
+    of history is weekly; everything else is daily. Types with too little history
+    stay in the default (hourly) tier so that coverage is never lost.
+
+    Args:
+        observations (List[Dict[str, Any]]): Observations of one resource type.
+        hourly_rate (float): Findings per day needed for the hourly tier at reference cost.
+        reference_cost (float): Scan cost in seconds at which hourly_rate applies unscaled.
+        min_span (float): History needed before a type can be moved to a slower tier.
+
+    Returns:
+        Dict[str, Any]: "tier" and the statistics that decided it.
+    """
+    if len(observations) < 2:
+        return {"tier": DEFAULT_TIER, "reason": "insufficient history"}
+    span = observations[-1]["time"] - observations[0]["time"]
+    findings = sum(observation["findings"] for observation in observations)
+    cost = sum(observation["cost"] for observation in observations) / len(observations)
+    rate = findings / max(span / TIERS["daily"], 1 / 24)
+    threshold = hourly_rate * max(1.0, cost / reference_cost)
+    stats = {"findings_per_day": round(rate, 3), "cost": round(cost, 3), "span_days": round(span / TIERS["daily"], 2)}
+
+    if span < min_span:
+        return {"tier": DEFAULT_TIER, "reason": "insufficient history", **stats}
+    if rate >= threshold:
+        return {"tier": "hourly", "reason": f"findings rate >= {threshold:g}/day", **stats}
+    if findings == 0:
+        return {"tier": "weekly", "reason": "no findings", **stats}
+    return {"tier": "daily", "reason": f"findings rate < {threshold:g}/day", **stats}
+
+
+def plan_tiers(history: Dict[str, List[Dict[str, Any]]], **thresholds: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Classify every resource type of the history.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Output of classify per resource type.
+    """
+    return {resource: classify(observations, **thresholds) for resource, observations in sorted(history.items())}
+
+
+def due_tiers(schedule: Dict[str, float], now: Optional[float] = None, full_sweep: bool = False) -> List[str]:
+    """
+    Return the tiers due at this wake-up.
+
+    Args:
+        schedule (Dict[str, float]): Last completed run time of each tier.
+        now (Optional[float]): Current time.
+        full_sweep (bool): Run every tier regardless of the schedule.
+
+    Returns:
+        List[str]: Due tiers, most frequent first.
+    """
+    now = now or time.time()
+    return [
+        tier for tier, interval in TIERS.items()
+        if full_sweep or now - schedule.get(tier, 0) >= interval * (1 - DUE_TOLERANCE)
+    ]
+
+
+def tier_of(resource: str, tiers: Dict[str, str]) -> str:
+    """
+    Return the tier of a resource type, defaulting new types to the most frequent tier.
+    """
+    return tiers.get(resource, DEFAULT_TIER)
+
+
+def update_plan(state_dir: str, run_report: Dict[str, Any], **thresholds: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Record a run report in the tier history and rewrite the tier assignments.
+
+    Args:
+        state_dir (str): Directory of tier_history.json and tiers.json.
+        run_report (Dict[str, Any]): Report written by run_metrics.py.
+        thresholds (float): Passed to classify.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Output of plan_tiers.
+    """
+    history_path = os.path.join(state_dir, "tier_history.json")
+    history = record_observations(_read_json(history_path, {}), run_report)
+    plan = plan_tiers(history, **thresholds)
+    _write_json(history_path, history)
+    _write_json(os.path.join(state_dir, "tiers.json"), {resource: entry["tier"] for resource, entry in plan.items()})
+    return plan
+
+
+def mark_done(state_dir: str, tiers: List[str]) -> None:
+    """
+    Record the tiers as run now in tier_schedule.json.
+    """
+    schedule_path = os.path.join(state_dir, "tier_schedule.json")
+    schedule = _read_json(schedule_path, {})
+    schedule.update({tier: time.time() for tier in tiers})
+    _write_json(schedule_path, schedule)
+
+
+def read_schedule(state_dir: str) -> Dict[str, float]:
+    """
+    Return the last run time of each tier.
+    """
+    return _read_json(os.path.join(state_dir, "tier_schedule.json"), {})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan and schedule churn-aware scan tiers.")
+    parser.add_argument("--state-dir", default="state", help="Directory of the tier history, plan and schedule.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser("plan", help="Record the last run and reassign resource types to tiers.")
+    plan_parser.add_argument("--run-report", default="state/run_report.json", help="Report written by run_metrics.py.")
+    plan_parser.add_argument("--hourly-rate", type=float, default=2.0, help="Findings per day needed for the hourly tier.")
+    plan_parser.add_argument("--reference-cost", type=float, default=60.0, help="Scan seconds at which --hourly-rate applies.")
+
+    due_parser = commands.add_parser("due", help="Print the policy files of the tiers due now.")
+    due_parser.add_argument("--tier-dir", default="policies/tiers", help="Directory of the tier bundles.")
+    due_parser.add_argument("--shard-dir", help="Print the shards of the due tiers' resource types instead.")
+    due_parser.add_argument(
+        "--full-sweep",
+        action="store_true",
+        default=os.getenv("C7N_FULL_SWEEP", "").lower() in ("1", "true", "yes"),
+        help="Run every tier.",
+    )
+
+    commands.add_parser("done", help="Record that the tiers selected by the last 'due' completed.")
+    args = parser.parse_args()
+
+    plan_path = os.path.join(args.state_dir, "tiers.json")
+    due_path = os.path.join(args.state_dir, "tiers_due.json")
+
+    if args.command == "plan":
+        plan = update_plan(
+            args.state_dir, _read_json(args.run_report, {}), hourly_rate=args.hourly_rate, reference_cost=args.reference_cost,
+        )
+        for tier_name in TIERS:
+            members = [resource for resource, entry in plan.items() if entry["tier"] == tier_name]
+            print(f"{tier_name}: {len(members)} resource types")
+    elif args.command == "due":
+        due = due_tiers(read_schedule(args.state_dir), full_sweep=args.full_sweep)
+        _write_json(due_path, due)
+        if args.shard_dir:
+            plan = _read_json(plan_path, {})
+            for name in sorted(os.listdir(args.shard_dir)):
+                resource, extension = os.path.splitext(name)
+                if extension in (".yml", ".json") and name != "manifest.json" and tier_of(resource, plan) in due:
+                    print(os.path.join(args.shard_dir, name))
+        else:
+            for tier_name in due:
+                for extension in (".yml", ".json"):
+                    bundle = os.path.join(args.tier_dir, tier_name + extension)
+                    if os.path.exists(bundle):
+                        print(bundle)
+    else:
+        mark_done(args.state_dir, _read_json(due_path, []))
+        if os.path.exists(due_path):
+            os.remove(due_path)
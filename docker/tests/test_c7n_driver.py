@@ -0,0 +1,158 @@
+import base64
+import json
+import logging
+import os
+import zlib
+from pathlib import Path
+
+import pytest
+import yaml
+
+import c7n_driver
+from c7n_driver import Driver, build_parser, mailer_config, render_template
+from compliance_state import Delta, build_messages, encode_mailer_message
+
+
+POLICY = {
+    "name": "ebs-tag-compliance-mark",
+    "resource": "ebs",
+    "actions": [{
+        "type": "notify",
+        "slack_template": "slack",
+        "violation_desc": "Missing required tags.",
+        "action_desc": "Tag the volume.",
+        "to": ["https://hooks.slack.com/services/T000/B000/XXXX"],
+        "transport": {"type": "sqs", "queue": "arn:aws:sqs:us-east-2:123456789012:c7n-mailer"},
+    }],
+}
+
+
+def decode(body):
+    return json.loads(zlib.decompress(base64.b64decode(body)))
+
+
+def stages(state_dir):
+    with open(state_dir / "stages.tsv") as file:
+        return [(line.split("\t")[0], line.split("\t")[3].strip()) for line in file]
+
+
+@pytest.fixture
+def driver_run(tmp_path, monkeypatch):
+    """
+    Run the driver with every step that needs AWS or c7n replaced by a no-op.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("C7N_DELTA_NOTIFY", raising=False)
+    monkeypatch.delenv("DIGEST_QUEUE_URL", raising=False)
+    (tmp_path / "config.yaml.template").write_text("region: $AWS_REGION\n")
+    monkeypatch.setattr(Driver, "startup", lambda self: 0.0)
+    monkeypatch.setattr(Driver, "load_secrets", lambda self: None)
+    monkeypatch.setattr(Driver, "generate", lambda self: [])
+    monkeypatch.setattr(Driver, "notify_deltas", lambda self: None)
+    monkeypatch.setattr(Driver, "deliver_digests", lambda self: None)
+    monkeypatch.setattr(Driver, "report", lambda self: None)
+    monkeypatch.setattr(c7n_driver, "run_org", lambda config, policy_file, output_dir: None)
+    monkeypatch.setattr(c7n_driver, "run_mailer", lambda config_path, aws, templates_dir: None)
+
+    def run(*argv):
+        args = build_parser().parse_args(["--state-dir", "state", "--config-template", "config.yaml.template", *argv])
+        Driver(args).run()
+        return stages(tmp_path / "state")
+
+    return run
+
+
+def test_render_template_substitutes_like_envsubst(tmp_path):
+    template = tmp_path / "config.yaml.template"
+    template.write_text("queue_url: ${QUEUE_URL}\nrole: $ROLE_ARN\ntoken: '$UNSET'\nargs: $1 ${2} $$\n")
+
+    render_template(str(template), str(tmp_path / "config.yaml"), {"QUEUE_URL": "https://sqs/q", "ROLE_ARN": "arn:role"})
+
+    assert (tmp_path / "config.yaml").read_text() == "queue_url: https://sqs/q\nrole: arn:role\ntoken: ''\nargs: $1 ${2} $$\n"
+
+
+@pytest.mark.parametrize("value, enabled", [("true", True), ("YES", True), ("1", True), ("false", False), ("", False)])
+def test_notify_and_sweep_flags_default_from_the_environment(monkeypatch, value, enabled):
+    monkeypatch.setenv("C7N_DELTA_NOTIFY", value)
+    monkeypatch.setenv("C7N_FULL_SWEEP", value)
+
+    args = build_parser().parse_args([])
+
+    assert args.no_notify is enabled
+    assert args.full_sweep is enabled
+
+
+def test_run_modes_are_exclusive():
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(["--changed-only", "--tiered"])
+
+
+def test_stages_run_in_pipeline_order(driver_run):
+    assert driver_run("--policy-file", "policies.yml") == [
+        ("secrets", "0"), ("config", "0"), ("policy-generator", "0"), ("c7n-org:policies.yml", "0"), ("c7n-mailer", "0"),
+    ]
+    assert open("config.yaml").read() == f"region: {os.getenv('AWS_REGION', '')}\n"
+
+
+def test_delta_notifications_run_between_c7n_org_and_the_mailer(driver_run, monkeypatch):
+    monkeypatch.setenv("C7N_DELTA_NOTIFY", "true")
+    monkeypatch.setenv("DIGEST_QUEUE_URL", "https://sqs.us-east-1.amazonaws.com/123456789012/digests")
+
+    assert [name for name, _ in driver_run("--policy-file", "policies.yml")] == [
+        "secrets", "config", "policy-generator", "c7n-org:policies.yml", "compliance-state", "digest-notifier", "c7n-mailer",
+    ]
+
+
+def test_failed_stage_is_recorded_and_stops_the_run(driver_run, monkeypatch):
+    def fail(config, policy_file, output_dir):
+        raise RuntimeError("c7n-org failed")
+
+    monkeypatch.setattr(c7n_driver, "run_org", fail)
+
+    with pytest.raises(RuntimeError):
+        driver_run("--policy-file", "policies.yml")
+    assert stages(Path("state"))[-1] == ("c7n-org:policies.yml", "1")
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    pytest.importorskip("c7n_mailer")
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "mailer.yml"
+    config_path.write_text(yaml.safe_dump({
+        "queue_url": "https://sqs.us-east-2.amazonaws.com/123456789012/c7n-mailer",
+        "role": "",
+        "region": "us-east-2",
+    }))
+    templates = tmp_path / "mailer-templates"
+    templates.mkdir()
+    (templates / "slack.j2").write_text("{{ action.violation_desc }} {{ resources | length }} {{ account }}\n")
+    return mailer_config(str(config_path), str(templates))
+
+
+def test_mailer_config_matches_the_command_line(config):
+    assert "contact_tags" in config
+    assert any(folder.endswith("msg-templates") for folder in config["templates_folders"])
+
+
+def test_message_renders_through_the_processor(config):
+    from c7n_mailer.sqs_queue_processor import MailerSqsQueueProcessor
+    from c7n_mailer.utils import get_rendered_jinja
+
+    deltas = [Delta("arn:aws:ec2:us-east-2:123456789012:volume/vol-01", "dev", "us-east-2", "ebs", "new-violation")]
+    message = decode(encode_mailer_message(build_messages(deltas, [POLICY])[0][0]))
+    processor = MailerSqsQueueProcessor(config, None, logging.getLogger("c7n_mailer"))
+
+    target = POLICY["actions"][0]["to"][0]
+    custom = get_rendered_jinja(
+        target, message, message["resources"], processor.logger, "slack_template", "slack_default",
+        processor.config["templates_folders"],
+    )
+    assert custom is not None and custom.split()[-2:] == ["1", "dev"]
+
+    message["action"].pop("slack_template")
+    default = get_rendered_jinja(
+        target, message, message["resources"], processor.logger, "slack_template", "slack_default",
+        processor.config["templates_folders"],
+    )
+    assert default is not None
@@ -0,0 +1,124 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+
+from compliance_evaluator import (
+    CUSTODIAN_TAG,
+    ResourceInventory,
+    build_matrices,
+    compile_filter,
+    evaluate,
+    policy_kind,
+    what_if,
+)
+from policy_generator import generate_policies
+from secret_provider import OFFLINE_SECRETS, SecretProvider, StaticBackend
+
+AS_OF = datetime(2026, 10, 17, tzinfo=timezone.utc)
+CONFIG = {
+    "ebs": {"tags": ["AdminEmail", "OwningOrg"], "delete_action": "delete"},
+    "s3": {"tags": ["AdminEmail"]},
+}
+ROWS = [
+    ("ebs", "dev", {"AdminEmail": "owner@example.com", "OwningOrg": "platform"}),
+    ("ebs", "dev", {"AdminEmail": "owner@example.com"}),
+    ("ebs", "dev", {"AdminEmail": "", "OwningOrg": "platform"}),
+    ("ebs", "dev", {CUSTODIAN_TAG: "Resource does not meet policy: delete@2026/10/15"}),
+    ("ebs", "prod", {CUSTODIAN_TAG: "Resource does not meet policy: delete@2026/10/30"}),
+    ("ebs", "prod", {CUSTODIAN_TAG: "Resource does not meet policy: stop@2026/10/01"}),
+    ("ebs", "prod", {"AdminEmail": "owner@example.com", "OwningOrg": "platform",
+                     CUSTODIAN_TAG: "Resource does not meet policy: delete@2026/10/15"}),
+    ("s3", "prod", {}),
+    ("s3", "prod", {"AdminEmail": "owner@example.com", CUSTODIAN_TAG: "Resource does not meet policy: delete@2026/10/15"}),
+]
+
+
+def c7n_match(spec, tags):
+    """
+    Reference evaluation of one filter on one resource, following c7n's ValueFilter
+    (tag lookups, "absent", "not-null"), TagActionFilter and boolean filters.
+    """
+    if spec.get("type") == "marked-for-op":
+        value = tags.get(spec.get("tag", CUSTODIAN_TAG))
+        if not value:
+            return False
+        try:
+            _, target = value.rsplit(":", 1)
+            action, action_date = target.strip().split("@", 1)
+        except ValueError:
+            return False
+        if action != spec["op"]:
+            return False
+        return datetime.strptime(action_date, "%Y/%m/%d").replace(tzinfo=timezone.utc) <= AS_OF
+    (key, value), = spec.items()
+    if key == "and":
+        return all(c7n_match(child, tags) for child in value)
+    if key == "or":
+        return any(c7n_match(child, tags) for child in value)
+    if key == "not":
+        return not all(c7n_match(child, tags) for child in value)
+    resource_value = tags.get(key[len("tag:"):])
+    if value == "absent":
+        return resource_value is None
+    if value == "not-null":
+        return bool(resource_value)
+    raise ValueError(spec)
+
+
+def c7n_counts(policies):
+    counts = Counter()
+    for policy in policies:
+        for resource_type, account, tags in ROWS:
+            if resource_type == policy["resource"] and all(c7n_match(spec, tags) for spec in policy.get("filters", [])):
+                counts[(resource_type, account, policy_kind(policy))] += 1
+    return counts
+
+
+@pytest.fixture
+def matrices():
+    inventory = ResourceInventory()
+    for row in ROWS:
+        inventory.add(*row)
+    return build_matrices(inventory, AS_OF)
+
+
+def test_generated_policies_match_c7n_counts(matrices):
+    policies = generate_policies(CONFIG, secrets=SecretProvider(StaticBackend(OFFLINE_SECRETS)), notify=False)["policies"]
+
+    counts = evaluate(policies, matrices)
+
+    assert counts == c7n_counts(policies)
+    assert counts[("ebs", "dev", "delete")] == 1
+
+
+@pytest.mark.parametrize("filters", [
+    [{"not": [{"tag:AdminEmail": "absent"}]}],
+    [{"not": [{"tag:AdminEmail": "not-null"}, {"tag:OwningOrg": "not-null"}]}],
+    [{"not": [{"type": "marked-for-op", "tag": CUSTODIAN_TAG, "op": "delete"}]}, {"tag:OwningOrg": "absent"}],
+    [{"or": [{"tag:AdminEmail": "absent"}, {"not": [{"or": [{"tag:OwningOrg": "absent"}]}]}]}],
+    [],
+], ids=["not-absent", "not-and", "not-marked", "nested", "no-filters"])
+def test_negated_and_absent_filters_match_c7n_counts(matrices, filters):
+    policies = [{"name": f"{resource}-notify", "resource": resource, "filters": filters} for resource in CONFIG]
+
+    assert evaluate(policies, matrices) == c7n_counts(policies)
+
+
+def test_unsupported_filter_is_rejected():
+    with pytest.raises(ValueError):
+        compile_filter({"type": "value", "key": "State", "value": "available"})
+
+
+def test_what_if_reports_the_change_of_a_new_required_tag():
+    inventory = ResourceInventory()
+    for row in ROWS:
+        inventory.add(*row)
+    proposed = dict(CONFIG, ebs={"tags": ["AdminEmail", "OwningOrg", "Environment"], "delete_action": "delete"})
+
+    report = what_if(CONFIG, proposed, inventory, AS_OF)
+
+    assert report["by_type"]["ebs"]["mark"] == {"current": 1, "proposed": 3, "delta": 2}
+    assert report["by_type"]["ebs"]["unmark"] == {"current": 1, "proposed": 0, "delta": -1}
+    assert report["by_type"]["s3"]["notify"]["delta"] == 0
+    assert report["by_account"]["dev"]["mark"]["delta"] == 2
@@ -0,0 +1,209 @@
+import base64
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+
+from compliance_state import (
+    MAILER_BATCH_SIZE,
+    MAX_MESSAGE_BYTES,
+    ComplianceStore,
+    Delta,
+    build_messages,
+    resource_key,
+    send_messages,
+)
+from local_aws import LocalQueue
+
+MARK_POLICY = {
+    "name": "ebs-tag-compliance-mark",
+    "resource": "ebs",
+    "actions": [{"type": "notify", "slack_template": "slack", "to": ["https://hooks.slack.com/services/T000/B000/XXXX"]}],
+}
+
+
+def write_run(output_dir, account, region, policy, resource_type, resources, actions=(), started=None):
+    """
+    Lay out one policy's c7n-org output: <account>/<region>/<policy>/{metadata,resources}.json.
+    """
+    policy_dir = os.path.join(output_dir, account, region, policy)
+    os.makedirs(policy_dir, exist_ok=True)
+    metadata = {"policy": {"name": policy, "resource": resource_type, "actions": list(actions)}}
+    if started:
+        metadata["execution"] = {"start": started.timestamp()}
+    with open(os.path.join(policy_dir, "metadata.json"), "w") as file:
+        json.dump(metadata, file)
+    with open(os.path.join(policy_dir, "resources.json"), "w") as file:
+        json.dump(resources, file)
+
+
+def volume_deltas(count, padding=0):
+    """
+    Deltas of one ebs group; padding adds that many incompressible characters per resource.
+    """
+    deltas = []
+    for index in range(count):
+        volume_id = f"vol-{index:017x}"
+        noise = "".join(hashlib.sha256(f"{volume_id}{chunk}".encode()).hexdigest() for chunk in range(padding // 64))
+        deltas.append(Delta(
+            f"arn:aws:ec2:us-east-1:123456789012:volume/{volume_id}", "dev", "us-east-1", "ebs", "new-violation",
+            resource={"VolumeId": volume_id, "Description": noise},
+        ))
+    return deltas
+
+
+class FailingQueue(LocalQueue):
+    """
+    LocalQueue whose every other SendMessage fails.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.calls += 1
+        if self.calls % 2 == 0:
+            raise RuntimeError("ServiceUnavailable")
+        return super().send_message(QueueUrl, MessageBody, **kwargs)
+
+
+def subnet(subnet_id, vpc_id="vpc-0a1b2c3d4e5f60718"):
+    return {"SubnetId": subnet_id, "VpcId": vpc_id, "Tags": [{"Key": "AdminEmail", "Value": "owner@example.com"}]}
+
+
+@pytest.fixture
+def store():
+    compliance_store = ComplianceStore(":memory:")
+    yield compliance_store
+    compliance_store.close()
+
+
+def test_subnets_of_one_vpc_get_their_own_key(tmp_path, store):
+    output_dir = str(tmp_path)
+    write_run(output_dir, "dev", "us-east-1", "subnet-notify", "subnet", [subnet("subnet-01"), subnet("subnet-02")])
+
+    deltas = store.ingest_run(output_dir)
+
+    assert sorted(delta.arn for delta in deltas) == [
+        "c7n:subnet:us-east-1:dev:subnet-01",
+        "c7n:subnet:us-east-1:dev:subnet-02",
+    ]
+    assert store.summary() == [("dev", "subnet", "noncompliant", 2)]
+
+
+def test_key_prefers_the_type_identifier_over_other_ids():
+    route_table = {"RouteTableId": "rtb-01", "VpcId": "vpc-01", "c7n:arn": "arn:aws:ec2:us-east-1:1:vpc/vpc-01"}
+    assert resource_key("route-table", "dev", "us-east-1", route_table) == "c7n:route-table:us-east-1:dev:rtb-01"
+    assert resource_key("s3", "dev", "us-east-1", {"Name": "bucket"}) == "arn:aws:s3:::bucket"
+    assert resource_key("sqs", "dev", "us-east-1", {"QueueArn": "arn:aws:sqs:us-east-1:1:q", "Name": "q"}) == (
+        "arn:aws:sqs:us-east-1:1:q"
+    )
+
+
+def test_resolution_uses_the_run_start_not_the_date(tmp_path, store):
+    output_dir = str(tmp_path)
+    morning = datetime(2026, 10, 1, 8, tzinfo=timezone.utc)
+    write_run(output_dir, "dev", "us-east-1", "subnet-notify", "subnet", [subnet("subnet-01")], started=morning)
+    assert [delta.event for delta in store.ingest_run(output_dir, morning)] == ["new-violation"]
+
+    # Fixed before the next hourly run, on the same day.
+    an_hour_later = datetime(2026, 10, 1, 9, tzinfo=timezone.utc)
+    write_run(output_dir, "dev", "us-east-1", "subnet-notify", "subnet", [], started=an_hour_later)
+    assert [delta.event for delta in store.ingest_run(output_dir, an_hour_later)] == ["resolved"]
+
+
+def test_resources_recorded_after_the_run_started_are_not_resolved(tmp_path, store):
+    output_dir = str(tmp_path)
+    started = datetime(2026, 10, 1, 8, tzinfo=timezone.utc)
+    # Seen by the event worker while the sweep was already listing resources.
+    store.record_evaluations(
+        {"c7n:subnet:us-east-1:dev:subnet-09": ("dev", "us-east-1", "subnet", "noncompliant", None, {}, None, None)},
+        datetime(2026, 10, 1, 8, 30, tzinfo=timezone.utc),
+    )
+    write_run(output_dir, "dev", "us-east-1", "subnet-notify", "subnet", [], started=started)
+
+    assert store.ingest_run(output_dir, datetime(2026, 10, 1, 9, tzinfo=timezone.utc)) == []
+
+
+def test_deltas_stay_pending_until_notified(tmp_path):
+    path = str(tmp_path / "compliance.db")
+    output_dir = str(tmp_path / "output")
+    write_run(output_dir, "dev", "us-east-1", "subnet-notify", "subnet", [subnet("subnet-01"), subnet("subnet-02")])
+    store = ComplianceStore(path)
+    store.ingest_run(output_dir)
+    # Delivery failed: nothing is recorded as notified, and the store is reopened by the next run.
+    store.close()
+
+    store = ComplianceStore(path)
+    assert store.ingest_run(output_dir) == []
+    pending = store.pending_deltas("sweep")
+    assert sorted(delta.arn for delta in pending) == [
+        "c7n:subnet:us-east-1:dev:subnet-01",
+        "c7n:subnet:us-east-1:dev:subnet-02",
+    ]
+    assert pending[0].owner == "owner@example.com"
+    assert pending[0].resource["VpcId"] == "vpc-0a1b2c3d4e5f60718"
+    assert store.pending_deltas("events") == []
+
+    store.record_notified(pending)
+    assert store.pending_deltas() == []
+    store.close()
+
+
+def test_output_of_policies_not_run_is_not_ingested(tmp_path, store):
+    output_dir = str(tmp_path)
+    first_run = datetime(2026, 10, 1, 8, tzinfo=timezone.utc)
+    write_run(output_dir, "dev", "us-east-1", "subnet-notify", "subnet", [subnet("subnet-01")], started=first_run)
+    store.ingest_run(output_dir, first_run, since=first_run.timestamp())
+    key = "c7n:subnet:us-east-1:dev:subnet-01"
+    # The event worker sees the subnet tagged.
+    store.record_evaluations(
+        {key: ("dev", "us-east-1", "subnet", "compliant", None, subnet("subnet-01"), "owner@example.com", None)},
+        datetime(2026, 10, 1, 9, tzinfo=timezone.utc),
+    )
+
+    # The next run only covers s3; the subnet output of the first run is still there.
+    second_run = datetime(2026, 10, 1, 10, tzinfo=timezone.utc)
+    write_run(output_dir, "dev", "us-east-1", "s3-notify", "s3", [{"Name": "c7n-reports"}], started=second_run)
+    deltas = store.ingest_run(output_dir, second_run, since=second_run.timestamp())
+
+    assert [(delta.event, delta.arn) for delta in deltas] == [("new-violation", "arn:aws:s3:::c7n-reports")]
+    assert ("dev", "subnet", "compliant", 1) in store.summary()
+
+
+@pytest.mark.parametrize("padding", [0, 2048], ids=["by-count", "by-size"])
+def test_large_group_is_sent_in_batches_within_the_sqs_limit(padding):
+    deltas = volume_deltas(3000, padding)
+    messages = build_messages(deltas, [MARK_POLICY])
+    assert len(messages) == 3000 // MAILER_BATCH_SIZE
+    assert all(len(message["resources"]) == len(batch) <= MAILER_BATCH_SIZE for message, batch in messages)
+
+    queue = LocalQueue()
+    sent = send_messages(queue, "mailer", messages)
+
+    assert len(sent) == 3000
+    bodies = [message["Body"] for message in queue.messages]
+    assert all(len(body) <= MAX_MESSAGE_BYTES for body in bodies)
+    if padding:
+        assert len(bodies) > len(messages)
+    resources = [resource for body in bodies for resource in json.loads(zlib.decompress(base64.b64decode(body)))["resources"]]
+    assert sorted(resource["VolumeId"] for resource in resources) == sorted(delta.resource["VolumeId"] for delta in deltas)
+
+
+def test_only_sent_deltas_are_recorded_as_notified(tmp_path, store):
+    output_dir = str(tmp_path)
+    write_run(output_dir, "dev", "us-east-1", "subnet-notify", "subnet", [subnet(f"subnet-{index:04}") for index in range(600)])
+    store.ingest_run(output_dir)
+    pending = store.pending_deltas("sweep")
+    policy = dict(MARK_POLICY, name="subnet-tag-compliance-mark", resource="subnet")
+
+    sent = send_messages(FailingQueue(), "mailer", build_messages(pending, [policy]))
+    store.record_notified(sent)
+
+    # Three batches of 250, 250 and 100: the second one failed and stays pending.
+    assert len(sent) == 350
+    assert len(store.pending_deltas("sweep")) == 250
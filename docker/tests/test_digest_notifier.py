@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from compliance_state import Delta
+from digest_notifier import (
+    MAX_BATCH_BYTES,
+    MAX_DIGEST_ITEMS,
+    MAX_SLACK_LINES,
+    build_digests,
+    enqueue_digests,
+    format_digest,
+)
+from local_aws import LocalQueue
+
+
+def unowned_deltas(count, padding=""):
+    return [
+        Delta(
+            arn=f"arn:aws:ec2:us-east-1:123456789012:volume/vol-{index:017x}{padding}",
+            account="dev",
+            region="us-east-1",
+            resource_type="ebs",
+            event="new-violation",
+        )
+        for index in range(count)
+    ]
+
+
+class RejectingQueue(LocalQueue):
+    """
+    LocalQueue whose SendMessageBatch rejects every entry.
+    """
+
+    def send_message_batch(self, QueueUrl, Entries):
+        return {
+            "Successful": [],
+            "Failed": [{"Id": entry["Id"], "SenderFault": False, "Code": "InternalError"} for entry in Entries],
+        }
+
+
+@pytest.mark.parametrize("padding", ["", "x" * 1000], ids=["by-count", "by-size"])
+def test_oversized_digest_is_split_into_messages_within_the_sqs_limit(padding):
+    digests = build_digests(unowned_deltas(3000, padding))
+
+    assert len(digests) > 1
+    assert {(digest["owner"], digest["org"], digest["severity"]) for digest in digests} == {("unowned", "unowned", "warning")}
+    assert [digest["part"] for digest in digests] == list(range(1, len(digests) + 1))
+    assert all(digest["parts"] == len(digests) for digest in digests)
+    assert all(len(digest["items"]) <= MAX_DIGEST_ITEMS for digest in digests)
+    assert sum(len(digest["items"]) for digest in digests) == 3000
+
+    queue = LocalQueue()
+    enqueue_digests(queue, "digests", digests)
+    messages = list(queue.messages)
+    assert len(messages) == len(digests)
+    assert all(len(message["Body"].encode()) < MAX_BATCH_BYTES for message in messages)
+    assert sum(len(json.loads(message["Body"])["items"]) for message in messages) == 3000
+
+
+def test_slack_text_is_summarized_beyond_the_line_limit():
+    digest = build_digests(unowned_deltas(MAX_SLACK_LINES + 25))[0]
+
+    attachment = format_digest(digest)["attachments"][0]
+    lines = attachment["text"].split("\n")
+    assert lines[-1] == "+25 more"
+    assert len(lines) == MAX_SLACK_LINES + 2
+    assert attachment["title"].endswith(f"({MAX_SLACK_LINES + 25})")
+
+
+def test_rejected_entries_raise():
+    with pytest.raises(RuntimeError):
+        enqueue_digests(RejectingQueue(), "digests", build_digests(unowned_deltas(3)))
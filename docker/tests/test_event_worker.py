@@ -0,0 +1,61 @@
+import pytest
+
+from compliance_state import ComplianceStore, resource_key, resource_record
+from event_worker import EventWorker, StaticTagSource, TagSource, Target
+from local_aws import LocalQueue
+from test_compliance_state import write_run
+
+ACCOUNT_ID = "123456789012"
+REGION = "us-east-1"
+TARGETS = {
+    "s3": "arn:aws:s3:::c7n-reports",
+    "subnet": "subnet-0a1b2c3d4e5f60718",
+    "lambda": f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:tag-audit:3",
+    "sqs": f"arn:aws:sqs:{REGION}:{ACCOUNT_ID}:c7n-events",
+}
+# The same resources as the sweep's c7n records them.
+SWEEP_RESOURCES = {
+    "s3": {"Name": "c7n-reports"},
+    "subnet": {"SubnetId": "subnet-0a1b2c3d4e5f60718", "VpcId": "vpc-0a1b2c3d4e5f60718"},
+    "lambda": {"FunctionName": "tag-audit", "FunctionArn": f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:tag-audit"},
+    "sqs": {"QueueArn": TARGETS["sqs"], "QueueUrl": f"https://sqs.{REGION}.amazonaws.com/{ACCOUNT_ID}/c7n-events"},
+}
+
+
+def test_tag_source_is_abstract():
+    with pytest.raises(TypeError):
+        TagSource()
+
+
+@pytest.mark.parametrize("resource_type", sorted(TARGETS))
+def test_event_and_sweep_records_share_a_key(resource_type):
+    assert resource_key(resource_type, "dev", REGION, resource_record(resource_type, TARGETS[resource_type])) == \
+        resource_key(resource_type, "dev", REGION, SWEEP_RESOURCES[resource_type])
+
+
+def test_sweep_after_worker_yields_no_deltas(tmp_path):
+    store = ComplianceStore(str(tmp_path / "compliance.db"))
+    notified = []
+
+    def notify(deltas):
+        notified.extend(deltas)
+        return deltas
+
+    worker = EventWorker(
+        LocalQueue(), "events", StaticTagSource({}), store, notify,
+        accounts={ACCOUNT_ID: {"name": "dev"}},
+    )
+    for resource_type, identifier in TARGETS.items():
+        worker.pending.add(Target(ACCOUNT_ID, REGION, resource_type, identifier), 0.0)
+    worker.flush(now=0.0, force=True)
+    worker.pool.shutdown()
+    assert sorted(delta.resource_type for delta in notified) == sorted(TARGETS)
+    assert {delta.event for delta in notified} == {"new-violation"}
+
+    output_dir = str(tmp_path / "output")
+    for resource_type, resource in SWEEP_RESOURCES.items():
+        write_run(output_dir, "dev", REGION, f"{resource_type}-tag-compliance-notify", resource_type, [resource])
+    store.ingest_run(output_dir)
+
+    assert store.pending_deltas() == []
+    store.close()
@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+import yaml
+
+from policy_generator import dump_policies, generate_policies, resources_tags
+from secret_provider import OFFLINE_SECRETS, SecretProvider, StaticBackend
+
+
+@pytest.fixture(params=[True, False], ids=["notify", "no-notify"])
+def policies(request):
+    return generate_policies(resources_tags, secrets=SecretProvider(StaticBackend(OFFLINE_SECRETS)), notify=request.param)
+
+
+def dumped(policies, output_format):
+    stream = io.StringIO()
+    dump_policies(policies, stream, output_format)
+    return stream.getvalue()
+
+
+def test_compact_yaml_loads_back_into_the_same_policies(policies):
+    text = dumped(policies, "yaml")
+
+    assert "&id" in text and "*id" in text
+    assert yaml.safe_load(text) == policies
+    # The same content as a dump without anchors.
+    assert yaml.safe_load(text) == json.loads(json.dumps(policies))
+
+
+def test_json_dump_loads_back_into_the_same_policies(policies):
+    assert json.loads(dumped(policies, "json")) == policies
+
+
+def test_unknown_format_is_rejected(policies):
+    with pytest.raises(ValueError):
+        dumped(policies, "toml")
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from policy_generator import resources_tags, write_policy_shards
+from secret_provider import OFFLINE_SECRETS, SecretProvider, StaticBackend
+
+CONFIG = {resource: resources_tags[resource] for resource in ("ec2", "s3", "sqs")}
+
+
+@pytest.fixture
+def secrets():
+    return SecretProvider(StaticBackend(OFFLINE_SECRETS))
+
+
+def read_changed(shard_dir):
+    with open(os.path.join(shard_dir, "changed.txt")) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def test_only_changed_shards_are_rewritten(tmp_path, secrets):
+    shard_dir = str(tmp_path)
+    assert len(write_policy_shards(CONFIG, shard_dir, secrets)) == 3
+    assert write_policy_shards(CONFIG, shard_dir, secrets) == []
+    assert read_changed(shard_dir) == []
+
+
+def test_failed_validation_clears_change_list(tmp_path, secrets):
+    shard_dir = str(tmp_path)
+    write_policy_shards(CONFIG, shard_dir, secrets)
+    changed_config = dict(CONFIG, ec2={"tags": ["Environment"], "delete_action": "terminate"})
+
+    def reject(paths):
+        raise ValueError("invalid")
+
+    with pytest.raises(ValueError):
+        write_policy_shards(changed_config, shard_dir, secrets, validate=reject)
+    assert read_changed(shard_dir) == []
+    # The manifest was not updated, so the next generation retries the shard.
+    assert write_policy_shards(changed_config, shard_dir, secrets) == [os.path.join(shard_dir, "ec2.yml")]
+
+
+def test_format_switch_and_dropped_types_remove_stale_shards(tmp_path, secrets):
+    shard_dir = str(tmp_path)
+    write_policy_shards(CONFIG, shard_dir, secrets)
+    reduced = {resource: CONFIG[resource] for resource in ("ec2", "s3")}
+
+    write_policy_shards(reduced, shard_dir, secrets, output_format="json")
+
+    assert sorted(os.listdir(shard_dir)) == ["changed.txt", "ec2.json", "manifest.json", "s3.json"]
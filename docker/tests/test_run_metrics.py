@@ -0,0 +1,85 @@
+import json
+import os
+
+from run_metrics import build_report, emf_lines, export_metrics, prometheus_text, read_policy_runs, read_stages
+
+RUN_STARTED = 1_760_000_000.0
+
+
+def write_policy(output_dir, account, region, policy, resource_type, started, resources=(), duration=2.5, api_stats=None):
+    policy_dir = os.path.join(output_dir, account, region, policy)
+    os.makedirs(policy_dir, exist_ok=True)
+    metadata = {
+        "policy": {"name": policy, "resource": resource_type},
+        "execution": {"start": started, "duration": duration},
+        "api-stats": api_stats or {"ec2.DescribeVolumes": 2},
+    }
+    with open(os.path.join(policy_dir, "metadata.json"), "w") as file:
+        json.dump(metadata, file)
+    with open(os.path.join(policy_dir, "resources.json"), "w") as file:
+        json.dump(list(resources), file)
+
+
+def test_output_of_earlier_runs_is_skipped(tmp_path):
+    output_dir = str(tmp_path)
+    write_policy(output_dir, "dev", "us-east-1", "ebs-mark", "ebs", RUN_STARTED + 10, [{"VolumeId": "vol-1"}])
+    # Left over from an earlier run of another tier.
+    write_policy(output_dir, "dev", "us-east-1", "s3-mark", "s3", RUN_STARTED - 3600, [{"Name": "b"}] * 5)
+
+    assert [run["policy"] for run in read_policy_runs(output_dir, since=RUN_STARTED)] == ["ebs-mark"]
+    assert sorted(run["policy"] for run in read_policy_runs(output_dir)) == ["ebs-mark", "s3-mark"]
+
+
+def test_policy_run_metrics(tmp_path):
+    output_dir = str(tmp_path)
+    write_policy(
+        output_dir, "dev", "us-east-1", "ebs-mark", "ebs", RUN_STARTED + 10, [{"VolumeId": "vol-1"}, {"VolumeId": "vol-2"}],
+        api_stats={"ec2.DescribeVolumes": 3, "ec2.CreateTags": 2},
+    )
+
+    run, = read_policy_runs(output_dir, since=RUN_STARTED)
+
+    assert run == {
+        "policy": "ebs-mark", "resource": "ebs", "account": "dev", "region": "us-east-1",
+        "start": RUN_STARTED + 10, "duration": 2.5, "api_calls": 5,
+        "api_stats": {"ec2.DescribeVolumes": 3, "ec2.CreateTags": 2},
+        "resource_count": 2, "resource_time": 0.0, "action_time": 0.0,
+    }
+
+
+def test_report_renderings(tmp_path):
+    output_dir = str(tmp_path / "output")
+    write_policy(output_dir, "dev", "us-east-1", "ebs-mark", "ebs", RUN_STARTED + 10, [{"VolumeId": "vol-1"}])
+    write_policy(output_dir, "prod", "us-east-1", "ebs-mark", "ebs", RUN_STARTED + 20, duration=7.5)
+    write_policy(output_dir, "prod", "us-east-1", "s3-mark", "s3", RUN_STARTED - 3600, duration=100.0)
+    stages_path = tmp_path / "stages.tsv"
+    stages_path.write_text(f"c7n-org\t{RUN_STARTED}\t{RUN_STARTED + 60}\t0\n")
+
+    report = export_metrics(
+        output_dir, str(stages_path), str(tmp_path / "report.json"), str(tmp_path / "c7n.prom"), None, since=RUN_STARTED,
+    )
+
+    assert report["started"] == RUN_STARTED
+    assert report["policies"] == {"ebs-mark": {
+        "resource": "ebs", "duration": 10.0, "api_calls": 4, "resource_count": 1, "resource_time": 0.0, "action_time": 0.0,
+    }}
+    assert report["slowest_accounts"] == ["prod", "dev"]
+    assert json.loads((tmp_path / "report.json").read_text())["policies"] == report["policies"]
+    prometheus = (tmp_path / "c7n.prom").read_text()
+    assert 'c7n_policy_duration_seconds{policy="ebs-mark",account="prod",region="us-east-1"} 7.5' in prometheus
+    assert "s3-mark" not in prometheus
+    assert 'c7n_stage_duration_seconds{stage="c7n-org"} 60.0' in prometheus
+    assert len(emf_lines(report)) == 3
+
+
+def test_stage_timings(tmp_path):
+    stages_path = tmp_path / "stages.tsv"
+    stages_path.write_text("secrets\t10.0\t10.5\t0\nc7n-org\t10.5\t70.5\t1\n")
+
+    assert read_stages(str(stages_path)) == [
+        {"stage": "secrets", "start": 10.0, "duration": 0.5, "exit_code": 0},
+        {"stage": "c7n-org", "start": 10.5, "duration": 60.0, "exit_code": 1},
+    ]
+    assert read_stages(str(tmp_path / "missing.tsv")) == []
+    assert build_report([], [])["runs"] == []
+    assert prometheus_text(build_report([], [])).startswith("# HELP")
@@ -0,0 +1,57 @@
+import os
+
+from run_scheduler import Checkpoint, RunScheduler, WorkUnit
+
+# Fails for the "bad" account only.
+RUNNER = 'sh -c "test {account} != bad"'
+
+UNITS = [
+    WorkUnit(account=account, region="us-east-1", shard=f"policies/shards/{resource}.yml")
+    for account in ("good", "other", "bad")
+    for resource in ("s3", "sqs")
+]
+
+
+def schedule(state_dir, run_id=None):
+    checkpoint = Checkpoint(os.path.join(state_dir, "checkpoint.json"), os.path.join(state_dir, "durations.json"), run_id)
+    return RunScheduler(checkpoint, runner=RUNNER, max_workers=2)
+
+
+def test_persistent_failure_does_not_freeze_later_runs(tmp_path):
+    for _ in range(3):
+        scheduler = schedule(str(tmp_path))
+        failed = scheduler.run(UNITS)
+        assert {unit.account for unit in failed} == {"bad"}
+        assert len(scheduler.ran) == len(UNITS)
+        assert scheduler.skipped == []
+
+
+def test_same_run_id_resumes_only_unfinished_units(tmp_path):
+    first = schedule(str(tmp_path), "nightly-1")
+    assert len(first.run(UNITS)) == 2
+
+    retry = schedule(str(tmp_path), "nightly-1")
+    assert len(retry.run(UNITS)) == 2
+    assert {unit.account for unit in retry.ran} == {"bad"}
+    assert len(retry.skipped) == 4
+
+    other = schedule(str(tmp_path), "nightly-2")
+    other.run(UNITS)
+    assert len(other.ran) == len(UNITS)
+
+
+def test_expired_checkpoint_is_not_resumed(tmp_path):
+    path = os.path.join(str(tmp_path), "checkpoint.json")
+    schedule(str(tmp_path), "nightly-1").run(UNITS)
+
+    assert Checkpoint(path, run_id="nightly-1", max_age=3600).completed
+    assert not Checkpoint(path, run_id="nightly-1", max_age=-1).completed
+
+
+def test_successful_run_records_durations_and_drops_checkpoint(tmp_path):
+    units = [unit for unit in UNITS if unit.account != "bad"]
+    scheduler = schedule(str(tmp_path))
+
+    assert scheduler.run(units) == []
+    assert not os.path.exists(os.path.join(str(tmp_path), "checkpoint.json"))
+    assert set(scheduler.checkpoint.history) == {unit.key for unit in units}
@@ -0,0 +1,58 @@
+import pytest
+
+from secret_provider import SecretBackend, SecretProvider, SsmBackend, StaticBackend
+
+
+class CountingSsmClient:
+    def __init__(self, values):
+        self.values = values
+        self.calls = []
+
+    def get_parameters(self, Names, WithDecryption):
+        self.calls.append(list(Names))
+        return {"Parameters": [{"Name": name, "Value": self.values[name]} for name in Names if name in self.values]}
+
+
+def test_backend_without_fetch_cannot_be_instantiated():
+    class Incomplete(SecretBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_ssm_backend_batches_get_parameters():
+    names = [f"/c7n/p{index}" for index in range(23)]
+    client = CountingSsmClient({name: name.upper() for name in names})
+
+    values = SsmBackend(client=client).fetch(names)
+
+    assert values == {name: name.upper() for name in names}
+    assert [len(call) for call in client.calls] == [10, 10, 3]
+
+
+def test_provider_caches_until_ttl(monkeypatch):
+    client = CountingSsmClient({"/c7n/a": "1", "/c7n/b": "2"})
+    provider = SecretProvider(SsmBackend(client=client), ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr("secret_provider.time.time", lambda: now[0])
+
+    assert provider.get_many(["/c7n/a", "/c7n/b"]) == {"/c7n/a": "1", "/c7n/b": "2"}
+    assert provider.get("/c7n/a") == "1"
+    assert len(client.calls) == 1
+
+    now[0] += 61
+    provider.get("/c7n/a")
+    assert client.calls[-1] == ["/c7n/a"]
+
+
+def test_provider_persists_cache_on_disk(tmp_path):
+    path = str(tmp_path / "secrets.json")
+    SecretProvider(StaticBackend({"/c7n/a": "1"}), cache_path=path).get("/c7n/a")
+
+    assert SecretProvider(StaticBackend({}), cache_path=path).get("/c7n/a") == "1"
+
+
+def test_unknown_secret_raises_key_error():
+    with pytest.raises(KeyError):
+        SecretProvider(StaticBackend({})).get("/c7n/missing")
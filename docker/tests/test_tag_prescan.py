@@ -0,0 +1,52 @@
+import pytest
+
+from compliance_evaluator import ARN_KEY_RESOURCE_TYPES
+from local_aws import LocalTagging
+from tag_prescan import CUSTODIAN_TAG, arn_resource_key, evaluate_index, scan_tags
+
+ACCOUNT_ID = "123456789012"
+REGION = "us-east-1"
+
+
+@pytest.mark.parametrize("arn, key, resource_type", [
+    ("arn:aws:s3:::c7n-reports", "s3", "s3"),
+    (f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:tag-audit", "lambda:function", "lambda"),
+    (f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:tag-audit:3", "lambda:function", "lambda"),
+    (f"arn:aws:ec2:{REGION}:{ACCOUNT_ID}:subnet/subnet-0a1b2c3d4e5f60718", "ec2:subnet", "subnet"),
+    (f"arn:aws:sqs:{REGION}:{ACCOUNT_ID}:c7n-events", "sqs", "sqs"),
+    (f"arn:aws:elasticloadbalancing:{REGION}:{ACCOUNT_ID}:loadbalancer/app/web/50dc6c495c0c9188",
+     "elasticloadbalancing:loadbalancer/app", "app-elb"),
+    (f"arn:aws:elasticloadbalancing:{REGION}:{ACCOUNT_ID}:loadbalancer/web", "elasticloadbalancing:loadbalancer", "elb"),
+    (f"arn:aws:iam::{ACCOUNT_ID}:role/c7n", "iam:role", None),
+])
+def test_arn_maps_to_its_resource_type(arn, key, resource_type):
+    assert arn_resource_key(arn) == key
+    assert ARN_KEY_RESOURCE_TYPES.get(key) == resource_type
+
+
+def test_scan_tags_reads_every_page():
+    resources = {
+        f"arn:aws:ec2:{REGION}:{ACCOUNT_ID}:volume/vol-{index:017x}": {"AdminEmail": f"owner{index}@example.com"}
+        for index in range(250)
+    }
+    tagging = LocalTagging(resources)
+
+    assert scan_tags(tagging) == resources
+    assert tagging.calls == 3
+
+
+def test_evaluate_index_flags_untagged_and_marked_resources():
+    tagged = "arn:aws:s3:::tagged"
+    untagged = "arn:aws:s3:::untagged"
+    marked = "arn:aws:s3:::marked"
+    index = scan_tags(LocalTagging({
+        tagged: {"AdminEmail": "owner@example.com"},
+        untagged: {},
+        marked: {"AdminEmail": "owner@example.com", CUSTODIAN_TAG: "Resource does not meet policy: delete@2026/10/20"},
+        f"arn:aws:iam::{ACCOUNT_ID}:role/c7n": {},
+    }))
+
+    flagged, unmapped = evaluate_index(index, {"s3": {"tags": ["AdminEmail"]}, "custom-type": {"tags": ["AdminEmail"]}})
+
+    assert flagged == {"s3": sorted([marked, untagged])}
+    assert unmapped == ["custom-type"]
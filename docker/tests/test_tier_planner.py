@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from tier_planner import TIERS, classify, due_tiers, plan_tiers, record_observations, tier_of, update_plan
+
+HOUR, DAY, WEEK = TIERS["hourly"], TIERS["daily"], TIERS["weekly"]
+
+
+def policy_run(policy, resource, start, resource_count, duration=10.0):
+    return {"policy": policy, "resource": resource, "start": start, "resource_count": resource_count,
+            "duration": duration, "api_calls": 4}
+
+
+def report(started, runs):
+    return {"generated": started + 600, "started": started, "runs": runs}
+
+
+def observations(findings, interval=DAY, cost=10.0):
+    return [{"time": index * interval, "findings": count, "violations": 0, "cost": cost, "api_calls": 1}
+            for index, count in enumerate(findings)]
+
+
+def test_runs_of_earlier_runs_are_not_observed():
+    stale_delete = policy_run("ebs-delete", "ebs", 0, 3)
+    history = record_observations({}, report(0, [stale_delete, policy_run("ebs-mark", "ebs", 10, 2)]))
+
+    # Later hourly runs of another tier still find the ebs output in output/.
+    for hour in range(1, 4):
+        history = record_observations(history, report(hour * HOUR, [stale_delete, policy_run("s3-mark", "s3", hour * HOUR + 10, 1)]))
+
+    assert len(history["ebs"]) == 1
+    assert history["ebs"][0]["findings"] == 5
+    assert len(history["s3"]) == 3
+
+
+def test_reports_without_a_start_observe_every_run():
+    history = record_observations({}, {"generated": 100.0, "runs": [policy_run("ebs-delete", "ebs", None, 2)]})
+
+    assert history["ebs"][0]["findings"] == 2
+
+
+def test_notify_only_findings_are_changes_in_standing_violations():
+    history = {}
+    for hour, violations in enumerate([4, 4, 6, 5]):
+        history = record_observations(history, report(hour * HOUR, [policy_run("s3-mark", "s3", hour * HOUR + 1, violations)]))
+
+    assert [entry["findings"] for entry in history["s3"]] == [0, 0, 2, 1]
+
+
+def test_a_report_is_recorded_once():
+    run_report = report(0, [policy_run("ebs-mark", "ebs", 10, 2)])
+    history = record_observations(record_observations({}, run_report), run_report)
+
+    assert len(history["ebs"]) == 1
+
+
+@pytest.mark.parametrize("entries, tier, reason", [
+    (observations([1]), "hourly", "insufficient history"),
+    (observations([5, 5, 5]), "hourly", "insufficient history"),
+    (observations([5] * 8), "hourly", "findings rate >= 2/day"),
+    (observations([0] * 8), "weekly", "no findings"),
+    (observations([1, 0, 0, 0, 0, 0, 0, 1]), "daily", "findings rate < 2/day"),
+    # The same churn on a scan ten times the reference cost is not worth hourly scans.
+    (observations([5] * 8, cost=600.0), "daily", "findings rate < 20/day"),
+])
+def test_tier_assignment(entries, tier, reason):
+    result = classify(entries)
+
+    assert (result["tier"], result["reason"]) == (tier, reason)
+
+
+def test_due_tiers():
+    now = 10 * WEEK
+    assert due_tiers({}, now) == ["hourly", "daily", "weekly"]
+    assert due_tiers({"hourly": now - HOUR, "daily": now - HOUR, "weekly": now - DAY}, now) == ["hourly"]
+    assert due_tiers({"hourly": now - 0.95 * HOUR, "daily": now - DAY, "weekly": now - WEEK}, now) == ["hourly", "daily", "weekly"]
+    assert due_tiers({"hourly": now, "daily": now, "weekly": now}, now, full_sweep=True) == ["hourly", "daily", "weekly"]
+    assert tier_of("new-type", {"ebs": "weekly"}) == "hourly"
+
+
+def test_update_plan_writes_history_and_tiers(tmp_path):
+    state_dir = str(tmp_path)
+    history = {"ebs": observations([0] * 7)}
+    (tmp_path / "tier_history.json").write_text(json.dumps(history))
+
+    plan = update_plan(state_dir, report(7 * DAY, [policy_run("ebs-delete", "ebs", 7 * DAY + 5, 0)]))
+
+    assert plan == plan_tiers(json.loads((tmp_path / "tier_history.json").read_text()))
+    assert json.loads((tmp_path / "tiers.json").read_text()) == {"ebs": "weekly"}
@@ -10,4 +10,7 @@ module "deployment" {
   environment      = var.environment
   instance_type    = var.instance_type
   instance_profile = module.c7n.instance_profile_name
+  digest_queue_url = module.c7n.digest_sqs_queue_url
+  event_queue_url  = module.c7n.events_sqs_queue_url
+  task_role_arn    = module.c7n.cloudcustodian_role_arn
 }
@@ -1,4 +1,4 @@
-# IAM Role and policies for EC2 instance
+# IAM Role and policies for the EC2 instance and the event worker task
 resource "aws_iam_role" "this" {
   name = var.instance_role_name
 
@@ -8,7 +8,7 @@ resource "aws_iam_role" "this" {
       {
         Effect = "Allow",
         Principal = {
-          Service = "ec2.amazonaws.com"
+          Service = ["ec2.amazonaws.com", "ecs-tasks.amazonaws.com"]
         },
         Action = "sts:AssumeRole"
       }
@@ -29,7 +29,7 @@ resource "aws_iam_policy" "CloudCustodianMailerAdmin" {
           "sqs:ReceiveMessage",
           "sqs:SendMessage"
         ],
-        Resource = aws_sqs_queue.this.arn
+        Resource = [aws_sqs_queue.this.arn, aws_sqs_queue.digest.arn, aws_sqs_queue.events.arn]
       }
     ]
   })
@@ -120,6 +120,70 @@ resource "aws_sqs_queue" "this" {
   })
 }
 
+# Owner digests use their own queue: c7n-mailer cannot decode them. Access is
+# granted through the CloudCustodianMailerAdmin policy of the instance role.
+resource "aws_sqs_queue" "digest" {
+  name = "appfire-digest-queue"
+}
+
+# Create and tag API calls for event_worker.py. The rule sees this account's
+# CloudTrail events; member accounts forward theirs to this account's event bus.
+resource "aws_sqs_queue" "events" {
+  name                       = "appfire-events-queue"
+  visibility_timeout_seconds = 120
+  message_retention_seconds  = 86400
+}
+
+resource "aws_cloudwatch_event_rule" "resource_changes" {
+  name        = "appfire-c7n-resource-changes"
+  description = "Resource create and tag changes evaluated by the Cloud Custodian event worker"
+
+  event_pattern = jsonencode({
+    "detail-type" = ["AWS API Call via CloudTrail"],
+    detail = {
+      eventName = [
+        "RunInstances", "CreateVolume", "CreateSnapshot", "CopySnapshot", "CreateImage", "CopyImage",
+        "RegisterImage", "CreateSecurityGroup", "CreateVpc", "CreateSubnet", "CreateRouteTable",
+        "CreateInternetGateway", "CreateNatGateway", "AllocateAddress", "CreateNetworkAcl",
+        "CreateVpcPeeringConnection", "CreateVpnGateway", "CreateManagedPrefixList",
+        "CreateTags", "DeleteTags", "TagResource", "UntagResource",
+        "TagResource20170331v2", "UntagResource20170331v2", "TagQueue", "UntagQueue",
+        "PutBucketTagging", "DeleteBucketTagging", "AddTagsToResource", "RemoveTagsFromResource",
+        "AddTags", "RemoveTags", "AddTagsToStream", "RemoveTagsFromStream",
+        "CreateFunction20150331", "CreateQueue", "CreateBucket", "CreateTable", "CreateDBInstance",
+        "CreateDBCluster", "CreateStream", "CreateDeliveryStream", "CreateTopic", "CreateLoadBalancer"
+      ]
+    }
+  })
+}
+
+resource "aws_cloudwatch_event_target" "resource_changes" {
+  rule = aws_cloudwatch_event_rule.resource_changes.name
+  arn  = aws_sqs_queue.events.arn
+}
+
+resource "aws_sqs_queue_policy" "events" {
+  queue_url = aws_sqs_queue.events.id
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Sid       = "AllowResourceChangeEvents",
+        Effect    = "Allow",
+        Principal = { Service = "events.amazonaws.com" },
+        Action    = "sqs:SendMessage",
+        Resource  = aws_sqs_queue.events.arn,
+        Condition = {
+          ArnEquals = {
+            "aws:SourceArn" = aws_cloudwatch_event_rule.resource_changes.arn
+          }
+        }
+      }
+    ]
+  })
+}
+
 resource "aws_ssm_parameter" "this" {
   name           = var.sqs_parameter_name
   description    = "ARN of the SQS queue for Cloud Custodian"
@@ -13,6 +13,16 @@ output "sqs_queue_arn" {
   value       = aws_sqs_queue.this.arn
 }
 
+output "digest_sqs_queue_url" {
+  description = "SQS queue URL for owner digest notifications (DIGEST_QUEUE_URL)"
+  value       = aws_sqs_queue.digest.url
+}
+
+output "events_sqs_queue_url" {
+  description = "SQS queue URL for resource change events (EVENT_QUEUE_URL)"
+  value       = aws_sqs_queue.events.url
+}
+
 output "mailer_sqs_parameter_name" {
   description = "Valor del parámetro SSM para CloudCustodian Mailer"
   value       = aws_ssm_parameter.this.name
@@ -74,6 +74,38 @@ resource "aws_vpc_endpoint" "ec2_messages" {
   }
 }
 
+# Run state shared across runs: compliance.db, the shard manifest and changed.txt,
+# scheduler checkpoints and durations, the tier history and the c7n schema cache.
+resource "aws_security_group" "efs" {
+  vpc_id = aws_vpc.this.id
+
+  ingress {
+    from_port   = 2049
+    to_port     = 2049
+    protocol    = "tcp"
+    cidr_blocks = [var.vpc_cidr]
+  }
+
+  tags = {
+    Name = "c7n-${var.environment}-sg-efs"
+  }
+}
+
+resource "aws_efs_file_system" "state" {
+  encrypted = true
+
+  tags = {
+    Name               = "c7n-${var.environment}-state"
+    DataClassification = "Confidential"
+  }
+}
+
+resource "aws_efs_mount_target" "state" {
+  file_system_id  = aws_efs_file_system.state.id
+  subnet_id       = aws_subnet.this.id
+  security_groups = [aws_security_group.efs.id]
+}
+
 data "aws_ssm_parameter" "this" {
   name = "arn:aws:ssm:${var.aws_region}:533267137459:parameter/GoldenAMI/Ubuntu-24.04/latestID"
 }
@@ -94,6 +126,10 @@ resource "aws_instance" "this" {
     DataClassification = "Confidential"
   }
 
+  depends_on = [aws_efs_mount_target.state]
+
+  # User data only runs on the first boot: the run itself is installed as a
+  # per-boot script, so every start by the Lambda runs the pipeline again.
   user_data = <<-EOF
               #!/bin/bash
               if ! command -v docker >/dev/null 2>&1; then
@@ -102,9 +138,27 @@ resource "aws_instance" "this" {
                 sh get-docker.sh && \
                 rm get-docker.sh
               fi
+              if ! grep -q " /opt/c7n " /etc/fstab; then
+                apt-get update && apt-get install -y nfs-common
+                mkdir -p /opt/c7n
+                echo "${aws_efs_file_system.state.dns_name}:/ /opt/c7n nfs4 nfsvers=4.1,hard,timeo=600,retrans=2,noresvport,_netdev 0 0" >> /etc/fstab
+              fi
+              cat > /var/lib/cloud/scripts/per-boot/c7n-run.sh <<'SCRIPT'
+              #!/bin/bash
+              mount -a
+              mkdir -p /opt/c7n/state /opt/c7n/shards
               docker pull softwareplant/c7n:0.1.0
-              docker run --rm softwareplant/c7n:0.1.0
+              docker run --rm \
+                -v /opt/c7n/state:/app/state \
+                -v /opt/c7n/shards:/app/policies/shards \
+                -e C7N_DELTA_NOTIFY=${var.delta_notify} \
+                -e DIGEST_QUEUE_URL=${var.digest_queue_url} \
+                -e EVENT_QUEUE_URL=${var.event_queue_url} \
+                softwareplant/c7n:0.1.0
               shutdown -h now
+              SCRIPT
+              chmod +x /var/lib/cloud/scripts/per-boot/c7n-run.sh
+              /var/lib/cloud/scripts/per-boot/c7n-run.sh
               EOF
 }
 
@@ -183,3 +237,127 @@ resource "aws_lambda_permission" "this" {
   principal     = "events.amazonaws.com"
   source_arn    = aws_cloudwatch_event_rule.this.arn
 }
+
+# event_worker.py: a long-running Fargate service sharing the run state with the
+# sweep. One task at a time, as both write state/compliance.db.
+resource "aws_efs_access_point" "state" {
+  file_system_id = aws_efs_file_system.state.id
+
+  root_directory {
+    path = "/state"
+
+    creation_info {
+      owner_uid   = 0
+      owner_gid   = 0
+      permissions = "755"
+    }
+  }
+}
+
+resource "aws_security_group" "worker" {
+  vpc_id = aws_vpc.this.id
+
+  egress {
+    from_port   = 0
+    to_port     = 0
+    protocol    = "-1"
+    cidr_blocks = ["0.0.0.0/0"]
+  }
+
+  tags = {
+    Name = "c7n-${var.environment}-sg-event-worker"
+  }
+}
+
+resource "aws_cloudwatch_log_group" "worker" {
+  name              = "/c7n/${var.environment}/event-worker"
+  retention_in_days = 30
+}
+
+resource "aws_iam_role" "worker_execution" {
+  name = "c7n-${var.environment}-event-worker-execution"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action = "sts:AssumeRole",
+      Principal = {
+        Service = "ecs-tasks.amazonaws.com"
+      },
+      Effect = "Allow"
+    }]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "worker_execution" {
+  role       = aws_iam_role.worker_execution.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AmazonECSTaskExecutionRolePolicy"
+}
+
+resource "aws_ecs_cluster" "this" {
+  name = "c7n-${var.environment}"
+}
+
+resource "aws_ecs_task_definition" "worker" {
+  family                   = "c7n-${var.environment}-event-worker"
+  requires_compatibilities = ["FARGATE"]
+  network_mode             = "awsvpc"
+  cpu                      = 512
+  memory                   = 1024
+  execution_role_arn       = aws_iam_role.worker_execution.arn
+  task_role_arn            = var.task_role_arn
+
+  volume {
+    name = "state"
+
+    efs_volume_configuration {
+      file_system_id     = aws_efs_file_system.state.id
+      transit_encryption = "ENABLED"
+
+      authorization_config {
+        access_point_id = aws_efs_access_point.state.id
+      }
+    }
+  }
+
+  container_definitions = jsonencode([{
+    name        = "event-worker"
+    image       = "softwareplant/c7n:0.1.0"
+    essential   = true
+    entryPoint  = ["python", "/app/scripts/event_worker.py"]
+    command     = ["--db", "state/compliance.db"]
+    stopTimeout = 120
+    environment = [
+      { name = "AWS_REGION", value = var.aws_region },
+      { name = "EVENT_QUEUE_URL", value = var.event_queue_url },
+      { name = "DIGEST_QUEUE_URL", value = var.digest_queue_url },
+    ]
+    mountPoints = [{ sourceVolume = "state", containerPath = "/app/state" }]
+    logConfiguration = {
+      logDriver = "awslogs"
+      options = {
+        "awslogs-group"         = aws_cloudwatch_log_group.worker.name
+        "awslogs-region"        = var.aws_region
+        "awslogs-stream-prefix" = "event-worker"
+      }
+    }
+  }])
+}
+
+resource "aws_ecs_service" "worker" {
+  name                               = "c7n-${var.environment}-event-worker"
+  cluster                            = aws_ecs_cluster.this.id
+  task_definition                    = aws_ecs_task_definition.worker.arn
+  desired_count                      = 1
+  launch_type                        = "FARGATE"
+  deployment_maximum_percent         = 100
+  deployment_minimum_healthy_percent = 0
+
+  network_configuration {
+    subnets          = [aws_subnet.this.id]
+    security_groups  = [aws_security_group.worker.id]
+    assign_public_ip = false
+  }
+
+  depends_on = [aws_efs_mount_target.state]
+}
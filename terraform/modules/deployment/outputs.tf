@@ -7,3 +7,13 @@ output "lambda_function_arn" {
   description = "ARN de la función Lambda"
   value       = aws_lambda_function.this.arn
 }
+
+output "state_file_system_id" {
+  description = "EFS file system holding the run state"
+  value       = aws_efs_file_system.state.id
+}
+
+output "event_worker_service_name" {
+  description = "ECS service running event_worker.py"
+  value       = aws_ecs_service.worker.name
+}
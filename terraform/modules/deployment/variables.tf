@@ -65,4 +65,36 @@ variable "instance_profile" {
   description = <<EOT
     (Required) Name of the instance profile to attach to the EC2 instance.
   EOT
-}
\ No newline at end of file
+}
+
+variable "digest_queue_url" {
+  type        = string
+  description = <<EOT
+    (Required) URL of the owner digest queue (DIGEST_QUEUE_URL).
+  EOT
+}
+
+variable "event_queue_url" {
+  type        = string
+  description = <<EOT
+    (Required) URL of the resource change event queue (EVENT_QUEUE_URL).
+  EOT
+}
+
+variable "task_role_arn" {
+  type        = string
+  description = <<EOT
+    (Required) ARN of the role of the event worker task (the Cloud Custodian role).
+  EOT
+}
+
+variable "delta_notify" {
+  type        = bool
+  description = <<EOT
+    (Optional) Notify only compliance deltas from the state index (C7N_DELTA_NOTIFY)
+    instead of c7n notify actions on every run.
+
+    Default: true
+  EOT
+  default     = true
+}